@@ -2,6 +2,38 @@ import vlc
 import time
 import os
 import threading
+import heapq
+import itertools
+from concurrent.futures import Future
+
+from loudness_service import loudness_service
+from stream_server import stream_server
+from config_store import config_store
+from url_resolver import url_resolver
+from radio_relay import radio_relay
+from stream_tuning import stream_tuning
+
+# Playback command priorities for the audio worker (lower runs first)
+PRIORITY_BELL = 0
+PRIORITY_ANNOUNCEMENT = 1
+PRIORITY_MUSIC = 2
+
+# States in which a player is still busy with its media
+ACTIVE_STATES = (vlc.State.Opening, vlc.State.Buffering, vlc.State.Playing)
+# States after which the music player needs a new play command
+STOPPED_STATES = (vlc.State.Error, vlc.State.Ended, vlc.State.Stopped)
+# States in which a stream gave up by itself (not stopped by us)
+FAILED_STATES = (vlc.State.Error, vlc.State.Ended)
+# Fallback re-check of libvlc while waiting on events, in case one was missed
+STATE_SAFETY_POLL = 2.0
+# VLC's input buffer when nothing is known about the source (radio is tuned per station)
+NETWORK_CACHING_MS = 3000
+# How long a stream may take to deliver audio beyond its caching before we unmute anyway
+AUDIO_START_TIMEOUT = 10.0
+# Demux counters are polled this often while waiting for audio
+AUDIO_POLL_INTERVAL = 0.05
+# Without libvlc stats, audio is assumed flowing this long after Playing
+AUDIO_FALLBACK_SETTLE = 1.0
 
 class AudioEngine:
     def __init__(self):
@@ -22,6 +54,42 @@ class AudioEngine:
         # Streaming Settings
         self.streaming_enabled = False
         self.streaming_port = 5959
+        # True when streaming runs through VLC's sout chain (hosts without ffmpeg/PulseAudio)
+        self.sout_streaming = False
+
+        # Callbacks fired when music starts or stops (the scheduler wakes its loop on these)
+        self.listeners = []
+
+        # Volumes/streaming edited in config.json (API writes have already been applied)
+        config_store.subscribe(self._on_config_change)
+
+        # Playback command queue: heap of (priority, seq, func, args, future), drained by one worker
+        self._queue = []
+        self._queue_cond = threading.Condition()
+        self._queue_seq = itertools.count()
+        self._running_priority = None
+        threading.Thread(target=self._command_worker, daemon=True).start()
+
+        # Player state mirrored from libvlc events ('music' = self.player, 'alert' = announcement_player)
+        self._state_cond = threading.Condition()
+        self._player_states = {'music': vlc.State.NothingSpecial, 'alert': vlc.State.NothingSpecial}
+        self.buffering_start_time = 0
+        self.media_time = 0
+        self.media_length = 0
+
+        # Gapless local playlist (MediaListPlayer driving self.player)
+        self.list_player = None
+        self.playlist_active = False
+        self._playlist_paths = []
+        self._playlist_media = []
+        self._playlist_index = -1
+        self.current_alert_file = None
+        # Local relay URL the music player is reading (radio through radio_relay), else None
+        self.current_relay_url = None
+        self.current_caching_ms = NETWORK_CACHING_MS
+        # Radio playback session for stream_tuning: { source, started, stalls }
+        self._session = None
+        self._starting = None  # Token of a play_media waiting for audio (see play_media)
 
         try:
             if os.name == 'nt':
@@ -45,8 +113,15 @@ class AudioEngine:
             )
             self.player = self.instance.media_player_new()
             self.announcement_player = self.instance.media_player_new()
-            
-            self.buffering_start_time = 0
+
+            self._attach_state_events(self.player, 'music')
+            self._attach_state_events(self.announcement_player, 'alert')
+
+            # Break music playlists run on a list player that feeds the same music player
+            self.list_player = self.instance.media_list_player_new()
+            self.list_player.set_media_player(self.player)
+            self.list_player.event_manager().event_attach(
+                vlc.EventType.MediaListPlayerNextItemSet, self._on_next_item_event)
 
         except Exception as e:
             print(f"CRITICAL ERROR: Could not initialize VLC: {e}")
@@ -69,9 +144,218 @@ class AudioEngine:
         # Legacy stub
         return []
 
+    def add_listener(self, callback):
+        """Registers a no-argument callback invoked whenever music playback starts or stops."""
+        self.listeners.append(callback)
+
+    def _notify_listeners(self):
+        for callback in list(self.listeners):
+            try:
+                callback()
+            except Exception as e:
+                print(f"Audio listener error: {e}")
+
+    def _command_worker(self):
+        """Runs queued playback commands one at a time, bells before announcements before music."""
+        while True:
+            with self._queue_cond:
+                while not self._queue:
+                    self._queue_cond.wait()
+                priority, _, func, args, future = heapq.heappop(self._queue)
+                if not future.set_running_or_notify_cancel():
+                    continue # Superseded or cancelled while waiting
+                self._running_priority = priority
+            try:
+                future.set_result(func(*args))
+            except Exception as e:
+                print(f"Audio command error ({func.__name__}): {e}")
+                future.set_exception(e)
+            finally:
+                self._running_priority = None
+
+    def submit(self, func, *args, priority=PRIORITY_MUSIC, callback=None) -> Future:
+        """Queues a blocking playback call for the audio worker and returns its Future immediately.
+        callback(future) runs on the worker thread once the command has finished."""
+        future = Future()
+        if callback: future.add_done_callback(callback)
+        with self._queue_cond:
+            heapq.heappush(self._queue, (priority, next(self._queue_seq), func, args, future))
+            self._queue_cond.notify()
+        return future
+
+    def _cancel_queued(self, priority):
+        """Cancels commands of this priority that have not started yet."""
+        with self._queue_cond:
+            for item in self._queue:
+                if item[0] == priority:
+                    item[-1].cancel()
+
+    def _preempted(self) -> bool:
+        """True while a more urgent command than the running one waits (a bell behind a radio start)."""
+        with self._queue_cond:
+            running = self._running_priority
+            return running is not None and any(item[0] < running and not item[-1].cancelled() for item in self._queue)
+
+    def music_pending(self) -> bool:
+        """True while a music command is queued or running (music is about to start)."""
+        with self._queue_cond:
+            if self._running_priority == PRIORITY_MUSIC:
+                return True
+            return any(item[0] == PRIORITY_MUSIC and not item[-1].cancelled() for item in self._queue)
+
+    def play_media_async(self, source: str, media_type: str = 'file', volume_type: str = 'music', callback=None) -> Future:
+        """Non-blocking play_media. A newer music request supersedes any still waiting in the queue."""
+        self._cancel_queued(PRIORITY_MUSIC)
+        return self.submit(self.play_media, source, media_type, volume_type, priority=PRIORITY_MUSIC, callback=callback)
+
+    def play_playlist_async(self, file_paths: list, volume_type: str = 'music', callback=None) -> Future:
+        """Non-blocking play_playlist. Supersedes queued music like play_media_async."""
+        self._cancel_queued(PRIORITY_MUSIC)
+        return self.submit(self.play_playlist, file_paths, volume_type, priority=PRIORITY_MUSIC, callback=callback)
+
+    def play_sequence_async(self, file_paths: list, volume_type: str = 'bell', priority=PRIORITY_BELL, callback=None) -> Future:
+        """Non-blocking play_sequence."""
+        return self.submit(self.play_sequence, file_paths, volume_type, priority=priority, callback=callback)
+
+    def play_alert_async(self, file_path: str, priority=PRIORITY_ANNOUNCEMENT, callback=None) -> Future:
+        """Non-blocking play_alert."""
+        return self.submit(self.play_alert, file_path, priority=priority, callback=callback)
+
+    def _attach_state_events(self, player, key):
+        """Subscribes to libvlc's event manager so state reads and waits never poll get_state()."""
+        em = player.event_manager()
+        E = vlc.EventType
+        transitions = {
+            E.MediaPlayerOpening: vlc.State.Opening,
+            E.MediaPlayerPlaying: vlc.State.Playing,
+            E.MediaPlayerPaused: vlc.State.Paused,
+            E.MediaPlayerStopped: vlc.State.Stopped,
+            E.MediaPlayerEndReached: vlc.State.Ended,
+            E.MediaPlayerEncounteredError: vlc.State.Error,
+        }
+        for event_type, state in transitions.items():
+            em.event_attach(event_type, self._on_state_event, key, state)
+        em.event_attach(E.MediaPlayerBuffering, self._on_buffering_event, key)
+        if key == 'music':
+            em.event_attach(E.MediaPlayerTimeChanged, self._on_time_event)
+            em.event_attach(E.MediaPlayerLengthChanged, self._on_length_event)
+
+    # NOTE: libvlc callbacks run on libvlc's own threads and must not call back into libvlc.
+    def _on_state_event(self, event, key, state):
+        if key == 'music' and state == vlc.State.Ended and self.playlist_active:
+            if self._playlist_index < len(self._playlist_paths) - 1:
+                # The list player is already moving to the next track; not a real end
+                self._set_state(key, vlc.State.Opening)
+                return
+            # Whole playlist played; let the scheduler build a fresh shuffle
+            self.playlist_active = False
+        self._set_state(key, state)
+        if key == 'music' and state in (vlc.State.Playing, vlc.State.Ended, vlc.State.Error):
+            # Track end / failure should be handled now, not on the next scheduler pass
+            self._notify_listeners()
+
+    def _on_buffering_event(self, event, key):
+        cache = event.u.new_cache
+        current = self.get_player_state(key)
+        if cache < 100:
+            if current != vlc.State.Buffering:
+                self._set_state(key, vlc.State.Buffering)
+        elif current == vlc.State.Buffering:
+            self._set_state(key, vlc.State.Playing)
+
+    def _on_next_item_event(self, event):
+        self._playlist_index += 1
+        if 0 <= self._playlist_index < len(self._playlist_paths):
+            self.current_media_source = self._playlist_paths[self._playlist_index]
+        self.media_time = 0
+        # Warm up the following track while this one plays (parsing must not run on the libvlc thread)
+        next_index = self._playlist_index + 1
+        next_media = self._playlist_media[next_index] if next_index < len(self._playlist_media) else None
+        threading.Thread(target=self._prepare_track, args=(next_media,), daemon=True).start()
+
+    def _prepare_track(self, next_media):
+        # Loudness correction for the track that just started
+        self.player.audio_set_volume(self._file_volume(self.current_volume_type, self._music_file()))
+        if next_media is None: return
+        try:
+            next_media.parse_with_options(vlc.MediaParseFlag.local, 0)
+        except Exception as e:
+            print(f"Pre-parse failed: {e}")
+
+    def _on_time_event(self, event):
+        self.media_time = event.u.new_time
+
+    def _on_length_event(self, event):
+        self.media_length = event.u.new_length
+
+    def _set_state(self, key, state):
+        with self._state_cond:
+            previous = self._player_states.get(key)
+            self._player_states[key] = state
+            if key == 'music':
+                # Stall detection: remember when buffering started
+                if state == vlc.State.Buffering:
+                    if previous != vlc.State.Buffering: self.buffering_start_time = time.time()
+                    # Re-buffering after audio was flowing: a stall for the station's history
+                    session = self._session
+                    if previous == vlc.State.Playing and session: session["stalls"] += 1
+                else:
+                    self.buffering_start_time = 0
+                if state == vlc.State.Stopped:
+                    self.media_time = 0
+            self._state_cond.notify_all()
+
+    def get_player_state(self, key='music'):
+        """Last libvlc state seen for 'music' or 'alert' (no libvlc call)."""
+        return self._player_states.get(key, vlc.State.NothingSpecial)
+
+    def wait_for_state(self, key, states, timeout):
+        """Blocks until the player enters one of states. Returns False on timeout."""
+        deadline = time.time() + timeout
+        with self._state_cond:
+            while self._player_states.get(key) not in states:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                self._state_cond.wait(remaining)
+            return True
+
+    def _wait_while_active(self, key, player):
+        """Blocks until the player leaves Opening/Buffering/Playing and returns the new state."""
+        while True:
+            with self._state_cond:
+                state = self._player_states.get(key)
+                if state not in ACTIVE_STATES:
+                    return state
+                self._state_cond.wait(STATE_SAFETY_POLL)
+                state = self._player_states.get(key)
+                if state not in ACTIVE_STATES:
+                    return state
+            # No event for a while; confirm with libvlc in case one was dropped
+            real_state = player.get_state()
+            if real_state not in ACTIVE_STATES:
+                self._set_state(key, real_state)
+                return real_state
+
+    def _on_config_change(self, changes: dict):
+        for channel in ('bell', 'music', 'manual'):
+            vol = changes.get(f"volume_{channel}")
+            if vol is not None and vol != self.channel_volumes.get(channel):
+                self.set_channel_volume(channel, vol)
+        streaming = changes.get("streaming")
+        if streaming and (streaming.get("enabled", False), streaming.get("port", 8080)) != (self.streaming_enabled, self.streaming_port):
+            self.set_streaming_config(streaming.get("enabled", False), streaming.get("port", 8080))
+
     def get_channel_volume(self, channel: str) -> int:
         return self.channel_volumes.get(channel, 50)
 
+    def _file_volume(self, channel: str, path=None) -> int:
+        """Channel volume with the file's loudness correction (local files only)."""
+        return loudness_service.scaled_volume(self.get_channel_volume(channel), path)
+
+    def _music_file(self):
+        return self.current_media_source if self.current_media_type == 'file' else None
+
     def set_channel_volume(self, channel: str, volume: int):
         """Sets the logical volume (gain) for a specific channel (0-100)."""
         with self.lock:
@@ -81,102 +365,253 @@ class AudioEngine:
             # Apply immediately to active players
             if channel == 'bell':
                 if self.announcement_player and self.announcement_player.is_playing():
-                    self.announcement_player.audio_set_volume(vol)
+                    self.announcement_player.audio_set_volume(self._file_volume(channel, self.current_alert_file))
             
+            elif channel == self.current_volume_type and self._starting:
+                 print(f"Volume update stored for {channel} (applied once playback has started)")
             elif channel == self.current_volume_type:
                  print(f"Applying volume {vol} to {channel} (Active)")
                  if self.player:
-                     ret = self.player.audio_set_volume(vol)
+                     ret = self.player.audio_set_volume(self._file_volume(channel, self._music_file()))
                      print(f"Volume set result: {ret}")
             else:
                  print(f"Volume update stored for {channel} (Not Active). Current: {self.current_volume_type}, Playing: {self.is_playing_music}")
 
-    def set_streaming_config(self, enabled: bool, port: int):
+    def set_streaming_config(self, enabled: bool, port: int) -> bool:
+        """
+        Applies streaming settings. Returns True if playing media must restart to pick
+        them up (VLC sout mode); the persistent encoder taps the output without that.
+        """
         print(f"Update Audio Streaming Config: {enabled} (Port {port})")
+        was_sout = self.sout_streaming
         self.streaming_enabled = enabled
         self.streaming_port = port
+        if enabled:
+            self.sout_streaming = not stream_server.start(port)
+        else:
+            self.sout_streaming = False
+            self._route_output(stream_server.default_sink)
+            stream_server.stop()
+        if stream_server.output_device():
+            self._route_output(stream_server.output_device())
+        return self.sout_streaming or was_sout
 
-    def _resolve_url(self, url: str) -> str:
-        """Resolves YouTube URLs to direct stream URLs using yt-dlp."""
-        if not url: return url
-        if "youtube.com" in url or "youtu.be" in url:
-            print(f"Resolving YouTube URL: {url}...")
+    def _route_output(self, sink):
+        """Points both players at a PulseAudio sink (the stream tap, or back to the default)."""
+        if not sink or not self.player: return
+        for player in (self.player, self.announcement_player):
             try:
-                import yt_dlp
-                ydl_opts = {'format': 'bestaudio/best', 'noplaylist': True, 'quiet': True, 'nocheckcertificate': True, 'live_from_start': True}
-                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                    info = ydl.extract_info(url, download=False)
-                    return info.get('url', url)
+                player.audio_output_device_set(None, sink)
             except Exception as e:
-                print(f"YouTube resolution failed: {e}")
-                return url
-        return url
+                print(f"Could not route audio to {sink}: {e}")
+
+    def _resolve_url(self, url: str) -> str:
+        """Resolves YouTube URLs to direct stream URLs (cached; a resume after a bell doesn't re-extract)."""
+        return url_resolver.resolve(url)
 
-    def _get_media_options(self, include_sout=True):
+    def _get_media_options(self, caching_ms=NETWORK_CACHING_MS, include_sout=True):
         """Returns list of VLC media options based on current config"""
-        opts = [":network-caching=3000"] # Increased caching for HLS stability
-        if self.streaming_enabled and include_sout:
-            print(f"DEBUG: Configured VLC for streaming on port {self.streaming_port}")
-            # transcode: enc=mp3, bitrate=128kbps, 2 channels, 44.1kHz, sync for HLS
+        opts = [f":network-caching={caching_ms}"]
+        if self.sout_streaming and include_sout:
+            # No persistent encoder on this host: VLC plays locally AND serves the stream itself
             transcode_config = "acodec=mp3,ab=128,channels=2,samplerate=44100,audio-sync"
-            # std: access=http, mux=mp3, bind to 0.0.0.0 (all interfaces)
             std_config = f"access=http,mux=mp3,dst=0.0.0.0:{self.streaming_port}/stream"
-            
             network_chain = f"transcode{{{transcode_config}}}:std{{{std_config}}}"
-            # duplicate: play locally (display) AND stream
-            sout = f"#duplicate{{dst=display,dst=\"{network_chain}\"}}"
-            opts.append(f":sout={sout}")
-            opts.append(":sout-keep") 
+            opts.append(f":sout=#duplicate{{dst=display,dst=\"{network_chain}\"}}")
+            opts.append(":sout-keep")
         return opts
-    
-    def play_media(self, source: str, media_type: str = 'file', volume_type: str = 'music'):
+
+    def play_media(self, source: str, media_type: str = 'file', volume_type: str = 'music', relay_at=None):
         """
         Plays music/radio using the specific channel gain.
         volume_type: 'music' or 'manual' to select the gain channel.
+        relay_at: radio only, buffer offset to resume from (None: live).
+        Returns False if the source errored out while starting.
         """
-        if not self.player: return
+        if not self.player: return False
 
         # Resolve URL... (same as before)
         if media_type == 'url':
             real_source = self._resolve_url(source)
+            # Plain HTTP/Icecast radio is read through the local relay (bells don't cost a reconnect)
+            if radio_relay.supports(source):
+                real_source = radio_relay.open(source, at=relay_at)
         else:
             real_source = source
+        relayed = radio_relay.is_local(real_source)
 
         with self.lock:
-            self.stop_media()
-            # Wait for port release if we were streaming
-            if self.streaming_enabled: time.sleep(0.5)
+            self.stop_media(cancel_pending=False)
+            # Wait for port release if VLC itself was streaming
+            if self.sout_streaming: time.sleep(0.5)
             
             self.current_media_type = media_type
             self.current_media_source = source
             self.current_volume_type = volume_type
+            self.current_relay_url = real_source if relayed else None
             
-            target_vol = self.channel_volumes.get(volume_type, 50)
+            target_vol = self._file_volume(volume_type, source if media_type == 'file' else None)
+            # Radio gets the buffer its history calls for; files keep the default
+            caching = stream_tuning.caching_for(source, relayed) if media_type == 'url' else NETWORK_CACHING_MS
+            self.current_caching_ms = caching
             media = self.instance.media_new(real_source)
-            for opt in self._get_media_options(include_sout=True): media.add_option(opt)
+            for opt in self._get_media_options(caching): media.add_option(opt)
                 
             self.player.set_media(media)
+            self.media_time = 0
+            self.media_length = 0
             
             # SOFT START: Mute first to avoid connection glitches
             self.player.audio_set_volume(0) 
+            self._set_state('music', vlc.State.NothingSpecial) # Forget the previous media's state
+            play_started = time.time()
             self.player.play()
             self.is_playing_music = True
-            
-            # Only apply long stabilization for Network Streams (URLs)
-            # For local files, we want instant playback.
-            stabilization_time = 5.0 if media_type == 'url' else 0.2
-            
-            # Wait for stable 'Playing' state before unmutes
-            if self._wait_for_start(self.player, timeout=10.0): 
-                time.sleep(stabilization_time) 
+            # Waiting for audio can take seconds on a slow station: do it without self.lock,
+            # so volume changes and status reads aren't frozen meanwhile
+            self._starting = start = object()
+
+        if media_type == 'url':
+            # Unmute the moment demuxed audio is flowing instead of after a fixed wait
+            flow_ms = self._wait_for_audio(caching / 1000 + AUDIO_START_TIMEOUT)
+        else:
+            # Wait for stable 'Playing' state before unmutes; an error ends either wait at once
+            started = self.wait_for_state('music', ACTIVE_STATES + FAILED_STATES, timeout=10.0)
+
+        with self.lock:
+            if self._starting is not start:
+                # Stopped or replaced while starting; whoever did that owns the player now
+                return True
+            self._starting = None
+            # Channel volume may have changed during the wait
+            target_vol = self._file_volume(volume_type, source if media_type == 'file' else None)
+
+            if media_type == 'url':
+                if self.get_player_state('music') in FAILED_STATES:
+                    print(f"Playback failed while starting: {source}")
+                    self.is_playing_music = False
+                    self._notify_listeners()
+                    return False
+                if flow_ms is None and self._preempted():
+                    # A bell is waiting: hand the worker over now; its resume restarts this stream
+                    print(f"Start of {source} interrupted by a higher-priority command")
+                    self.player.audio_set_volume(target_vol)
+                    self._notify_listeners()
+                    return True
                 self.player.audio_set_volume(target_vol)
-                print(f"Playing stable: {media_type} (Ch: {volume_type}) at vol {target_vol}")
+                self._session = {"source": source, "started": play_started, "stalls": 0}
+                if flow_ms is not None:
+                    # Resumes from the relay buffer say nothing about the station
+                    if relay_at is None: stream_tuning.record_start(source, flow_ms)
+                    print(f"Playing stable: url (Ch: {volume_type}) at vol {target_vol}, audio after {flow_ms} ms (caching {caching} ms)")
+                else:
+                    print(f"Warning: No audio data after {caching / 1000 + AUDIO_START_TIMEOUT:.0f}s. Vol set anyway.")
             else:
-                print(f"Warning: Playback started but timed out waiting for stable state. Vol set anyway.")
+                if self.get_player_state('music') in FAILED_STATES or (
+                        started and self.wait_for_state('music', FAILED_STATES, 0.2)):
+                    print(f"Playback failed while starting: {source}")
+                    self.is_playing_music = False
+                    self._notify_listeners()
+                    return False
+                if started:
+                    self.player.audio_set_volume(target_vol)
+                    print(f"Playing stable: {media_type} (Ch: {volume_type}) at vol {target_vol}")
+                else:
+                    print(f"Warning: Playback started but timed out waiting for stable state. Vol set anyway.")
+                    self.player.audio_set_volume(target_vol)
+
+        self._notify_listeners()
+        return True
+
+    def play_playlist(self, file_paths: list, volume_type: str = 'music'):
+        """
+        Plays local files back to back on the list player, without gaps between tracks.
+        Returns once the first track is playing; later tracks advance inside libvlc.
+        """
+        if not self.list_player or not file_paths: return
+
+        with self.lock:
+            self.stop_media(cancel_pending=False)
+
+            media_list = self.instance.media_list_new()
+            self._playlist_media = []
+            for path in file_paths:
+                media = self.instance.media_new(path)
+                for opt in self._get_media_options(): media.add_option(opt)
+                media_list.add_media(media)
+                self._playlist_media.append(media)
+
+            self._playlist_paths = list(file_paths)
+            self._playlist_index = -1
+            self.list_player.set_media_list(media_list)
+            self.list_player.set_playback_mode(vlc.PlaybackMode.default)
+
+            self.current_media_type = 'file'
+            self.current_media_source = file_paths[0]
+            self.current_volume_type = volume_type
+            self.media_time = 0
+            self.media_length = 0
+
+            target_vol = self._file_volume(volume_type, file_paths[0])
+            self.player.audio_set_volume(target_vol)
+            self._set_state('music', vlc.State.NothingSpecial)
+            self.playlist_active = True
+            self.list_player.play()
+            self.is_playing_music = True
+
+            if self._wait_for_start('music', timeout=10.0):
                 self.player.audio_set_volume(target_vol)
+                print(f"Playing playlist: {len(file_paths)} tracks (Ch: {volume_type}) at vol {target_vol}")
+            else:
+                print("Warning: Playlist did not start in time.")
+
+        self._notify_listeners()
 
-    def stop_media(self):
-        """Stops all media players."""
+    def _wait_for_audio(self, timeout):
+        """
+        Ms from play() until the demuxer's byte counter grows while Playing (audio is
+        really flowing). None on error, timeout or when a more urgent command is queued
+        (a bell must not wait out a slow station). Wakes early on Error/Ended.
+        """
+        started = time.time()
+        last = None
+        playing_since = None
+        while time.time() - started < timeout:
+            state = self.get_player_state('music')
+            if state in FAILED_STATES or self._preempted():
+                return None
+            if state == vlc.State.Playing:
+                playing_since = playing_since or time.time()
+                stats = self.get_playback_stats()["stats"]
+                if stats is None:
+                    # This libvlc build keeps no stats: trust Playing after a short settle
+                    if time.time() - playing_since >= AUDIO_FALLBACK_SETTLE:
+                        return round((time.time() - started) * 1000)
+                else:
+                    demux = stats.get("demux_read_bytes") or 0
+                    if last is not None and demux > last:
+                        return round((time.time() - started) * 1000)
+                    if demux: last = demux
+            self.wait_for_state('music', FAILED_STATES, AUDIO_POLL_INTERVAL)
+        return None
+
+    def _end_session(self):
+        session, self._session = self._session, None
+        if session:
+            stream_tuning.record_session(session["source"], time.time() - session["started"], session["stalls"])
+
+    def stop_media(self, cancel_pending=True):
+        """Stops all media players (and, by default, any music still waiting in the queue)."""
+        self._starting = None  # A play_media still waiting for audio must not unmute afterwards
+        self._end_session()
+        if cancel_pending:
+            self._cancel_queued(PRIORITY_MUSIC)
+            # Music is off for good (not a switch or a bell): no need to keep the station connected
+            radio_relay.close_all()
+        if self.playlist_active:
+            # Stop the list player first or it would advance to the next track
+            self.playlist_active = False
+            self.list_player.stop()
         if self.player.is_playing():
             self.player.stop()
         
@@ -185,6 +620,7 @@ class AudioEngine:
 
         self.is_playing_music = False
         print("Media stopped")
+        self._notify_listeners()
 
     def stop_alert(self):
         """Stops the announcement player immediately."""
@@ -193,27 +629,53 @@ class AudioEngine:
         # Note: If play_sequence is blocked in a loop, stopping the player 
         # causes the loop to exit (is_playing becomes false).
 
+    def reconnect(self, source: str, volume_type: str = 'music') -> Future:
+        """Replays a URL source over a fresh connection (also upstream of the relay)."""
+        radio_relay.drop(source)
+        return self.play_media_async(source, 'url', volume_type=volume_type)
+
+    def is_using(self, path: str) -> bool:
+        """True if a player has this file open or a queued command is about to play it."""
+        path = os.path.normpath(path)
+        busy = []
+        if self.is_playing_music and self.current_media_type == 'file':
+            busy.append(self.current_media_source)
+            if self.playlist_active: busy.extend(self._playlist_paths)
+        if self.get_player_state('alert') in ACTIVE_STATES:
+            busy.append(self.current_alert_file)
+        with self._queue_cond:
+            for item in self._queue:
+                for arg in item[3]:
+                    busy.extend(arg if isinstance(arg, list) else [arg])
+        return any(isinstance(p, str) and os.path.normpath(p) == path for p in busy)
+
+    def music_failed(self) -> bool:
+        """True if the current URL source stopped by itself (error / end of a live stream)."""
+        return self.current_media_type == 'url' and self.get_player_state('music') in FAILED_STATES
+
+    def music_playing(self) -> bool:
+        """check_music_status without its side effects (no flag sync, no stall restart); for status readers."""
+        return self.is_playing_music and self.get_player_state('music') not in (vlc.State.Stopped, vlc.State.Ended, vlc.State.Error)
+
     def check_music_status(self):
         """Syncs internal flag with actual VLC state. Returns True if music is officially playing."""
         if self.is_playing_music:
-             state = self.player.get_state()
+             state = self.get_player_state('music')
              
              # 5=Stopped, 6=Ended, 7=Error
              if state in [vlc.State.Stopped, vlc.State.Ended, vlc.State.Error]:
                  self.is_playing_music = False
                  self.buffering_start_time = 0
+                 self._notify_listeners()
                  
              # Check for Stalled / Infinite Buffering (Common with YouTube Expired Links)
-             elif state == vlc.State.Buffering:
-                 if self.buffering_start_time == 0:
-                     self.buffering_start_time = time.time()
-                 elif time.time() - self.buffering_start_time > 20: # 20s Timeout
+             # buffering_start_time is maintained by the libvlc Buffering/Playing events
+             elif state == vlc.State.Buffering and self.buffering_start_time:
+                 if time.time() - self.buffering_start_time > 20: # 20s Timeout
                      print("⚠️ Playback Stalled (Buffering > 20s). Forcing Restart...")
                      self.stop_media() # This sets is_playing_music = False
                      self.buffering_start_time = 0
                      return False
-             elif state == vlc.State.Playing:
-                 self.buffering_start_time = 0
                  
         return self.is_playing_music
 
@@ -237,13 +699,14 @@ class AudioEngine:
         # Actually, let's just re-read the channel volume on resume.
         
         if was_playing:
-            if self.streaming_enabled: self.player.stop()
+            # A paused sout chain would keep the stream port; stop and restart instead
+            if self.sout_streaming: self.player.stop()
             else: self.player.pause() 
             time.sleep(0.5)
         
         # 2. Play Alert on Announcement Player
         media = self.instance.media_new(file_path)
-        for opt in self._get_media_options(): media.add_option(opt)
+        for opt in self._get_media_options(include_sout=False): media.add_option(opt)
 
         self.announcement_player.set_media(media)
         self.announcement_player.play()
@@ -264,7 +727,7 @@ class AudioEngine:
             resume_vol = self.channel_volumes['music'] 
             print(f"Resuming media at vol {resume_vol}...")
             
-            if resume_type == 'url' or self.streaming_enabled:
+            if resume_type == 'url' or self.sout_streaming:
                  self.player.stop()
                  # Re-call play_media with explicit 'music' type
                  self.play_media(resume_source, 'url' if resume_type == 'url' else 'file', 'music')
@@ -297,21 +760,15 @@ class AudioEngine:
                     stats_info = None
 
         return {
-            "time": self.player.get_time(),
-            "duration": self.player.get_length(),
+            "time": self.media_time,
+            "duration": self.media_length,
             "stats": stats_info
         }
 
-    def _wait_for_start(self, player, timeout=3.0):
+    def _wait_for_start(self, key, timeout=3.0):
         """Waits for player to transition away from 'NothingSpecial' or 'Stopped'."""
-        start_time = time.time()
-        while time.time() - start_time < timeout:
-            state = player.get_state()
-            # If it's Opening (1), Buffering (2), or Playing (3), it has officially started
-            if state in [vlc.State.Opening, vlc.State.Buffering, vlc.State.Playing]:
-                return True
-            time.sleep(0.05)
-        return False
+        # If it's Opening (1), Buffering (2), or Playing (3), it has officially started
+        return self.wait_for_state(key, ACTIVE_STATES, timeout)
 
     def play_sequence(self, file_paths: list, volume_type: str = 'bell'):
         """
@@ -326,11 +783,15 @@ class AudioEngine:
         was_playing = self.player.is_playing() or self.is_playing_music
         resume_source = self.current_media_source
         resume_type = self.current_media_type
+        # Relayed radio resumes from the buffer at the point it was paused
+        paused_at = time.time()
+        relay_pos = radio_relay.client_position(self.current_relay_url)
+        was_playlist = self.playlist_active
         
         if was_playing:
             print("DEBUG: Pausing background music for sequence...")
             self.was_volume_type = getattr(self, 'current_volume_type', 'music')
-            if self.streaming_enabled: self.player.stop()
+            if self.sout_streaming: self.player.stop()
             else: self.player.pause()
             time.sleep(0.3)
             
@@ -349,7 +810,8 @@ class AudioEngine:
                 print(f"WARNING: Skipping missing file: {file_path}")
                 continue
             
-            target_vol = self.get_channel_volume(volume_type)
+            target_vol = self._file_volume(volume_type, file_path)
+            self.current_alert_file = file_path
                 
             media = self.instance.media_new(file_path)
             for opt in self._get_media_options(include_sout=False): media.add_option(opt)
@@ -357,10 +819,11 @@ class AudioEngine:
             # Set volume PRE-PLAY
             self.announcement_player.audio_set_volume(target_vol)
             self.announcement_player.set_media(media)
+            self._set_state('alert', vlc.State.NothingSpecial) # Forget the previous clip's state
             self.announcement_player.play()
             
             # Wait for start (be more patient)
-            if self._wait_for_start(self.announcement_player, timeout=5.0):
+            if self._wait_for_start('alert', timeout=5.0):
                 # Volume Brute-Force for Alerts: Keep applying until it sticks
                 for _ in range(10):
                     self.announcement_player.audio_set_volume(target_vol)
@@ -368,17 +831,13 @@ class AudioEngine:
                     
                 print(f"DEBUG: Playing alert: {os.path.basename(file_path)} (Vol: {target_vol})")
                 
-                # Wait for finish (Wait through Opening, Buffering, and Playing)
-                while True:
-                    state = self.announcement_player.get_state()
-                    if state not in [vlc.State.Playing, vlc.State.Opening, vlc.State.Buffering]:
-                        # Check error state
-                        if state == vlc.State.Error:
-                            print(f"ERROR: Playback error for {file_path}")
-                        break
-                    time.sleep(0.1)
+                # Wait for finish (Wait through Opening, Buffering, and Playing) - woken by EndReached/Error
+                state = self._wait_while_active('alert', self.announcement_player)
+                # Check error state
+                if state == vlc.State.Error:
+                    print(f"ERROR: Playback error for {file_path}")
             else:
-                print(f"ERROR: Timeout waiting for announcement to start: {file_path}. State: {self.announcement_player.get_state()}")
+                print(f"ERROR: Timeout waiting for announcement to start: {file_path}. State: {self.get_player_state('alert')}")
                 
             # Small structural gap between sequence items
             time.sleep(0.3)
@@ -388,11 +847,19 @@ class AudioEngine:
         # 3. Resume Music with Volume Protection
         if was_playing:
             v_type = getattr(self, 'was_volume_type', 'music')
-            snapshot_vol = self.get_channel_volume(v_type)
+            snapshot_vol = self._file_volume(v_type, self._music_file())
             print(f"DEBUG: Restoring {v_type} at level {snapshot_vol}%")
             
-            if resume_type == 'url' or self.streaming_enabled:
-                self.play_media(resume_source, 'url' if resume_type == 'url' else 'file', v_type)
+            if resume_type == 'url':
+                at = radio_relay.resume_offset(resume_source, paused_at, relay_pos, self.current_caching_ms / 1000)
+                self.play_media(resume_source, 'url', v_type, relay_at=at)
+            elif was_playlist and self.sout_streaming:
+                # Player was stopped for streaming; restart the list from its current track
+                self.player.audio_set_volume(snapshot_vol)
+                self.playlist_active = True
+                self.list_player.play()
+            elif self.sout_streaming:
+                self.play_media(resume_source, 'file', v_type)
             else:
                 if not self.player.is_playing():
                     self.player.audio_set_volume(snapshot_vol)
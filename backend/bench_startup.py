@@ -0,0 +1,100 @@
+"""
+Startup benchmark: how long until the backend can ring a bell / answer the UI.
+
+    python bench_startup.py            # 3 runs on a spare port
+    python bench_startup.py --runs 5 --port 7790
+
+Measures, in fresh interpreters:
+  1. import time of main.py (and the slowest modules, via -X importtime)
+  2. time from process start to the first successful GET /status
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import requests
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def measure_import():
+    code = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+    res = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                         cwd=HERE, capture_output=True, text=True)
+    seconds = float(res.stdout.strip().splitlines()[-1])
+
+    # importtime lines: "import time: self [us] | cumulative | imported package"
+    slowest = []
+    for line in res.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line: continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3: continue
+        # Nested imports are indented two spaces per level; keep what main.py pulls in directly
+        name = parts[2].rstrip()
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 1:
+            slowest.append((int(parts[1]), name.strip()))
+    slowest.sort(reverse=True)
+    return seconds, slowest[:8]
+
+
+def port_free(port):
+    with socket.socket() as s:
+        return s.connect_ex(("127.0.0.1", port)) != 0
+
+
+def measure_first_request(port, timeout=60.0):
+    started = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(port)],
+                            cwd=HERE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                if requests.get(f"http://127.0.0.1:{port}/status", timeout=1).status_code == 200:
+                    return time.perf_counter() - started
+            except requests.RequestException:
+                pass
+            time.sleep(0.05)
+        return None
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backend startup benchmark")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--port", type=int, default=7790)
+    args = parser.parse_args()
+
+    if not port_free(args.port):
+        print(f"Port {args.port} is in use; pick another with --port")
+        sys.exit(1)
+
+    imports, firsts = [], []
+    for i in range(args.runs):
+        seconds, slowest = measure_import()
+        imports.append(seconds)
+        first = measure_first_request(args.port)
+        firsts.append(first)
+        print(f"Run {i + 1}: import {seconds:.2f}s, first /status {first:.2f}s" if first
+              else f"Run {i + 1}: import {seconds:.2f}s, /status never answered")
+
+    print("\nSlowest imports made by main.py (last run, cumulative):")
+    for us, name in slowest:
+        print(f"  {us / 1000:8.1f} ms  {name}")
+
+    ok = [f for f in firsts if f]
+    print(f"\nImport main.py: best {min(imports):.2f}s / avg {sum(imports) / len(imports):.2f}s")
+    if ok:
+        print(f"First request:  best {min(ok):.2f}s / avg {sum(ok) / len(ok):.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+import json
+import os
+import threading
+import time
+
+from persistence import persistence
+
+# How often the file is checked for edits made outside the app
+WATCH_INTERVAL = 2.0
+
+
+class ConfigStore:
+    """
+    The one in-memory copy of config.json. Settings are written through update()
+    (persisted behind by the persistence module) and listeners get the keys that
+    changed. The file is only read at load and, if watching, when someone else
+    edits it — never on the scheduler's hot path.
+    """
+
+    def __init__(self, path="config.json"):
+        self.path = path
+        self.lock = threading.Lock()
+        self.data = {}
+        self.listeners = []
+        self._mtime = None
+        self._watching = False
+
+    def load(self) -> bool:
+        """Reads the file once. False if there is none (caller writes defaults)."""
+        if not os.path.exists(self.path):
+            return False
+        self._mtime = self._stat()
+        data = self._read()
+        if data is not None:
+            with self.lock:
+                self.data = data
+        return True
+
+    def get(self, key, default=None):
+        with self.lock:
+            return self.data.get(key, default)
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return dict(self.data)
+
+    def update(self, values: dict) -> dict:
+        """Merges values, persists and notifies. Returns the keys that actually changed."""
+        with self.lock:
+            changes = {k: v for k, v in values.items() if self.data.get(k, object()) != v}
+            self.data.update(values)
+            # Queued under the lock: the watcher never sees new memory without a pending write
+            persistence.save(self.path, self.data)
+        if changes:
+            self._notify(changes)
+        return changes
+
+    def subscribe(self, callback):
+        """
+        callback(changes: dict) runs in the writer's thread (API, scheduler or watcher).
+        A None value means the key was deleted from the file.
+        """
+        self.listeners.append(callback)
+
+    def watch(self, interval=WATCH_INTERVAL):
+        """Picks up hand edits of the file (e.g. over SSH) without a restart."""
+        if self._watching: return
+        self._watching = True
+        threading.Thread(target=self._watch_loop, args=(interval,), daemon=True).start()
+
+    def _watch_loop(self, interval):
+        while True:
+            time.sleep(interval)
+            mtime = self._stat()
+            if mtime is None or mtime == self._mtime: continue
+            data = self._read()
+            if data is None: continue
+            with self.lock:
+                # Our own write still on its way: the file is older than memory, not an edit.
+                # Rewritten since we read it: leave _mtime alone and take the newer version next round.
+                if persistence.is_pending(self.path) or self._stat() != mtime: continue
+                self._mtime = mtime
+                changes = {k: v for k, v in data.items() if self.data.get(k, object()) != v}
+                # Keys deleted from the file are reported as None (listeners restore defaults)
+                changes.update({k: None for k in self.data if k not in data})
+                self.data = dict(data)
+            if changes:
+                print(f"Config: {self.path} changed on disk ({', '.join(sorted(changes))})")
+                self._notify(changes)
+
+    def _notify(self, changes):
+        for callback in list(self.listeners):
+            try:
+                callback(changes)
+            except Exception as e:
+                print(f"Config listener error: {e}")
+
+    def _stat(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _read(self):
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"Error loading config: {e}")
+            return None
+
+
+config_store = ConfigStore()
@@ -0,0 +1,129 @@
+import json
+import os
+import threading
+from datetime import date, datetime
+from typing import List, Optional, Tuple
+
+from persistence import persistence
+
+# Window kept per country, relative to the current year
+YEARS_BACK = 1
+YEARS_AHEAD = 2
+
+
+class HolidayService:
+    """
+    Public holidays for a sliding multi-year window, persisted to disk so boot
+    works offline and without importing the holidays package. Lookups are a dict
+    hit; the window moves forward by itself when the year changes.
+    """
+
+    def __init__(self, cache_file="holidays_cache.json"):
+        self.cache_file = cache_file
+        self.lock = threading.Lock()
+        self._build_lock = threading.Lock()  # One holidays-package build at a time
+        self.country = "TR"
+        self.cache = {}    # country -> { "years": [..], "days": { "YYYY-MM-DD": name } } (as stored)
+        self.days = {}     # date -> name for self.country
+        self.years = set()
+        self._extending = False
+        self._load_cache()
+        self._activate(self.country)
+
+    def set_country(self, country: str):
+        """Switches country. Uses the disk cache when possible; otherwise the window is built on first lookup."""
+        if not country: return
+        with self.lock:
+            if country == self.country and self.years: return
+            self.country = country
+            self._activate(country)
+
+    def is_holiday(self, day: date) -> bool:
+        self._ensure_year(day.year)
+        return day in self.days
+
+    def name(self, day: date) -> Optional[str]:
+        self._ensure_year(day.year)
+        return self.days.get(day)
+
+    def holidays_in(self, year: int) -> List[Tuple[date, str]]:
+        self._ensure_year(year)
+        return sorted((d, n) for d, n in self.days.items() if d.year == year)
+
+    def all_dates(self) -> List[str]:
+        """ISO dates of every holiday in the window (the 'skip all' default)."""
+        self._ensure_year(datetime.now().year)
+        return sorted(d.isoformat() for d in self.days)
+
+    def warm_up(self):
+        """Fills the window ahead of time (run off the event loop)."""
+        self._ensure_year(datetime.now().year)
+
+    def _ensure_year(self, year: int):
+        if year not in self.years:
+            # Only on a cold start without cache or a jump outside the window
+            with self._build_lock:
+                if year not in self.years:
+                    self._build(self.country, range(year - YEARS_BACK, year + YEARS_AHEAD + 1))
+        elif (year + YEARS_AHEAD) not in self.years and not self._extending:
+            # Year rolled over: next year is already cached, extend the window in the background
+            self._extending = True
+            threading.Thread(target=self._extend, args=(year,), daemon=True).start()
+
+    def _extend(self, year: int):
+        try:
+            with self._build_lock:
+                self._build(self.country, range(year - YEARS_BACK, year + YEARS_AHEAD + 1))
+        finally:
+            self._extending = False
+
+    def _build(self, country: str, years):
+        years = list(years)
+        try:
+            import holidays  # Slow import; only needed when the cache doesn't cover the window
+            table = holidays.country_holidays(country, years=years)
+            days = {d.isoformat(): name for d, name in table.items()}
+        except Exception as e:
+            print(f"Warning: Could not load holidays for {country} {years[0]}-{years[-1]}: {e}")
+            # Remember the attempt so the scheduler tick doesn't retry every second
+            with self.lock:
+                if country == self.country: self.years.update(years)
+            return
+
+        with self.lock:
+            # Merge with what's cached so a lookup of last year doesn't undo the rollover extension;
+            # years before the sliding window are dropped
+            oldest = min(years[0], datetime.now().year - YEARS_BACK)
+            previous = self.cache.get(country, {})
+            kept = [y for y in previous.get("years", []) if y >= oldest and y not in years]
+            for d, n in previous.get("days", {}).items():
+                if int(d[:4]) in kept: days[d] = n
+            years = sorted(set(years) | set(kept))
+            self.cache[country] = {"years": years, "days": days}
+            if country == self.country:
+                self._activate(country)
+        self._save_cache()
+        print(f"Holidays: {country} {years[0]}-{years[-1]} cached ({len(days)} days)")
+
+    def _activate(self, country: str):
+        # Caller holds self.lock (or is __init__)
+        entry = self.cache.get(country, {})
+        self.days = {date.fromisoformat(d): n for d, n in entry.get("days", {}).items()}
+        self.years = set(entry.get("years", []))
+
+    def _load_cache(self):
+        if not os.path.exists(self.cache_file):
+            return
+        try:
+            with open(self.cache_file, "r", encoding="utf-8") as f:
+                self.cache = json.load(f)
+        except Exception as e:
+            print(f"Holiday cache unreadable, rebuilding: {e}")
+            self.cache = {}
+
+    def _save_cache(self):
+        with self.lock:
+            persistence.save(self.cache_file, self.cache, indent=None, ensure_ascii=False)
+
+
+holiday_service = HolidayService()
@@ -0,0 +1,147 @@
+import asyncio
+import hashlib
+import os
+import uuid
+from typing import Optional
+
+from media_library import media_library
+from transcode_service import transcode_service
+
+MAX_UPLOAD_BYTES = 200 * 1024 * 1024  # Per file; a long DJ mix is ~150 MB at 320 kbps
+# Whole multipart request (a batch of files); larger ones are refused before the body is read
+MAX_REQUEST_BYTES = 5 * MAX_UPLOAD_BYTES
+CHUNK_SIZE = 1024 * 1024
+ALLOWED_EXTENSIONS = (".mp3",)
+
+
+def _hash_file(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class IngestService:
+    """
+    Streams uploads to a temp file next to their destination (off the event loop),
+    hashing as it goes, then renames them into place atomically. Identical content
+    already in the folder is detected and not written again.
+    """
+
+    def __init__(self, max_bytes=MAX_UPLOAD_BYTES):
+        self.max_bytes = max_bytes
+        self._hashes = {}  # path -> (size, mtime, sha256), so existing files are hashed once
+
+    def safe_name(self, filename: Optional[str]) -> Optional[str]:
+        """Strips directories from a client file name; None if it isn't an accepted type."""
+        name = os.path.basename((filename or "").replace("\\", "/")).strip()
+        if not name or name.startswith(".") or not name.lower().endswith(ALLOWED_EXTENSIONS):
+            return None
+        return name
+
+    async def ingest(self, upload, folder: str) -> Optional[dict]:
+        """
+        Saves one UploadFile into a library folder. Returns
+        { filename, status: saved|replaced|unchanged|duplicate|rejected, size, sha256 } or None if skipped.
+        A rejected file (too large) carries an error; the rest of the batch goes on.
+        """
+        name = self.safe_name(upload.filename)
+        if not name:
+            return None
+        if upload.size is not None and upload.size > self.max_bytes:
+            return self._too_large(name, upload.size)
+        target_dir = media_library.folders[folder]
+        os.makedirs(target_dir, exist_ok=True)
+        dest = os.path.join(target_dir, name)
+        tmp = os.path.join(target_dir, f".{name}.{uuid.uuid4().hex[:8]}.part")
+
+        h = hashlib.sha256()
+        size = 0
+        f = await asyncio.to_thread(open, tmp, "wb")
+        try:
+            while True:
+                chunk = await upload.read(CHUNK_SIZE)
+                if not chunk: break
+                size += len(chunk)
+                if size > self.max_bytes:
+                    break
+                h.update(chunk)
+                await asyncio.to_thread(f.write, chunk)
+            await asyncio.to_thread(f.close)
+        except BaseException:
+            await asyncio.to_thread(f.close)
+            await asyncio.to_thread(self._discard, tmp)
+            raise
+        if size > self.max_bytes:
+            await asyncio.to_thread(self._discard, tmp)
+            return self._too_large(name, size)
+
+        digest = h.hexdigest()
+        return await asyncio.to_thread(self._commit, tmp, dest, folder, name, size, digest)
+
+    def _too_large(self, name, size) -> dict:
+        return {"filename": name, "size": size, "status": "rejected",
+                "error": f"{name} exceeds {self.max_bytes // (1024 * 1024)} MB"}
+
+    def _commit(self, tmp, dest, folder, name, size, digest) -> dict:
+        result = {"filename": name, "size": size, "sha256": digest}
+
+        existing = self._find_same_content(folder, size, digest)
+        if existing == name:
+            self._discard(tmp)
+            result["status"] = "unchanged"
+            return result
+        if existing:
+            self._discard(tmp)
+            result.update(status="duplicate", duplicate_of=existing)
+            return result
+
+        replaced = os.path.exists(dest)
+        os.replace(tmp, dest)
+        st = os.stat(dest)
+        self._hashes[dest] = (st.st_size, st.st_mtime, digest)
+        result["status"] = "replaced" if replaced else "saved"
+        return result
+
+    def _find_same_content(self, folder, size, digest) -> Optional[str]:
+        directory = media_library.folders[folder]
+        # Transcoded files no longer hash like their upload; the manifest remembers the original
+        transcoded = transcode_service.source_match(folder, digest)
+        if transcoded: return transcoded
+        # Earlier files of the same batch may not be in the library index yet
+        for path, (known_size, known_mtime, known) in list(self._hashes.items()):
+            if known != digest or os.path.dirname(path) != directory: continue
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            if (st.st_size, st.st_mtime) == (known_size, known_mtime):
+                return os.path.basename(path)
+        # Only files of the same size can match, so most uploads hash nothing extra
+        for name in media_library.list(folder):
+            entry = media_library.get(folder, name)
+            if not entry or entry["size"] != size: continue
+            path = os.path.join(directory, name)
+            cached = self._hashes.get(path)
+            if cached and cached[0] == entry["size"] and cached[1] == entry["mtime"]:
+                file_digest = cached[2]
+            else:
+                try:
+                    file_digest = _hash_file(path)
+                except OSError:
+                    continue
+                self._hashes[path] = (entry["size"], entry["mtime"], file_digest)
+            if file_digest == digest:
+                return name
+        return None
+
+    @staticmethod
+    def _discard(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+ingest_service = IngestService()
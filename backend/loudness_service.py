@@ -0,0 +1,208 @@
+import hashlib
+import json
+import os
+import queue
+import re
+import shutil
+import subprocess
+import threading
+from typing import Optional
+
+from media_library import media_library
+from persistence import persistence
+
+# Playback target (speech/music on PA speakers) and how far we're willing to move a file
+TARGET_LUFS = -16.0
+MAX_BOOST_DB = 6.0
+MAX_CUT_DB = -12.0
+# Boosts never push the true peak above this
+PEAK_CEILING_DB = -1.0
+# Results are flushed to disk every N files so an interrupted run resumes where it stopped
+SAVE_EVERY = 20
+
+_SUMMARY_I = re.compile(r"I:\s+(-?[\d.]+|-inf)\s+LUFS")
+_SUMMARY_PEAK = re.compile(r"Peak:\s+(-?[\d.]+|-inf)\s+dBFS")
+
+
+def file_hash(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def measure(path: str) -> Optional[dict]:
+    """Integrated loudness and true peak via ffmpeg's ebur128 filter."""
+    cmd = ["ffmpeg", "-nostats", "-hide_banner", "-i", path,
+           "-af", "ebur128=peak=true", "-f", "null", "-"]
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=600)
+    except Exception as e:
+        print(f"Loudness: ffmpeg failed on {os.path.basename(path)}: {e}")
+        return None
+    # Only the final summary block matters; the per-frame lines come before it
+    summary = result.stderr[result.stderr.rfind("Summary:"):] if "Summary:" in result.stderr else ""
+    i_match = _SUMMARY_I.search(summary)
+    if not i_match:
+        print(f"Loudness: No measurement for {os.path.basename(path)}")
+        return None
+    lufs = i_match.group(1)
+    p_match = _SUMMARY_PEAK.search(summary)
+    peak = p_match.group(1) if p_match else None
+    return {
+        "lufs": None if lufs == "-inf" else float(lufs),
+        "peak": None if peak in (None, "-inf") else float(peak)
+    }
+
+
+def gain_for(measurement: Optional[dict]) -> float:
+    """dB offset that brings a measured file to TARGET_LUFS, within limits."""
+    if not measurement or measurement.get("lufs") is None:
+        return 0.0
+    gain = TARGET_LUFS - measurement["lufs"]
+    if measurement.get("peak") is not None:
+        gain = min(gain, PEAK_CEILING_DB - measurement["peak"])
+    return round(max(MAX_CUT_DB, min(MAX_BOOST_DB, gain)), 2)
+
+
+class LoudnessService:
+    """
+    Background EBU R128 analysis of the media library. Results are cached by file
+    content hash, so renames and re-uploads of the same file are never re-measured.
+    Playback only ever does a dict lookup (gain_db).
+    """
+
+    def __init__(self, cache_file="loudness_cache.json"):
+        self.cache_file = cache_file
+        self.lock = threading.Lock()
+        self.by_hash = {}   # content hash -> { lufs, peak }
+        self.by_path = {}   # path -> { size, mtime, hash }
+        self.gains = {}     # path -> dB, what playback reads
+        self.enabled = True
+        self.running = False
+        self.queue = queue.Queue()
+        self.analyzed = 0
+        self._load_cache()
+
+    def start(self):
+        if self.running: return
+        if not shutil.which("ffmpeg"):
+            print("Loudness: ffmpeg not found, files play at channel volume only")
+            return
+        self.running = True
+        media_library.add_listener(self.enqueue_folder)
+        threading.Thread(target=self._worker, daemon=True).start()
+        for folder in media_library.folders:
+            self.enqueue_folder(folder)
+
+    def stop(self):
+        self.running = False
+        self.queue.put(None)
+
+    def enqueue_folder(self, folder: str):
+        if self.running:
+            self.queue.put(folder)
+
+    def gain_db(self, path: Optional[str]) -> float:
+        if not self.enabled or not path:
+            return 0.0
+        return self.gains.get(os.path.normpath(path), 0.0)
+
+    def scaled_volume(self, volume: int, path: Optional[str]) -> int:
+        """Channel volume with the file's gain applied (VLC accepts up to 200%)."""
+        gain = self.gain_db(path)
+        if not gain:
+            return volume
+        return max(0, min(200, int(round(volume * 10 ** (gain / 20.0)))))
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "enabled": self.enabled,
+                "target_lufs": TARGET_LUFS,
+                "measured_files": len(self.gains),
+                "cached_measurements": len(self.by_hash),
+                "pending_folders": self.queue.qsize(),
+                "analyzed_this_run": self.analyzed
+            }
+
+    def _worker(self):
+        while self.running:
+            folder = self.queue.get()
+            if folder is None: break
+            try:
+                self._analyze_folder(folder)
+            except Exception as e:
+                print(f"Loudness: Analysis of {folder} failed: {e}")
+
+    def _analyze_folder(self, folder: str):
+        since_save = 0
+        for path in media_library.paths(folder):
+            if not self.running: break
+            path = os.path.normpath(path)
+            info = media_library.get(folder, os.path.basename(path))
+            if info is None: continue
+
+            with self.lock:
+                known = self.by_path.get(path)
+            if known and known["size"] == info["size"] and known["mtime"] == info["mtime"]:
+                digest = known["hash"]
+            else:
+                try:
+                    digest = file_hash(path)
+                except OSError:
+                    continue
+
+            with self.lock:
+                measurement = self.by_hash.get(digest)
+            if measurement is None:
+                measurement = measure(path)
+                if measurement is None: continue
+                self.analyzed += 1
+                since_save += 1
+
+            gain = gain_for(measurement)
+            with self.lock:
+                self.by_hash[digest] = measurement
+                self.by_path[path] = {"size": info["size"], "mtime": info["mtime"], "hash": digest}
+                self.gains[path] = gain
+            media_library.set_loudness(folder, os.path.basename(path), measurement.get("lufs"))
+
+            if since_save >= SAVE_EVERY:
+                self._save_cache()
+                media_library.save()
+                since_save = 0
+
+        # Forget files that left this folder
+        directory = os.path.normpath(media_library.folders[folder])
+        present = {os.path.normpath(p) for p in media_library.paths(folder)}
+        with self.lock:
+            for path in [p for p in self.by_path if os.path.dirname(p) == directory and p not in present]:
+                self.by_path.pop(path, None)
+                self.gains.pop(path, None)
+        self._save_cache()
+        media_library.save()
+
+    def _load_cache(self):
+        if not os.path.exists(self.cache_file):
+            return
+        try:
+            with open(self.cache_file, "r") as f:
+                data = json.load(f)
+            self.by_hash = data.get("measurements", {})
+            self.by_path = data.get("files", {})
+            # Gains are usable immediately; the worker re-validates paths against the library
+            for path, entry in self.by_path.items():
+                self.gains[path] = gain_for(self.by_hash.get(entry.get("hash")))
+        except Exception as e:
+            print(f"Loudness cache unreadable, re-analyzing: {e}")
+            self.by_hash, self.by_path, self.gains = {}, {}, {}
+
+    def _save_cache(self):
+        with self.lock:
+            # Serialized right here, so the snapshot can't change under the writer
+            persistence.save(self.cache_file, {"measurements": self.by_hash, "files": self.by_path}, indent=None)
+
+
+loudness_service = LoudnessService()
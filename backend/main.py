@@ -1,8 +1,8 @@
 import sys
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import Response 
+from fastapi.responses import Response, StreamingResponse, JSONResponse
 from pydantic import BaseModel
 from typing import List, Optional
 import shutil
@@ -12,8 +12,6 @@ import json
 from datetime import datetime
 import uvicorn
 import asyncio
-import asyncio
-import pandas as pd
 from io import BytesIO
 import platform
 import subprocess
@@ -21,20 +19,19 @@ import random
 
 from audio_engine import audio_engine
 from scheduler_service import scheduler
-from special_days_service import special_days_service
-
-def get_local_ip():
-    import socket
-    try:
-        # Connect to a public DNS to find own IP (doesn't send data)
-        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        s.connect(("8.8.8.8", 80))
-        ip = s.getsockname()[0]
-        s.close()
-        return ip
-    except Exception:
-        return "127.0.0.1" 
-
+from special_days_service import special_days_service, FEB29_POLICIES
+from tts_cache import tts_cache
+from holiday_service import holiday_service
+from media_library import media_library
+from loudness_service import loudness_service
+from stream_server import stream_server
+from ingest_service import ingest_service, MAX_REQUEST_BYTES
+from transcode_service import transcode_service
+from status_service import status_board, status_events, DEFAULT_POSITION_INTERVAL
+from persistence import persistence
+from radio_prober import radio_prober
+from stream_tuning import stream_tuning
+from stream_monitor import stream_monitor
 
 app = FastAPI(title="Workplace Bell System")
 
@@ -47,12 +44,35 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def invalidate_status_on_write(request, call_next):
+    response = await call_next(request)
+    # Settings/control endpoints change what /status reports; don't wait out the throttle
+    if request.method != "GET":
+        status_board.invalidate()
+    return response
+
+@app.middleware("http")
+async def limit_upload_size(request, call_next):
+    # Refused from the header alone; otherwise the whole body would be spooled before the endpoint runs
+    if request.method == "POST" and request.url.path.startswith("/files/"):
+        length = request.headers.get("content-length")
+        if length and length.isdigit() and int(length) > MAX_REQUEST_BYTES:
+            return JSONResponse(status_code=413, content={"detail": f"Upload exceeds {MAX_REQUEST_BYTES // (1024 * 1024)} MB"})
+    return await call_next(request)
+
 @app.on_event("shutdown")
 def shutdown_event():
     print("Application shutting down...", flush=True)
+    # Pending settings first; the audio cleanup below can fail half way
+    persistence.flush()
     try:
         # Stop all audio playback
         audio_engine.stop_media()
+        media_library.stop()
+        loudness_service.stop()
+        stream_server.stop()
+        transcode_service.shutdown()
         
         # Stop and release all VLC players
         if audio_engine.player:
@@ -153,15 +173,27 @@ class SpecialDayConfig(BaseModel):
     enabled: bool
     announcement_times: List[str]
     template: str
+    feb29_policy: Optional[str] = None # "feb28" or "mar1"
 
 @app.post("/special-days/config")
 def update_special_days_config(cfg: SpecialDayConfig):
     special_days_service.config["enabled"] = cfg.enabled
     special_days_service.config["announcement_times"] = cfg.announcement_times
     special_days_service.config["template"] = cfg.template
+    if cfg.feb29_policy:
+        if cfg.feb29_policy not in FEB29_POLICIES:
+            raise HTTPException(400, f"feb29_policy must be one of {', '.join(FEB29_POLICIES)}")
+        special_days_service.config["feb29_policy"] = cfg.feb29_policy
     special_days_service.save_data()
+    # Announcement times are part of the scheduler's event timeline
+    scheduler._invalidate_events()
     return {"status": "updated"}
 
+@app.get("/special-days/upcoming")
+def get_upcoming_special_days(days: int = 30):
+    """Birthdays in the next N days (max 366), from the month-day index."""
+    return special_days_service.upcoming(max(1, min(366, days)))
+
 class Person(BaseModel):
     name: str
     date: str
@@ -170,19 +202,22 @@ class Person(BaseModel):
 def update_special_days_people(people: List[Person]):
     special_days_service.people = [p.dict() for p in people]
     special_days_service.save_data()
+    scheduler.request_prerender()
     return {"status": "updated"}
 
 @app.post("/special-days/import")
-async def import_special_days(file: UploadFile = File(...)):
+def import_special_days(file: UploadFile = File(...)):
+    # Plain def: FastAPI runs it in the threadpool, so a large HR sheet never blocks bells or /status
     # Save to temp
     path = f"temp_{file.filename}"
     with open(path, "wb") as buffer:
         shutil.copyfileobj(file.file, buffer)
     
     try:
-        count = special_days_service.import_from_excel(path)
+        report = special_days_service.import_from_excel(path)
         os.remove(path)
-        return {"status": "success", "count": count}
+        scheduler.request_prerender()
+        return {"status": "success", "count": report["accepted"] + report["updated"], "report": report}
     except Exception as e:
         if os.path.exists(path): os.remove(path)
         raise HTTPException(400, str(e))
@@ -191,6 +226,7 @@ async def import_special_days(file: UploadFile = File(...)):
 def download_template():
     # Generate a dummy excel or csv
     # Use pandas
+    import pandas as pd # Loaded on first use; it's the slowest import we have
     df = pd.DataFrame([{"Ad Soyad": "Örnek İsim", "Tarih": "1990-01-30"}])
     output = BytesIO()
     # Excel is best for user
@@ -210,11 +246,10 @@ def manual_special_day_announcement(req: ManualAnnouncementRequest):
     """Manually trigger a special day announcement for a specific person"""
     try:
         text = special_days_service.generate_announcement_text([req.name])
-        filename = scheduler.generate_tts_audio(text)
-        if filename:
-            path = os.path.join(scheduler.announcement_dir, filename)
-            # Run in thread to not block API
-            threading.Thread(target=audio_engine.play_alert, args=(path, scheduler.volume_bell), daemon=True).start()
+        path = scheduler.render_tts(text)
+        if path:
+            # Queued on the audio worker so the API returns immediately
+            audio_engine.play_alert_async(path)
             return {"status": "playing", "text": text}
         else:
             raise HTTPException(500, "TTS Generation Failed")
@@ -231,6 +266,14 @@ def stop_special_day_announcement():
         raise HTTPException(500, str(e))
 
 
+def _background_warm_up():
+    # Index audio folders once; later listings and lookups are served from memory
+    media_library.start()
+    # Loudness analysis runs in the background and never blocks playback
+    loudness_service.start()
+    # Holidays table and TTS engines (lookups before this finishes just load them on demand)
+    scheduler.warm_up()
+
 @app.on_event("startup")
 async def startup_event():
     print("Initializing Scheduler Service...")
@@ -240,12 +283,25 @@ async def startup_event():
         if not os.path.exists(d):
             os.makedirs(d)
 
+    # Transcode results never replace a file a player has open or queued
+    transcode_service.in_use = audio_engine.is_using
+
+    # The scheduler comes first: a bell due right after power-on must not wait for anything below
     if scheduler.start_on_boot:
         print("Restoring active state...")
         scheduler.start()
     else:
         print("Scheduler inactive on boot (as per last state).")
 
+    # Slow warm-up runs off the event loop so the API answers immediately
+    threading.Thread(target=_background_warm_up, daemon=True).start()
+    # Station health for failover; the selected URL is checked even if it isn't in the list.
+    # Rounds only run while radio is the music source and a break (or manual radio) is on.
+    radio_prober.start(lambda: scheduler.radio_stations + [{"name": "Seçili istasyon", "url": scheduler.radio_url}],
+                       wanted=scheduler.radio_probe_wanted)
+    # Stall / dead-air watch on live break music
+    stream_monitor.start()
+
     # Initialize Audio Engine with Streaming Config
     audio_engine.set_streaming_config(scheduler.streaming_enabled, scheduler.streaming_port)
 
@@ -309,8 +365,25 @@ class TtsEngineReq(BaseModel):
 def set_tts_engine(req: TtsEngineReq):
     scheduler.tts_engine = req.engine
     scheduler._save_config()
+    # Pre-rendered announcements are in the old voice
+    scheduler.request_prerender()
     return {"status": "ok", "engine": req.engine}
 
+@app.get("/tts/cache")
+def get_tts_cache_stats():
+    """Hit/miss counters and size of the rendered TTS cache."""
+    return tts_cache.stats()
+
+@app.delete("/tts/cache")
+def clear_tts_cache():
+    tts_cache.clear()
+    return {"status": "cleared"}
+
+@app.get("/loudness")
+def get_loudness_stats():
+    """Progress of the background loudness analysis."""
+    return loudness_service.stats()
+
 class PreviewRequest(BaseModel):
     folder: str
     filename: str
@@ -325,40 +398,23 @@ class RadioSettings(BaseModel):
     source: str # 'local' or 'radio'
 
 @app.get("/status")
-def get_status():
-    stats = audio_engine.get_playback_stats()
-    # Return volume of the CURRENT active channel (music or manual)
-    current_vol = audio_engine.get_channel_volume(audio_engine.current_volume_type)
-    
-    return {
-        "state": scheduler.current_state,
-        "is_playing": audio_engine.check_music_status(),
-        "volume": current_vol,
-        "current_volume_type": audio_engine.current_volume_type,  # 'music' or 'manual'
-        "current_media": audio_engine.current_media_source,
-        "next_event": scheduler.next_event_name,
-        "next_event_time": scheduler.next_event_time,
-        "company_name": scheduler.company_name,
-        "radio_url": scheduler.radio_url,
-        "radio_stations": scheduler.radio_stations,
-        "music_source": scheduler.music_source,
-        "media_time": stats["time"],
-        "media_duration": stats["duration"],
-        "daily_timeline": scheduler.get_daily_timeline(),
-        "scheduler_running": scheduler.running,
-        "volume_bell": scheduler.volume_bell,
-        "volume_music": scheduler.volume_music,
-        "volume_manual": scheduler.volume_manual,
-        "start_on_boot": scheduler.start_on_boot,
-        "media_stats": stats.get("stats"),
-        "streaming": {
-            "enabled": scheduler.streaming_enabled,
-            "port": scheduler.streaming_port
-        },
-        "app_autostart_enabled": scheduler.app_autostart_enabled,
-        "system_ip": get_local_ip(),
-        "audio_device_id": getattr(scheduler, "audio_device_id", None)
-    }
+def get_status(request: Request):
+    # Dashboards poll every second; unchanged snapshots are answered with a bare 304
+    etag, body = status_board.current()
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@app.get("/status/stream")
+def status_stream(position_interval: float = DEFAULT_POSITION_INTERVAL):
+    """Server-sent status: full snapshot, then field-level deltas as they happen."""
+    position_interval = max(0.25, min(60.0, position_interval))
+    return StreamingResponse(
+        status_events(position_interval),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 # ... (rest of code)
 
@@ -381,8 +437,20 @@ def set_radio_settings(payload: RadioSettings):
               scheduler._play_music(channel=target_channel)
               
     scheduler._save_config()
+    radio_prober.probe_now()
     return {"status": "updated"}
 
+@app.get("/radio/health")
+def get_radio_health():
+    """Stations ranked by health and time to first audio (from the background prober), with playback tuning and live monitor."""
+    return {"last_round": radio_prober.last_round, "stations": radio_prober.ranking(),
+            "tuning": stream_tuning.stats(), "monitor": stream_monitor.stats()}
+
+@app.post("/radio/health/probe")
+def probe_radio_stations():
+    radio_prober.probe_now(force=True)
+    return {"status": "probing"}
+
 
 
 @app.post("/control/stop")
@@ -518,10 +586,8 @@ def set_streaming_settings(payload: StreamingSettings):
     scheduler.streaming_port = payload.port
     scheduler._save_config()
     
-    audio_engine.set_streaming_config(payload.enabled, payload.port)
-    
-    # Restart playback if active so streaming starts/stops immediately
-    if audio_engine.check_music_status():
+    # The persistent encoder picks this up live; VLC's own sout (fallback hosts) needs a restart
+    if audio_engine.set_streaming_config(payload.enabled, payload.port) and audio_engine.check_music_status():
         print("Streaming config changed while playing. Restarting playback...")
         # Determine current channel type to preserve volume behavior
         channel = audio_engine.current_volume_type
@@ -539,6 +605,7 @@ def restart_application():
         scheduler.stop()
         audio_engine.stop_media()
     except: pass
+    persistence.flush()
     
     # Update browser lock to prevent re-opening UI on restart loops if checking specifically
     # But usually we WANT it to open if it was closed.
@@ -613,22 +680,22 @@ def preview_audio(req: PreviewRequest):
     if req.filename == "default" and "end" in base_dir: filename = "work_end.mp3" # Naive, better to trust filename passed from frontend handles defaults? 
     # Frontend sends "default" string. Let's just try to play 'work_start.mp3' if default.
     
-    path = os.path.join(base_dir, filename)
-    if not os.path.exists(path):
+    path = media_library.find(filename, [base_dir])
+    if not path:
          # Try fallback for default
          if req.filename == "default":
              # We don't know if it's start or end here easily without more context.
              # Let's assume frontend resolves "default" to actual filename?
              # No, frontend sends "default".
              # Let's just trust the user selected a file, or if default, play work_start as generic test.
-             path = os.path.join("bells", "work_start.mp3")
+             path = media_library.find("work_start.mp3", ["bells"])
     
-    if os.path.exists(path):
+    if path:
         if base_dir == "music":
              # Use manual channel logic for previews
-             audio_engine.play_media(path, 'file', volume_type='manual')
+             audio_engine.play_media_async(path, 'file', volume_type='manual')
         else:
-             audio_engine.play_alert(path)
+             audio_engine.play_alert_async(path)
         return {"status": "playing", "file": path}
     else:
         raise HTTPException(status_code=404, detail="File not found")
@@ -654,7 +721,7 @@ def make_tts_announcement(req: TTSRequest):
         
         # Verify file integrity (Basic check) to prevent playing empty/corrupt files
         if os.path.exists(path) and os.path.getsize(path) > 1024: # > 1KB
-            audio_engine.play_alert(path)
+            audio_engine.play_alert_async(path)
             return {"status": "playing", "file": filename}
         else:
             # If Edge TTS failed silently or with partial file
@@ -672,10 +739,9 @@ def get_holiday_settings():
     current_year = now.year
     
     try:
-        import holidays
-        country_holidays = holidays.country_holidays(scheduler.holiday_country, years=current_year)
-        
-        for date, name in sorted(country_holidays.items()):
+        # Served from the cached multi-year table (no holidays-package call per request)
+        holiday_service.set_country(scheduler.holiday_country)
+        for date, name in holiday_service.holidays_in(current_year):
             d_str = date.isoformat()
             all_holidays.append({
                 "date": d_str,
@@ -702,12 +768,10 @@ def set_holiday_settings(payload: HolidaySettings):
     scheduler.skipped_holidays = payload.skipped_holidays
     if payload.country:
         scheduler.holiday_country = payload.country
-        try:
-            import holidays
-            scheduler.tr_holidays = holidays.country_holidays(payload.country, years=datetime.now().year)
-        except Exception as e:
-            print(f"Warning: Could not load holidays for {payload.country}: {e}")
+        holiday_service.set_country(payload.country)
     scheduler._save_config()
+    # Today's triggers depend on whether today is a skipped holiday
+    scheduler._invalidate_events()
     return {"status": "updated", "skipped_holidays": payload.skipped_holidays, "holiday_country": scheduler.holiday_country}
 
 @app.get("/schedule")
@@ -724,10 +788,7 @@ def list_files(folder: str):
     if folder not in ["music", "bells", "announcements"]:
         return []
     
-    target_dir = "audio" if folder == "music" else folder
-    if not os.path.exists(target_dir): return []
-    
-    files = sorted([f for f in os.listdir(target_dir) if f.endswith(".mp3")])
+    files = media_library.list(folder)
     
     # We return ALL files now, allowing Frontend to separate "temp_tts_" into a history section
     
@@ -738,18 +799,30 @@ async def upload_files(folder: str, files: List[UploadFile] = File(...)):
     if folder not in ["music", "bells", "announcements"]:
          raise HTTPException(status_code=400, detail="Invalid folder")
     
-    target_dir = "audio" if folder == "music" else folder
     saved_files = []
-    
-    for file in files:
-        if not file.filename.endswith(".mp3"): continue
-        
-        path = os.path.join(target_dir, file.filename)
-        with open(path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        saved_files.append(file.filename)
+    results = []
+    try:
+        for file in files:
+            # Streamed to disk in chunks off the event loop; /status stays responsive during bulk uploads
+            result = await ingest_service.ingest(file, folder)
+            if not result: continue
+            results.append(result)
+            if result["status"] not in ("duplicate", "rejected"):
+                saved_files.append(result["filename"])
+            if result["status"] in ("saved", "replaced"):
+                # Normalized in the background; the file is playable as uploaded meanwhile
+                job = transcode_service.submit(folder, result["filename"], result["sha256"])
+                if job: result["job_id"] = job["id"]
+    finally:
+        if results:
+            await asyncio.to_thread(media_library.refresh, folder)
         
-    return {"filenames": saved_files}
+    return {"filenames": saved_files, "results": results}
+
+@app.get("/ingest/jobs")
+def get_ingest_jobs():
+    """Transcode queue and recent results for uploaded/generated media."""
+    return transcode_service.get_jobs()
 
 class ManualMusic(BaseModel):
     enable: bool
@@ -778,6 +851,8 @@ def delete_file(folder: str, filename: str):
     
     if os.path.exists(path):
         os.remove(path)
+        media_library.refresh(folder)
+        transcode_service.forget(folder, filename)
         return {"status": "deleted", "filename": filename}
     else:
         raise HTTPException(status_code=404, detail="File not found")
@@ -839,8 +914,7 @@ async def import_settings(file: UploadFile = File(...)):
         
         # Validate and Apply
         if "schedule" in data:
-            scheduler.schedule = data["schedule"]
-            scheduler._save_schedule()
+            scheduler.load_schedule(data["schedule"])
             
         if "config" in data:
             cfg = data["config"]
@@ -853,12 +927,13 @@ async def import_settings(file: UploadFile = File(...)):
             scheduler.volume_manual = cfg.get("volume_manual", scheduler.volume_manual)
             scheduler.skipped_holidays = cfg.get("skipped_holidays", scheduler.skipped_holidays)
             scheduler.holiday_country = cfg.get("holiday_country", scheduler.holiday_country)
+            holiday_service.set_country(scheduler.holiday_country)
             scheduler.start_on_boot = cfg.get("start_on_boot", scheduler.start_on_boot)
             scheduler.restore_manual_playback = cfg.get("restore_manual_playback", scheduler.restore_manual_playback)
             
             if "streaming" in cfg:
                  scheduler.streaming_enabled = cfg["streaming"].get("enabled", False)
-                 scheduler.streaming_port = cfg["streaming"].get("port", 5959)
+                 scheduler.streaming_port = cfg["streaming"].get("port", 8080)
             
             scheduler.app_autostart_enabled = cfg.get("app_autostart_enabled", False)
             
@@ -885,6 +960,7 @@ def get_day_index(name):
 @app.get("/backup/export/excel")
 def export_settings_excel():
     """Exports settings and schedule as an Excel file."""
+    import pandas as pd
     # 1. Config Sheet
     config_data = {
         "Ayar": [
@@ -971,6 +1047,7 @@ def download_template_excel():
     return export_settings_excel()
 
 async def import_settings_excel(file: UploadFile):
+    import pandas as pd
     try:
         contents = await file.read()
         xls = pd.ExcelFile(BytesIO(contents))
@@ -1001,7 +1078,9 @@ async def import_settings_excel(file: UploadFile):
             if radio: scheduler.radio_url = str(radio)
             
             country = get_val("Tatil Ülkesi")
-            if country: scheduler.holiday_country = str(country)
+            if country:
+                scheduler.holiday_country = str(country)
+                holiday_service.set_country(scheduler.holiday_country)
             
             skipped = get_val("Atlanan Tatiller")
             if skipped: scheduler.skipped_holidays = [s.strip() for s in str(skipped).split(",") if s.strip()]
@@ -1080,8 +1159,7 @@ async def import_settings_excel(file: UploadFile):
                 }
                 new_schedule[day_idx]["activities"].append(activity)
             
-            scheduler.schedule = new_schedule
-            scheduler._save_schedule()
+            scheduler.load_schedule(new_schedule)
 
         return {"status": "ok", "message": "Excel Settings imported successfully"}
 
@@ -1097,6 +1175,8 @@ if os.path.isdir("static"):
     app.mount("/", StaticFiles(directory="static", html=True), name="static")
 
 if __name__ == "__main__":
+    import multiprocessing
+    multiprocessing.freeze_support() # Transcode pool workers in the frozen build
     print("Starting NikolayCo SmartZill...", flush=True)
     
     # SYSTEM SAFETY: Force system volume to safe level on startup
@@ -0,0 +1,290 @@
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+from persistence import persistence
+
+# UI folder name -> directory on disk
+LIBRARY_FOLDERS = {
+    "music": "audio",
+    "bells": "bells",
+    "announcements": "announcements"
+}
+AUDIO_EXTENSIONS = (".mp3",)
+# Only used when watchdog is not installed
+POLL_INTERVAL = 5.0
+# A single upload fires many watchdog events; rescan once they settle
+WATCH_DEBOUNCE = 0.5
+
+
+def _read_tags(path: str) -> dict:
+    """Duration/bitrate via mutagen. Missing values stay None."""
+    from mutagen import File as MutagenFile
+    try:
+        audio = MutagenFile(path)
+        if audio is None or audio.info is None:
+            return {}
+        bitrate = getattr(audio.info, "bitrate", 0) or 0
+        return {
+            "duration": round(float(audio.info.length), 2),
+            "bitrate": int(bitrate // 1000) if bitrate else None
+        }
+    except Exception as e:
+        print(f"Library: Could not read tags of {os.path.basename(path)}: {e}")
+        return {}
+
+
+class MediaLibrary:
+    """
+    In-memory index of the audio folders. Built once, then kept current by a
+    watcher (watchdog if installed, directory mtime polling otherwise).
+    """
+
+    def __init__(self, folders=None, index_file="media_index.json"):
+        self.folders = dict(folders or LIBRARY_FOLDERS)
+        self.index_file = index_file
+        self.lock = threading.RLock()
+        self.entries: Dict[str, Dict[str, dict]] = {}  # folder -> filename -> { size, mtime, duration, bitrate, loudness }
+        self.sorted_names: Dict[str, List[str]] = {}
+        self.dir_mtimes: Dict[str, float] = {}
+        self.listeners = []
+        self.running = False
+        self.observer = None
+        self._scan_timers = {}
+        self._metadata_pending = threading.Event()
+        self._dirty = False  # In-memory changes not yet in the index file (see save())
+        self._load_index()
+
+    # --- Lookups ---
+
+    def list(self, folder: str) -> List[str]:
+        """Sorted file names of a folder."""
+        self._ensure(folder)
+        with self.lock:
+            return list(self.sorted_names.get(folder, []))
+
+    def paths(self, folder: str) -> List[str]:
+        directory = self.folders[folder]
+        return [os.path.join(directory, f) for f in self.list(folder)]
+
+    def get(self, folder: str, filename: str) -> Optional[dict]:
+        self._ensure(folder)
+        with self.lock:
+            entry = self.entries.get(folder, {}).get(filename)
+            return dict(entry) if entry else None
+
+    def find(self, filename: str, order: List[str]) -> Optional[str]:
+        """Path of the first folder in `order` that holds this file, or None."""
+        for folder in order:
+            self._ensure(folder)
+            with self.lock:
+                if filename in self.entries.get(folder, {}):
+                    return os.path.join(self.folders[folder], filename)
+        return None
+
+    def folder_of(self, path: str) -> Optional[str]:
+        directory = os.path.dirname(os.path.normpath(path))
+        for folder, d in self.folders.items():
+            if os.path.normpath(d) == directory:
+                return folder
+        return None
+
+    def set_loudness(self, folder: str, filename: str, loudness):
+        """Records a measurement in memory only; the analyzer calls save() once per batch."""
+        with self.lock:
+            entry = self.entries.get(folder, {}).get(filename)
+            if entry is not None and entry.get("loudness") != loudness:
+                entry["loudness"] = loudness
+                self._dirty = True
+
+    def save(self):
+        """Queues an index write if anything changed since the last one (debounced, off the lock)."""
+        with self.lock:
+            if not self._dirty: return
+            self._dirty = False
+            snapshot = {folder: {name: dict(e) for name, e in files.items()} for folder, files in self.entries.items()}
+        persistence.save(self.index_file, {"folders": snapshot}, indent=None)
+
+    def add_listener(self, callback):
+        """callback(folder) after a folder's contents changed."""
+        self.listeners.append(callback)
+
+    # --- Scanning ---
+
+    def refresh(self, folder: Optional[str] = None):
+        """Rescans one folder (or all). Cheap for unchanged files: only a stat each."""
+        for name in ([folder] if folder else list(self.folders)):
+            self._scan(name)
+
+    def _ensure(self, folder: str):
+        if folder not in self.sorted_names and folder in self.folders:
+            self._scan(folder)
+
+    def _scan(self, folder: str):
+        directory = self.folders.get(folder)
+        if directory is None:
+            return
+        found = {}
+        try:
+            dir_mtime = os.stat(directory).st_mtime
+            with os.scandir(directory) as it:
+                for item in it:
+                    if not item.name.lower().endswith(AUDIO_EXTENSIONS) or not item.is_file():
+                        continue
+                    st = item.stat()
+                    found[item.name] = (st.st_size, st.st_mtime)
+        except FileNotFoundError:
+            dir_mtime = None
+
+        changed = False
+        with self.lock:
+            old = self.entries.get(folder, {})
+            current = {}
+            for name, (size, mtime) in found.items():
+                entry = old.get(name)
+                if entry and entry.get("size") == size and entry.get("mtime") == mtime:
+                    current[name] = entry
+                    continue
+                # New or rewritten file; tags are read in the background
+                current[name] = {"size": size, "mtime": mtime, "duration": None, "bitrate": None, "loudness": None}
+                changed = True
+            if set(old) != set(current):
+                changed = True
+            self.entries[folder] = current
+            self.sorted_names[folder] = sorted(current)
+            self.dir_mtimes[folder] = dir_mtime
+            if changed:
+                self._dirty = True
+
+        if changed:
+            self.save()
+            self._metadata_pending.set()
+            for cb in self.listeners:
+                try:
+                    cb(folder)
+                except Exception as e:
+                    print(f"Library listener error: {e}")
+
+    def _metadata_worker(self):
+        try:
+            import mutagen  # noqa: F401
+        except ImportError:
+            print("Library: mutagen not installed, durations/bitrates unavailable")
+            return
+        while self.running:
+            self._metadata_pending.wait()
+            self._metadata_pending.clear()
+            with self.lock:
+                todo = [(folder, name) for folder, files in self.entries.items()
+                        for name, e in files.items() if e.get("duration") is None and not e.get("no_tags")]
+            for folder, name in todo:
+                if not self.running: return
+                tags = _read_tags(os.path.join(self.folders[folder], name))
+                with self.lock:
+                    entry = self.entries.get(folder, {}).get(name)
+                    if entry is None: continue
+                    entry.update(tags)
+                    if not tags: entry["no_tags"] = True  # Don't retry every rescan
+                    self._dirty = True
+            if todo:
+                self.save()
+
+    # --- Watching ---
+
+    def start(self):
+        """Initial scan plus change watching. Safe to call more than once."""
+        if self.running: return
+        self.running = True
+        self.refresh()
+        threading.Thread(target=self._metadata_worker, daemon=True).start()
+        self._metadata_pending.set()
+
+        if self._start_watchdog():
+            print("Library: Watching folders for changes (watchdog)")
+        else:
+            print(f"Library: Polling folders every {POLL_INTERVAL:.0f}s")
+            threading.Thread(target=self._poll_loop, daemon=True).start()
+
+    def stop(self):
+        self.running = False
+        self._metadata_pending.set()
+        if self.observer:
+            try:
+                self.observer.stop()
+            except Exception:
+                pass
+
+    def _start_watchdog(self) -> bool:
+        try:
+            from watchdog.observers import Observer
+            from watchdog.events import FileSystemEventHandler
+        except ImportError:
+            return False
+
+        library = self
+
+        class _Handler(FileSystemEventHandler):
+            def __init__(self, folder):
+                self.folder = folder
+
+            def on_any_event(self, event):
+                if not event.is_directory:
+                    library._schedule_scan(self.folder)
+
+        try:
+            observer = Observer()
+            for folder, directory in self.folders.items():
+                os.makedirs(directory, exist_ok=True)
+                observer.schedule(_Handler(folder), directory, recursive=False)
+            observer.daemon = True
+            observer.start()
+            self.observer = observer
+            return True
+        except Exception as e:
+            print(f"Library: watchdog unavailable ({e}), falling back to polling")
+            return False
+
+    def _schedule_scan(self, folder: str):
+        with self.lock:
+            if folder in self._scan_timers: return
+            timer = threading.Timer(WATCH_DEBOUNCE, self._run_scheduled_scan, args=(folder,))
+            timer.daemon = True
+            self._scan_timers[folder] = timer
+        timer.start()
+
+    def _run_scheduled_scan(self, folder: str):
+        with self.lock:
+            self._scan_timers.pop(folder, None)
+        self._scan(folder)
+
+    def _poll_loop(self):
+        # Adding/removing/renaming a file bumps the directory mtime; in-place rewrites
+        # are reported by the upload/delete endpoints calling refresh() directly.
+        while self.running:
+            time.sleep(POLL_INTERVAL)
+            for folder, directory in self.folders.items():
+                try:
+                    mtime = os.stat(directory).st_mtime
+                except FileNotFoundError:
+                    mtime = None
+                if mtime != self.dir_mtimes.get(folder):
+                    self._scan(folder)
+
+    # --- Persistence ---
+
+    def _load_index(self):
+        if not os.path.exists(self.index_file):
+            return
+        try:
+            with open(self.index_file, "r") as f:
+                data = json.load(f)
+            # Cached entries are only reused when size+mtime still match (see _scan)
+            self.entries = {k: v for k, v in data.get("folders", {}).items() if k in self.folders}
+        except Exception as e:
+            print(f"Library index unreadable, rescanning: {e}")
+            self.entries = {}
+
+
+media_library = MediaLibrary()
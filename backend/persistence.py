@@ -0,0 +1,132 @@
+import atexit
+import json
+import os
+import threading
+import time
+
+# Quiet period after the last change before the file is written (slider drags, bulk edits)
+WRITE_DELAY = 1.0
+# A steady stream of changes still reaches the disk at least this often
+MAX_WRITE_DELAY = 5.0
+
+
+def atomic_write(path: str, payload: str):
+    """Writes via temp file + fsync + rename, so a power cut leaves the old or the new file, never half of one."""
+    directory = os.path.dirname(os.path.abspath(path))
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    if os.name == 'posix':
+        # Make the rename itself durable
+        fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+class Persistence:
+    """
+    Write-behind for the JSON state files. save() snapshots the data right away
+    (callers may keep mutating it) and one background thread writes the latest
+    snapshot per file once changes settle. Writers to the same file are serialized.
+    """
+
+    def __init__(self, delay=WRITE_DELAY, max_delay=MAX_WRITE_DELAY):
+        self.delay = delay
+        self.max_delay = max_delay
+        self.cond = threading.Condition()
+        self.pending = {}      # path -> [payload, due, deadline, seq]
+        self.file_locks = {}   # path -> Lock (held while writing that file)
+        self.written = {}      # path -> seq on disk; an older snapshot never overwrites a newer one
+        self.inflight = {}     # path -> writes in progress
+        self.seq = 0
+        self.writes = 0
+        self.coalesced = 0
+        self.thread = None
+
+    def save(self, path: str, data, indent=4, ensure_ascii=True):
+        """Schedules a write of data to path. Bursts of calls produce one write."""
+        payload = json.dumps(data, indent=indent, ensure_ascii=ensure_ascii)
+        now = time.monotonic()
+        with self.cond:
+            self.seq += 1
+            entry = self.pending.get(path)
+            if entry:
+                self.coalesced += 1
+                entry[0] = payload
+                entry[1] = min(now + self.delay, entry[2])
+                entry[3] = self.seq
+            else:
+                self.pending[path] = [payload, now + self.delay, now + self.max_delay, self.seq]
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, daemon=True)
+                self.thread.start()
+            self.cond.notify()
+
+    def save_now(self, path: str, data, indent=4, ensure_ascii=True):
+        """Synchronous write (replaces anything pending for the file)."""
+        payload = json.dumps(data, indent=indent, ensure_ascii=ensure_ascii)
+        with self.cond:
+            self.seq += 1
+            seq = self.seq
+            self.pending.pop(path, None)
+        self._write(path, payload, seq)
+
+    def flush(self):
+        """Writes everything pending now (shutdown, restart)."""
+        with self.cond:
+            items = list(self.pending.items())
+            self.pending.clear()
+        for path, (payload, _, _, seq) in items:
+            self._write(path, payload, seq)
+
+    def is_pending(self, path: str) -> bool:
+        """True while a write of path is queued or in progress (the file lags memory)."""
+        with self.cond:
+            return path in self.pending or self.inflight.get(path, 0) > 0
+
+    def stats(self) -> dict:
+        with self.cond:
+            return {"pending": len(self.pending), "writes": self.writes, "coalesced": self.coalesced}
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while not self.pending:
+                    self.cond.wait()
+                now = time.monotonic()
+                due = [p for p, e in self.pending.items() if e[1] <= now]
+                if not due:
+                    self.cond.wait(min(e[1] for e in self.pending.values()) - now)
+                    continue
+                items = [(p, self.pending.pop(p)) for p in due]
+                for p in due: self.inflight[p] = self.inflight.get(p, 0) + 1
+            for path, entry in items:
+                try:
+                    self._write(path, entry[0], entry[3])
+                finally:
+                    with self.cond:
+                        self.inflight[path] -= 1
+
+    def _write(self, path, payload, seq):
+        with self.cond:
+            lock = self.file_locks.setdefault(path, threading.Lock())
+        with lock:
+            if self.written.get(path, 0) > seq:
+                return
+            try:
+                atomic_write(path, payload)
+                with self.cond:
+                    self.writes += 1
+                    self.written[path] = seq
+            except Exception as e:
+                print(f"Save error ({path}): {e}")
+
+
+persistence = Persistence()
+# Last line of defence if the process exits without the shutdown hook
+atexit.register(persistence.flush)
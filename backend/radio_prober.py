@@ -0,0 +1,284 @@
+import asyncio
+import ssl
+import threading
+import time
+from collections import deque
+from typing import Optional
+from urllib.parse import urljoin, urlsplit
+
+from url_resolver import is_indirect
+
+# Seconds between rounds while stations are needed (a playback failure triggers one right away)
+PROBE_INTERVAL = 180
+# Stations probed at the same time
+MAX_CONCURRENCY = 4
+# Per-station budget: connect, headers, playlist(s) and the first audio bytes
+PROBE_TIMEOUT = 8.0
+# Results kept per station for the failure rate
+HISTORY = 10
+# A station is healthy if its last probe worked and at most this share of recent ones failed
+MAX_FAILURE_RATE = 0.5
+MAX_REDIRECTS = 5
+MAX_PLAYLIST_BYTES = 256 * 1024
+USER_AGENT = "SmartZill/1.0 (radio health check)"
+
+
+class ProbeError(Exception):
+    pass
+
+
+async def _request(url: str, timings: dict):
+    """Opens url and returns (reader, writer, headers, final_url). Follows redirects; ICY answers count as 200."""
+    for _ in range(MAX_REDIRECTS + 1):
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https"):
+            raise ProbeError(f"unsupported scheme {parts.scheme!r}")
+        secure = parts.scheme == "https"
+        port = parts.port or (443 if secure else 80)
+        started = time.perf_counter()
+        reader, writer = await asyncio.open_connection(
+            parts.hostname, port, ssl=ssl.create_default_context() if secure else None,
+            server_hostname=parts.hostname if secure else None)
+        timings.setdefault("connect_ms", round((time.perf_counter() - started) * 1000))
+
+        path = parts.path or "/"
+        if parts.query: path += "?" + parts.query
+        writer.write((f"GET {path} HTTP/1.1\r\nHost: {parts.netloc}\r\nUser-Agent: {USER_AGENT}\r\n"
+                      f"Accept: */*\r\nIcy-MetaData: 0\r\nConnection: close\r\n\r\n").encode())
+        await writer.drain()
+
+        head = await reader.readuntil(b"\r\n\r\n")
+        lines = head.decode("latin-1").split("\r\n")
+        status_parts = lines[0].split(" ", 2)
+        status = int(status_parts[1]) if len(status_parts) > 1 and status_parts[1].isdigit() else 0
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                k, v = line.split(":", 1)
+                headers[k.strip().lower()] = v.strip()
+
+        if status in (301, 302, 303, 307, 308) and headers.get("location"):
+            writer.close()
+            url = urljoin(url, headers["location"])
+            continue
+        if status != 200:
+            writer.close()
+            raise ProbeError(f"HTTP {status or lines[0][:40]}")
+        return reader, writer, headers, url
+    raise ProbeError("too many redirects")
+
+
+async def _read_body(reader, headers) -> bytes:
+    """Whole (small) body, de-chunked; for playlists only."""
+    if headers.get("transfer-encoding", "").lower() == "chunked":
+        body = b""
+        while len(body) < MAX_PLAYLIST_BYTES:
+            size = int((await reader.readline()).split(b";")[0].strip() or b"0", 16)
+            if size == 0: break
+            body += await reader.readexactly(size)
+            await reader.readline()
+        return body
+    length = headers.get("content-length")
+    if length and length.isdigit():
+        return await reader.readexactly(min(int(length), MAX_PLAYLIST_BYTES))
+    return await reader.read(MAX_PLAYLIST_BYTES)
+
+
+def _is_hls(url: str, headers: dict) -> bool:
+    ctype = headers.get("content-type", "").lower()
+    return "mpegurl" in ctype or urlsplit(url).path.lower().endswith((".m3u8", ".m3u"))
+
+
+def _playlist_entries(text: str):
+    """(variant URIs, segment URIs) of an HLS playlist."""
+    variants, segments = [], []
+    lines = [l.strip() for l in text.splitlines() if l.strip()]
+    for i, line in enumerate(lines):
+        if line.startswith("#"): continue
+        if i > 0 and lines[i - 1].startswith("#EXT-X-STREAM-INF"):
+            variants.append(line)
+        else:
+            segments.append(line)
+    return variants, segments
+
+
+async def probe_station(url: str) -> dict:
+    """
+    One health check: connect time, then time to the first audio bytes. For HLS the
+    playlist is followed (master -> media playlist -> newest segment).
+    """
+    timings = {}
+    started = time.perf_counter()
+    kind = "http"
+    for _ in range(3):  # master, media playlist, segment
+        reader, writer, headers, final_url = await _request(url, timings)
+        try:
+            if _is_hls(final_url, headers):
+                kind = "hls"
+                text = (await _read_body(reader, headers)).decode("utf-8", "replace")
+                if not text.lstrip().startswith("#EXTM3U"):
+                    raise ProbeError("not an HLS playlist")
+                variants, segments = _playlist_entries(text)
+                if variants:
+                    url = urljoin(final_url, variants[0])
+                elif segments:
+                    # Live edge: the newest segment is what a player fetches first
+                    url = urljoin(final_url, segments[-1])
+                else:
+                    raise ProbeError("empty playlist")
+                continue
+            if kind == "http" and any(k.startswith("icy-") for k in headers):
+                kind = "icecast"
+            data = await reader.read(4096)
+            if not data:
+                raise ProbeError("no audio data")
+            timings["first_byte_ms"] = round((time.perf_counter() - started) * 1000)
+            return {"kind": kind, "content_type": headers.get("content-type"), **timings}
+        finally:
+            writer.close()
+    raise ProbeError("playlist nesting too deep")
+
+
+class RadioProber:
+    """
+    Background health checks of the configured radio stations (asyncio, a few at a
+    time) and a latency ranking used for failover and shown in the UI.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.results = {}      # url -> { name, kind, connect_ms, first_byte_ms, ok, error, checked_at, history }
+        self.get_stations = lambda: []
+        self.wanted = lambda: True
+        self.last_round = None
+        self._trigger = threading.Event()
+        self._forced = False
+        self._thread = None
+
+    def start(self, get_stations, wanted=None):
+        """
+        get_stations() -> [{name, url}], read at the start of every round.
+        wanted() -> bool: rounds are skipped while it is False (radio not in use).
+        """
+        self.get_stations = get_stations
+        if wanted: self.wanted = wanted
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, daemon=True)
+            self._thread.start()
+
+    def probe_now(self, force: bool = False):
+        """Runs a round right away; force runs it even while stations aren't wanted (user asked)."""
+        if force: self._forced = True
+        self._trigger.set()
+
+    def report_failure(self, url: str, error: str = "playback failed"):
+        """A station failed in the player: counts like a failed probe and re-checks everyone."""
+        if is_indirect(url): return  # Never probed; the scheduler's retry hold covers it
+        self._record(url, None, {"ok": False, "error": error})
+        self.probe_now()
+
+    def is_healthy(self, url: str) -> Optional[bool]:
+        """None if the station was never probed (e.g. YouTube)."""
+        with self.lock:
+            r = self.results.get(url)
+        if not r or not r["history"]: return None
+        return self._healthy(r)
+
+    def best(self, exclude=()) -> Optional[dict]:
+        """Fastest healthy station not in exclude."""
+        for station in self.ranking():
+            if station["url"] not in exclude and station["healthy"]:
+                return station
+        return None
+
+    def ranking(self) -> list:
+        stations = self._stations()
+        with self.lock:
+            rows = []
+            for s in stations:
+                r = self.results.get(s["url"])
+                history = list(r["history"]) if r else []
+                rows.append({
+                    "name": s["name"],
+                    "url": s["url"],
+                    "healthy": self._healthy(r) if history else None,
+                    "kind": r.get("kind") if r else None,
+                    "connect_ms": r.get("connect_ms") if r else None,
+                    "first_byte_ms": r.get("first_byte_ms") if r else None,
+                    "failure_rate": round(history.count(False) / len(history), 2) if history else None,
+                    "error": r.get("error") if r else None,
+                    "checked_at": r.get("checked_at") if r else None
+                })
+        # Healthy by latency, then never probed, then failing
+        order = {True: 0, None: 1, False: 2}
+        rows.sort(key=lambda x: (order[x["healthy"]], x["failure_rate"] or 0, x["first_byte_ms"] or 1e9))
+        return rows
+
+    @staticmethod
+    def _healthy(r) -> bool:
+        history = r["history"]
+        return history[-1] and history.count(False) / len(history) <= MAX_FAILURE_RATE
+
+    def _stations(self):
+        try:
+            stations = [s for s in self.get_stations() if s.get("url")]
+        except Exception:
+            return []
+        seen, unique = set(), []
+        for s in stations:
+            if s["url"] not in seen:
+                seen.add(s["url"])
+                unique.append(s)
+        return unique
+
+    def _record(self, url, name, result):
+        with self.lock:
+            r = self.results.setdefault(url, {"history": deque(maxlen=HISTORY)})
+            if name: r["name"] = name
+            r["history"].append(result["ok"])
+            r["checked_at"] = time.time()
+            r["error"] = result.get("error")
+            if result["ok"]:
+                r.update(kind=result.get("kind"), connect_ms=result.get("connect_ms"),
+                         first_byte_ms=result.get("first_byte_ms"))
+
+    def _loop(self):
+        while True:
+            forced, self._forced = self._forced, False
+            stations = [s for s in self._stations() if not is_indirect(s["url"])]
+            if stations and (forced or self._is_wanted()):
+                started = time.time()
+                try:
+                    asyncio.run(self._probe_all(stations))
+                except Exception as e:
+                    print(f"Radio probe round failed: {e}")
+                self.last_round = time.time()
+                healthy = sum(1 for s in stations if self.is_healthy(s["url"]))
+                print(f"Radio: {healthy}/{len(stations)} stations healthy (probed in {time.time() - started:.1f}s)")
+            self._trigger.wait(PROBE_INTERVAL)
+            self._trigger.clear()
+
+    def _is_wanted(self) -> bool:
+        try:
+            return bool(self.wanted())
+        except Exception:
+            return True
+
+    async def _probe_all(self, stations):
+        sem = asyncio.Semaphore(MAX_CONCURRENCY)
+
+        async def one(station):
+            async with sem:
+                try:
+                    result = await asyncio.wait_for(probe_station(station["url"]), PROBE_TIMEOUT)
+                    result["ok"] = True
+                except asyncio.TimeoutError:
+                    result = {"ok": False, "error": "timeout"}
+                except Exception as e:
+                    result = {"ok": False, "error": str(e) or type(e).__name__}
+                self._record(station["url"], station.get("name"), result)
+
+        await asyncio.gather(*(one(s) for s in stations))
+
+
+radio_prober = RadioProber()
@@ -0,0 +1,359 @@
+import socket
+import ssl
+import struct
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import urljoin, urlsplit, parse_qs
+
+from url_resolver import is_indirect
+
+try:
+    import fcntl
+    import termios
+except ImportError:  # Windows: no send-queue query, the send buffer size stands in
+    fcntl = termios = None
+
+# Encoded audio kept per station (at the stream's bitrate; 320 kbps assumed if unknown)
+BUFFER_SECONDS = 120
+MIN_BUFFER_BYTES = 1024 * 1024
+MAX_BUFFER_BYTES = 8 * 1024 * 1024
+# After a pause longer than this the player rejoins live instead of lagging behind
+MAX_RESUME_BEHIND = 30.0
+# Upstream is kept this long after the last local listener left (bells, announcements)
+LINGER_SECONDS = 90.0
+CONNECT_TIMEOUT = 10.0
+READ_SIZE = 16 * 1024
+MAX_REDIRECTS = 5
+# Sent to the local player so its first buffer fills at once
+PREROLL_SECONDS = 1.0
+USER_AGENT = "SmartZill/1.0"
+PLAYLIST_TYPES = ("mpegurl", "x-scpls", "dash+xml")
+
+
+def _unsent(sock) -> int:
+    """Bytes written to sock that the peer hasn't received yet (upper bound where the OS can't tell)."""
+    if fcntl and hasattr(termios, "TIOCOUTQ"):
+        try:
+            return struct.unpack("i", fcntl.ioctl(sock.fileno(), termios.TIOCOUTQ, b"\0" * 4))[0]
+        except OSError:
+            pass
+    try:
+        return sock.getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF)
+    except OSError:
+        return 0
+
+
+def _connect(url: str):
+    """Opens a continuous HTTP/ICY stream. Returns (socket, headers, leftover body bytes, final url)."""
+    for _ in range(MAX_REDIRECTS + 1):
+        parts = urlsplit(url)
+        secure = parts.scheme == "https"
+        sock = socket.create_connection((parts.hostname, parts.port or (443 if secure else 80)), CONNECT_TIMEOUT)
+        if secure:
+            sock = ssl.create_default_context().wrap_socket(sock, server_hostname=parts.hostname)
+        path = parts.path or "/"
+        if parts.query: path += "?" + parts.query
+        # HTTP/1.0: no chunked framing in the audio we pass on
+        sock.sendall((f"GET {path} HTTP/1.0\r\nHost: {parts.netloc}\r\nUser-Agent: {USER_AGENT}\r\n"
+                      f"Accept: */*\r\nIcy-MetaData: 0\r\n\r\n").encode())
+        data = b""
+        while b"\r\n\r\n" not in data:
+            chunk = sock.recv(4096)
+            if not chunk or len(data) > 64 * 1024:
+                sock.close()
+                raise ConnectionError("no response headers")
+            data += chunk
+        head, body = data.split(b"\r\n\r\n", 1)
+        lines = head.decode("latin-1").split("\r\n")
+        status_parts = lines[0].split(" ", 2)
+        status = int(status_parts[1]) if len(status_parts) > 1 and status_parts[1].isdigit() else 0
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                k, v = line.split(":", 1)
+                headers[k.strip().lower()] = v.strip()
+        if status in (301, 302, 303, 307, 308) and headers.get("location"):
+            sock.close()
+            url = urljoin(url, headers["location"])
+            continue
+        if status != 200:
+            sock.close()
+            raise ConnectionError(f"HTTP {status or lines[0][:40]}")
+        return sock, headers, body, url
+    raise ConnectionError("too many redirects")
+
+
+class _Station:
+    """One upstream connection and its ring buffer. Offsets are absolute byte counts since connect."""
+
+    def __init__(self, url):
+        self.id = uuid.uuid4().hex[:10]
+        self.url = url
+        self.cond = threading.Condition()
+        self.state = "connecting"   # connecting | streaming | playlist | failed | closed
+        self.error = None
+        self.content_type = "application/octet-stream"
+        self.byte_rate = 40000      # bytes/s; from icy-br when the server sends it
+        self.buffer = bytearray()
+        self.head = 0               # bytes received so far
+        self.clients = 0
+        self.last_client = time.time()
+        self.sock = None
+
+    def wait_ready(self, timeout=CONNECT_TIMEOUT + 1):
+        with self.cond:
+            self.cond.wait_for(lambda: self.state != "connecting", timeout)
+            return self.state
+
+    def write(self, data):
+        with self.cond:
+            size = len(self.buffer)
+            start = self.head % size
+            first = min(len(data), size - start)
+            self.buffer[start:start + first] = data[:first]
+            if first < len(data):
+                rest = data[first:][-size:]
+                self.buffer[:len(rest)] = rest
+            self.head += len(data)
+            self.cond.notify_all()
+
+    def read(self, pos, limit=READ_SIZE, timeout=5.0):
+        """(new pos, bytes) from pos onwards; waits for data. A reader that fell out of the ring skips ahead."""
+        with self.cond:
+            self.cond.wait_for(lambda: self.head > pos or self.state != "streaming", timeout)
+            size = len(self.buffer)
+            pos = max(pos, self.head - size)
+            end = min(self.head, pos + limit)
+            if end <= pos:
+                return pos, b""
+            start = pos % size
+            stop = start + (end - pos)
+            if stop <= size:
+                data = bytes(self.buffer[start:stop])
+            else:
+                data = bytes(self.buffer[start:]) + bytes(self.buffer[:stop - size])
+            return end, data
+
+    def oldest(self):
+        return max(0, self.head - len(self.buffer))
+
+
+class RadioRelay:
+    """
+    Local time-shift relay for continuous HTTP/Icecast radio. The player reads from
+    127.0.0.1 while one upstream connection per station fills a ring buffer, so a
+    bell can stop the player and resume it from where it paused (or from live)
+    without a new handshake with the station. HLS and YouTube go direct.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stations = {}     # upstream url -> _Station
+        self.direct = set()    # URLs found to be playlists (VLC opens those itself)
+        self._positions = {}   # local relay path -> (bytes written, player connection)
+        self.httpd = None
+        self.port = None
+
+    def supports(self, url: str) -> bool:
+        if not url or is_indirect(url) or url in self.direct: return False
+        parts = urlsplit(url)
+        return parts.scheme in ("http", "https") and not parts.path.lower().endswith((".m3u8", ".m3u", ".pls", ".mpd"))
+
+    def open(self, url: str, at: Optional[int] = None) -> str:
+        """Local URL the player should open for url; at = resume offset (None: live)."""
+        self._ensure_server()
+        with self.lock:
+            station = self.stations.get(url)
+            if station is None or station.state in ("failed", "closed"):
+                station = _Station(url)
+                self.stations[url] = station
+                threading.Thread(target=self._upstream_loop, args=(station,), daemon=True).start()
+            station.last_client = time.time()
+        query = f"?at={at}" if at is not None else ""
+        return f"http://127.0.0.1:{self.port}/relay/{station.id}{query}"
+
+    def resume_offset(self, url: str, paused_at: float, client_pos: Optional[int], played_ahead: float) -> Optional[int]:
+        """
+        Offset to resume from after a pause that began at paused_at. client_pos is how
+        far the player had read, played_ahead the seconds it had buffered but not played.
+        None (live) if the pause was long or the data is gone.
+        """
+        station = self.stations.get(url)
+        if station is None or client_pos is None or station.state != "streaming": return None
+        if time.time() - paused_at > MAX_RESUME_BEHIND: return None
+        at = max(0, client_pos - int(played_ahead * station.byte_rate))
+        return at if at >= station.oldest() else None
+
+    def client_position(self, local_url: str) -> Optional[int]:
+        """
+        Bytes the local player has read so far from local_url's relay. What still sits in
+        the socket's send queue was written but never reached the player, so it doesn't count.
+        """
+        if not local_url: return None
+        with self.lock:
+            entry = self._positions.get(urlsplit(local_url).path)
+        if entry is None: return None
+        pos, connection = entry
+        return max(0, pos - _unsent(connection))
+
+    def is_local(self, url: str) -> bool:
+        return bool(url) and self.port is not None and url.startswith(f"http://127.0.0.1:{self.port}/relay/")
+
+    def drop(self, url: str):
+        """Closes one station's upstream so the next open() reconnects (stalled station)."""
+        with self.lock:
+            station = self.stations.pop(url, None)
+        if station: self._close(station)
+
+    def close_all(self):
+        """Drops every upstream (music stopped for good, not just for a bell)."""
+        with self.lock:
+            stations = list(self.stations.values())
+            self.stations.clear()
+        for station in stations:
+            self._close(station)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {s.url: {"state": s.state, "clients": s.clients, "buffered_seconds": round((s.head - s.oldest()) / s.byte_rate, 1),
+                            "error": s.error} for s in self.stations.values()}
+
+    def _close(self, station):
+        with station.cond:
+            station.state = "closed"
+            station.cond.notify_all()
+        if station.sock:
+            try:
+                station.sock.close()
+            except OSError:
+                pass
+
+    def _upstream_loop(self, station):
+        try:
+            sock, headers, body, _ = _connect(station.url)
+        except Exception as e:
+            print(f"Relay: {station.url} unavailable: {e}")
+            with station.cond:
+                station.state, station.error = "failed", str(e)
+                station.cond.notify_all()
+            return
+        ctype = headers.get("content-type", "").lower()
+        if any(t in ctype for t in PLAYLIST_TYPES) or body.lstrip().startswith(b"#EXTM3U"):
+            # A playlist behind a plain-looking URL: let VLC handle it directly from now on
+            sock.close()
+            self.direct.add(station.url)
+            with station.cond:
+                station.state = "playlist"
+                station.cond.notify_all()
+            return
+
+        br = headers.get("icy-br", "").split(",")[0]
+        if br.isdigit() and int(br) > 0:
+            station.byte_rate = int(br) * 1000 // 8
+        size = min(MAX_BUFFER_BYTES, max(MIN_BUFFER_BYTES, station.byte_rate * BUFFER_SECONDS))
+        with station.cond:
+            station.sock = sock
+            station.buffer = bytearray(size)
+            station.content_type = headers.get("content-type", station.content_type)
+            station.state = "streaming"
+            station.cond.notify_all()
+        print(f"Relay: connected to {station.url} ({station.content_type}, ~{station.byte_rate * 8 // 1000} kbps)")
+
+        if body: station.write(body)
+        sock.settimeout(CONNECT_TIMEOUT)
+        try:
+            while station.state == "streaming":
+                data = sock.recv(READ_SIZE)
+                if not data:
+                    raise ConnectionError("station closed the stream")
+                station.write(data)
+                if station.clients == 0 and time.time() - station.last_client > LINGER_SECONDS:
+                    print(f"Relay: no listener for {LINGER_SECONDS:.0f}s, disconnecting {station.url}")
+                    break
+        except Exception as e:
+            if station.state == "streaming":
+                print(f"Relay: {station.url} dropped: {e}")
+                station.error = str(e)
+        finally:
+            with self.lock:
+                if self.stations.get(station.url) is station:
+                    del self.stations[station.url]
+                self._positions.pop(f"/relay/{station.id}", None)
+            if station.state == "streaming":
+                with station.cond:
+                    station.state = "failed" if station.error else "closed"
+                    station.cond.notify_all()
+            try:
+                sock.close()
+            except OSError:
+                pass
+
+    def _ensure_server(self):
+        with self.lock:
+            if self.httpd: return
+            self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._make_handler())
+            self.httpd.daemon_threads = True
+            self.port = self.httpd.server_address[1]
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def _find(self, station_id):
+        with self.lock:
+            for station in self.stations.values():
+                if station.id == station_id:
+                    return station
+        return None
+
+    def _make_handler(self):
+        relay = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path, _, query = self.path.partition("?")
+                station = relay._find(path.rsplit("/", 1)[-1]) if path.startswith("/relay/") else None
+                if station is None:
+                    self.send_error(404)
+                    return
+                state = station.wait_ready()
+                if state == "playlist":
+                    # VLC follows this and plays the playlist itself
+                    self.send_response(302)
+                    self.send_header("Location", station.url)
+                    self.end_headers()
+                    return
+                if state != "streaming":
+                    self.send_error(502, station.error or "station unavailable")
+                    return
+
+                at = parse_qs(query).get("at", [None])[0]
+                pos = int(at) if at and at.isdigit() else max(station.oldest(), station.head - int(PREROLL_SECONDS * station.byte_rate))
+                self.send_response(200)
+                self.send_header("Content-Type", station.content_type)
+                self.send_header("Cache-Control", "no-cache")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                with station.cond:
+                    station.clients += 1
+                try:
+                    while station.state == "streaming" or pos < station.head:
+                        pos, data = station.read(pos)
+                        if data:
+                            self.wfile.write(data)
+                            with relay.lock:
+                                relay._positions[path] = (pos, self.connection)
+                except (BrokenPipeError, ConnectionResetError, OSError):
+                    pass
+                finally:
+                    with station.cond:
+                        station.clients -= 1
+                        station.last_client = time.time()
+
+            def log_message(self, format, *args):
+                pass
+
+        return _Handler
+
+
+radio_relay = RadioRelay()
@@ -0,0 +1,118 @@
+import bisect
+from typing import Dict, List, Optional
+
+
+def to_minutes(hhmm) -> Optional[int]:
+    """Converts "HH:MM" to minute-of-day. Returns None for malformed values."""
+    try:
+        h, m = (int(x) for x in str(hhmm).split(":"))
+    except (ValueError, TypeError):
+        return None
+    if not (0 <= h < 24 and 0 <= m < 60):
+        return None
+    return h * 60 + m
+
+
+class CompiledDay:
+    """One weekday of the schedule, pre-sorted into integer minute lookups."""
+
+    def __init__(self, day: dict):
+        self.day_of_week = int(day.get("dayOfWeek", -1))
+        self.enabled = bool(day.get("enabled", False))
+
+        # Activities with unreadable times are left out (they could never match anyway)
+        acts = []
+        for act in day.get("activities", []):
+            start = to_minutes(act.get("startTime"))
+            end = to_minutes(act.get("endTime"))
+            if start is None or end is None:
+                print(f"Schedule: Skipping activity with invalid time: {act.get('name')}")
+                continue
+            acts.append((start, end, act))
+        acts.sort(key=lambda x: x[0])
+
+        self.activities = [a for _, _, a in acts]
+        self.starts = [s for s, _, _ in acts]
+
+        # Running max of end times, so "inside any activity" is one bisect even with overlaps
+        self.max_end = []
+        running = -1
+        for _, end, _ in acts:
+            running = max(running, end)
+            self.max_end.append(running)
+
+        # Work day bounds (first start -> end of the last-starting activity)
+        self.day_start = acts[0][0] if acts else None
+        self.day_end = acts[-1][1] if acts else None
+
+        # Break music follows the playMusic flag of the activity that ended most recently
+        ended = sorted(((end, bool(act.get("playMusic", False))) for _, end, act in acts), key=lambda x: x[0])
+        self.end_minutes = [e for e, _ in ended]
+        self.end_music = [m for _, m in ended]
+
+        # Everything that rings or speaks, sorted by minute (order within a minute matches the JSON)
+        triggers = []
+        for start, end, act in acts:
+            triggers.append((start, act["startTime"], f"Başlangıç: {act['name']}", "start", act))
+            triggers.append((end, act["endTime"], f"Bitiş: {act['name']}", "end", act))
+            for ann in act.get("interimAnnouncements", []):
+                minute = to_minutes(ann.get("time"))
+                if minute is None or not ann.get("enabled"):
+                    continue
+                triggers.append((minute, ann["time"], "Ara Duyuru", "announcement", ann))
+        triggers.sort(key=lambda x: x[0])
+        self.triggers = triggers
+        self.trigger_minutes = [t[0] for t in triggers]
+
+    def state_at(self, minute: int) -> str:
+        """Returns WORK, BREAK or IDLE for the given minute-of-day."""
+        i = bisect.bisect_right(self.starts, minute) - 1
+        if i >= 0 and self.max_end[i] > minute:
+            return "WORK"
+        if self.day_start is not None and self.day_start <= minute < self.day_end:
+            return "BREAK"
+        return "IDLE"
+
+    def music_after(self, minute: int) -> bool:
+        """playMusic of the activity that ended at or before this minute."""
+        i = bisect.bisect_right(self.end_minutes, minute) - 1
+        return self.end_music[i] if i >= 0 else False
+
+    def next_trigger(self, minute: int):
+        """First trigger strictly after this minute as (time_str, name), or None."""
+        i = bisect.bisect_right(self.trigger_minutes, minute)
+        if i >= len(self.triggers):
+            return None
+        _, time_str, name, _, _ = self.triggers[i]
+        return time_str, name
+
+    def timeline(self, minute: int) -> List[dict]:
+        """Today's events for the UI; everything before this minute is marked passed."""
+        passed_until = bisect.bisect_left(self.trigger_minutes, minute)
+        return [
+            {
+                "time": time_str,
+                "name": name,
+                "type": kind,
+                "passed": i < passed_until or not self.enabled
+            }
+            for i, (_, time_str, name, kind, _) in enumerate(self.triggers)
+        ]
+
+
+class ScheduleIndex:
+    """Compiled weekly schedule. Rebuilt whenever the raw schedule JSON changes."""
+
+    def __init__(self, schedule: list):
+        self.days: Dict[int, CompiledDay] = {}
+        for day in schedule or []:
+            try:
+                compiled = CompiledDay(day)
+            except Exception as e:
+                print(f"Schedule: Could not compile day {day.get('dayOfWeek')}: {e}")
+                continue
+            # First entry wins, same as the old next(...) lookup
+            self.days.setdefault(compiled.day_of_week, compiled)
+
+    def day(self, weekday: int) -> Optional[CompiledDay]:
+        return self.days.get(weekday)
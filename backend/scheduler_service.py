@@ -3,11 +3,21 @@ import threading
 import random
 import os
 import json
+import heapq
+import shutil
+from collections import deque
 from datetime import datetime
-from audio_engine import audio_engine
-import holidays
-from gtts import gTTS
-import vlc
+from audio_engine import audio_engine, PRIORITY_BELL, PRIORITY_ANNOUNCEMENT
+from schedule_index import ScheduleIndex, to_minutes
+from tts_cache import tts_cache, engine_version
+from media_library import media_library
+from transcode_service import transcode_service
+from holiday_service import holiday_service
+from persistence import persistence
+from config_store import config_store
+from url_resolver import url_resolver
+from radio_prober import radio_prober
+from stream_monitor import stream_monitor
 
 import sys
 
@@ -18,12 +28,51 @@ except ImportError:
     special_days_service = None
     print("Warning: special_days_service not available")
 
+# Map simplified names to Edge TTS Voice IDs
+EDGE_VOICE_MAP = {
+    "edge-tr-ahmet": "tr-TR-AhmetNeural",
+    "edge-tr-emel": "tr-TR-EmelNeural",
+    "edge-en-guy": "en-US-GuyNeural",
+    "edge-en-aria": "en-US-AriaNeural",
+    "edge-de-conrad": "de-DE-ConradNeural",
+    "edge-de-katja": "de-DE-KatjaNeural",
+    "edge-ru-dmitry": "ru-RU-DmitryNeural",
+    "edge-ru-svetlana": "ru-RU-SvetlanaNeural",
+    "edge-bg-borislav": "bg-BG-BorislavNeural",
+    "edge-bg-kalina": "bg-BG-KalinaNeural"
+}
+
+# Longest the loop sleeps with nothing due; bounds drift after wall-clock jumps (NTP, suspend)
+MAX_IDLE_SLEEP = 60.0
+# During a break with music the loop still re-checks playback this often (dropped stream)
+MUSIC_WATCH_INTERVAL = 1.0
+# A station that failed in the player is skipped for this long (failover goes to the next best)
+RADIO_RETRY_HOLD = 120.0
+# A second stall/dead-air incident on the same station within this window means failover, not reconnect
+STREAM_INCIDENT_WINDOW = 300.0
+# What a config.json key falls back to when it is missing from the file (or deleted from it)
+CONFIG_DEFAULTS = {
+    "start_on_boot": True,
+    "music_source": "local",
+    "company_name": "İşletme Zil Programı",
+    "volume_bell": 100,
+    "volume_music": 25,
+    "volume_manual": 50,
+    "volume_system": 100,
+    "holiday_country": "TR",
+    "restore_manual_playback": False,
+    "app_autostart_enabled": False,
+    "tts_engine": "edge-tr-emel",
+    "frontend_auto_open": True
+}
+
 class SchedulerService:
     def __init__(self):
         self.running = False # Start as Stopped, explicit start() required
         self.start_on_boot = True # Default to True
         # Advanced 7-day schedule structure
         self.schedule = self._get_default_schedule()
+        self._index = ScheduleIndex(self.schedule) # Compiled view, rebuilt by _compile_schedule
         self.current_state = "IDLE"
         self.manual_override_active = False # Manual Override Flag
         self.next_event_name = "Yok"
@@ -35,10 +84,22 @@ class SchedulerService:
         self.music_dir = "audio"
         self.announcement_dir = "announcements"
         self.bell_dir = "bells"
-        self.config_file = "config.json"
         self.schedule_file = "schedule.json"
         
-        self.last_minute_checked = ""
+        # Event timeline for today (heap of triggers, see _rebuild_events)
+        self._wakeup = threading.Event()
+        self._events = []
+        self._events_day = None
+        self._events_dirty = True
+        self._fired_events = set()
+        self._today = None
+        # Stream incidents from the monitor thread, handled by the loop (see _on_stream_incident)
+        self._stream_events = deque()
+
+        # Birthday TTS rendered ahead of the announcement times (see _prerender_worker)
+        self._prerender_request = threading.Event()
+        self._prerender_generation = 0
+        self._prerendered = None
         
         # Radio Settings
         self.radio_stations = [
@@ -52,6 +113,8 @@ class SchedulerService:
             {"name": "Radyo Viva", "url": "https://radyoviva.radyotvonline.net/radyovivaaac.m3u8"}
         ]
         self.radio_url = self.radio_stations[0]["url"] # Default to Power Turk
+        self._radio_failures = {} # url -> time it last failed in the player
+        self._stream_incidents = {} # url -> time of the last stall / dead air
         self.music_source = "local" # 'local' or 'radio'
         
         # Volume Settings
@@ -63,15 +126,8 @@ class SchedulerService:
         self.volume = 100 # Legacy/Current volume placeholder
 
         # Holiday Settings
-        self.holiday_country = "TR"  # Default: Turkey
-        try:
-            self.tr_holidays = holidays.country_holidays(self.holiday_country, years=datetime.now().year)
-            # Default: Skip ALL holidays
-            self.skipped_holidays = [d.isoformat() for d in self.tr_holidays.keys()]
-        except Exception as e:
-            print(f"Warning: Could not load holidays (no internet?): {e}")
-            self.tr_holidays = {}
-            self.skipped_holidays = []
+        self.holiday_country = "TR"  # Default: Turkey (tables live in holiday_service)
+        self._skipped_holidays = None # None = not configured yet, i.e. skip all
         
         # New Settings
         self.streaming_enabled = False
@@ -85,9 +141,16 @@ class SchedulerService:
         self._load_config()
         self._load_schedule()
         
+        # Music starting/stopping outside the loop (API, track end) must be re-evaluated promptly
+        audio_engine.add_listener(self.wake)
+        # Live streams that stall or go silent while 'Playing'
+        stream_monitor.add_listener(self._on_stream_incident)
+
         # Cleanup old temporary TTS files
         threading.Thread(target=self._cleanup_old_tts, daemon=True).start()
 
+        threading.Thread(target=self._prerender_worker, daemon=True).start()
+
     def _get_default_schedule(self):
         # Return empty structure for 7 days
         # Mon-Sat enabled (0-5), Sun(6) disabled
@@ -648,19 +711,194 @@ class SchedulerService:
         # Let's rely on dayOfWeek integer in the JSON.
         self.schedule = new_schedule
         self._save_schedule()
+        self._compile_schedule()
         print("Schedule updated.")
 
+    @property
+    def skipped_holidays(self):
+        if self._skipped_holidays is None:
+            # Default: Skip ALL holidays
+            self._skipped_holidays = holiday_service.all_dates()
+        return self._skipped_holidays
+
+    @skipped_holidays.setter
+    def skipped_holidays(self, value):
+        self._skipped_holidays = value
+
+    def warm_up(self):
+        """Loads the slow optional parts ahead of first use. Run off the event loop."""
+        started = time.time()
+        holiday_service.warm_up()
+        for module in ("edge_tts", "gtts"):
+            try:
+                __import__(module)
+            except Exception as e:
+                print(f"Warm-up: {module} unavailable: {e}")
+        print(f"Warm-up finished in {time.time() - started:.2f}s")
+
     def start(self):
         if not self.running:
             self.running = True
             print("Scheduler Service Started")
-            time.sleep(1) # Extra stability sleep
             threading.Thread(target=self._loop, daemon=True).start()
 
     def stop(self):
         self.running = False
+        self.wake() # Let the loop thread notice immediately instead of finishing its sleep
         print("Scheduler Service Stopped")
 
+    def wake(self):
+        """Interrupts the loop's sleep so it re-evaluates state right away."""
+        self._wakeup.set()
+
+    def _compile_schedule(self):
+        """Rebuilds the integer-keyed schedule index; call after every change to self.schedule."""
+        self._index = ScheduleIndex(self.schedule)
+        self._invalidate_events()
+
+    def _invalidate_events(self):
+        """Marks today's event timeline stale (schedule or announcement times changed)."""
+        self._events_dirty = True
+        self.request_prerender()
+        self.wake()
+
+    def request_prerender(self):
+        """Re-renders today's text announcements in the background (people, template or voice changed)."""
+        self._prerender_generation += 1
+        self._prerender_request.set()
+
+    def _prerender_worker(self):
+        while True:
+            self._prerender_request.wait()
+            self._prerender_request.clear()
+            generation = self._prerender_generation
+            today = datetime.now().date()
+
+            paths = []
+            for name, text in self._birthday_texts():
+                try:
+                    path = self.render_tts(text)
+                    if path: paths.append(path)
+                except Exception as e:
+                    print(f"TTS Error for {name}: {e}")
+
+            self._prerendered = {"generation": generation, "date": today, "paths": paths}
+            if paths:
+                print(f"🎂 Pre-rendered {len(paths)} special day announcement(s) for {today}")
+
+    def _get_prerendered_birthdays(self):
+        """Paths rendered for today, or None if the pre-render is stale, pending or lost files."""
+        pre = self._prerendered
+        if not pre or pre["generation"] != self._prerender_generation or pre["date"] != datetime.now().date():
+            return None
+        if not all(os.path.exists(p) for p in pre["paths"]):
+            return None
+        return pre["paths"]
+
+    def _birthday_texts(self):
+        """(name, text) for everyone celebrating today, one announcement per person."""
+        if not special_days_service or not special_days_service.config.get("enabled", False):
+            return []
+        if not special_days_service.config.get("announcement_times"):
+            return []
+
+        # The service's generate_announcement_text joins names; we announce each person separately
+        template = special_days_service.config.get("template", "İyi ki doğdun {name}")
+        return [(name, template.replace("{name}", name)) for name in special_days_service.get_todays_people()]
+
+    def _birthday_playlist(self, paths):
+        playlist = []
+        for i, path in enumerate(paths):
+            playlist.append(path)
+            # Add delay if not the last one
+            if i < len(paths) - 1:
+                playlist.append("DELAY:5")
+        return playlist
+
+    def _render_and_play_birthdays(self):
+        texts = self._birthday_texts()
+        if not texts: return
+        print(f"🎂 Special Day Announcement for: {', '.join(name for name, _ in texts)}")
+
+        paths = []
+        for name, text in texts:
+            try:
+                # Played straight from the render cache; no per-day copy in announcements/
+                path = self.render_tts(text)
+                if path: paths.append(path)
+            except Exception as e:
+                print(f"TTS Error for {name}: {e}")
+
+        playlist = self._birthday_playlist(paths)
+        if playlist:
+            audio_engine.play_sequence_async(playlist, 'bell', priority=PRIORITY_ANNOUNCEMENT)
+
+    def _rebuild_events(self, now):
+        """Compiles today's triggers into a heap of (fire_at, seq, kind, payload)."""
+        self._events_dirty = False
+        if self._events_day != now.date():
+            # New day: forget what already fired yesterday and render today's announcements
+            if self._events_day is not None:
+                self.request_prerender()
+            self._events_day = now.date()
+            self._fired_events = set()
+
+        # Logic: _get_default_schedule creates 0=Mon ... 6=Sun
+        # So we match directly.
+        self._today = self._index.day(now.weekday())
+
+        day_start = datetime.combine(now.date(), datetime.min.time()).timestamp()
+        # Anything due earlier in the current minute still fires (same as the old minute match),
+        # unless it already fired before this rebuild.
+        minute_start = now.replace(second=0, microsecond=0).timestamp()
+        events = []
+
+        def add(hhmm, kind, key, payload):
+            minute = to_minutes(hhmm)
+            if minute is None:
+                return
+            fire_at = day_start + minute * 60
+            fire_key = (kind, hhmm, key)
+            if fire_at < minute_start or fire_key in self._fired_events:
+                return
+            events.append((fire_at, len(events), kind, (fire_key, payload)))
+
+        if self._today:
+            # Special Days Announcement times come first, as in the old per-minute check
+            if special_days_service and special_days_service.config.get("enabled", False):
+                for t in special_days_service.config.get("announcement_times", []):
+                    add(t, "birthday", t, None)
+
+            for _, time_str, _, kind, item in self._today.triggers:
+                add(time_str, "interim" if kind == "announcement" else kind, item.get("id"), item)
+
+        heapq.heapify(events)
+        self._events = events
+
+    def _pop_due_events(self):
+        """Pops every event whose time has come, in schedule order."""
+        due = []
+        now_ts = time.time()
+        while self._events and self._events[0][0] <= now_ts:
+            _, _, kind, (fire_key, payload) = heapq.heappop(self._events)
+            self._fired_events.add(fire_key)
+            due.append((kind, payload))
+        return due
+
+    def _sleep_until_next_event(self, watch_music=False):
+        """Blocks until the next trigger, midnight, a wake() call or the music watch interval."""
+        now_ts = time.time()
+        timeout = MAX_IDLE_SLEEP
+        if self._events:
+            timeout = min(timeout, self._events[0][0] - now_ts)
+        if self._events_day:
+            midnight = datetime.combine(self._events_day, datetime.min.time()).timestamp() + 86400
+            timeout = min(timeout, midnight - now_ts)
+        if watch_music:
+            timeout = min(timeout, MUSIC_WATCH_INTERVAL)
+        if timeout > 0:
+            self._wakeup.wait(timeout)
+
     def _loop(self):
         print("Scheduler: Loop Thread Started", flush=True)
         # Startup Sound (User Requested customization)
@@ -676,7 +914,7 @@ class SchedulerService:
              
              if startup_sound:
                  print(f"Playing Startup Sound: {startup_sound}", flush=True)
-                 audio_engine.play_alert(startup_sound)
+                 audio_engine.play_alert_async(startup_sound, priority=PRIORITY_BELL)
              else:
                  print(f"DEBUG: Startup sound not found in expected locations: {possible_paths}")
         except Exception as e: 
@@ -684,27 +922,31 @@ class SchedulerService:
              pass
         
         while self.running:
+            # Clear before evaluating so a wake() arriving mid-iteration is not lost
+            self._wakeup.clear()
+            self._handle_stream_incidents()
             try:
                 now = datetime.now()
                 current_time_str = now.strftime("%H:%M")
                 current_day_idx = now.weekday() # 0=Monday, 6=Sunday
-                
+
+                if self._events_dirty or self._events_day != now.date():
+                    self._rebuild_events(now)
+
                 # Holiday Check
-                is_holiday = now.date() in self.tr_holidays
-                holiday_name = self.tr_holidays.get(now.date()) if is_holiday else None
+                holiday_name = holiday_service.name(now.date())
+                is_holiday = holiday_name is not None
 
-                # Logic: _get_default_schedule creates 0=Mon ... 6=Sun
-                # So we match directly.
-                today_sched = next((d for d in self.schedule if d["dayOfWeek"] == current_day_idx), None)
+                today = self._today
                 
-                if not today_sched:
+                if not today:
                     print(f"Scheduler: No schedule found for day index {current_day_idx}")
-                    time.sleep(5)
+                    self._wakeup.wait(5)
                     continue
 
                 is_skipped_holiday = is_holiday and (now.date().isoformat() in self.skipped_holidays)
 
-                if not today_sched.get("enabled", False) or is_skipped_holiday:
+                if not today.enabled or is_skipped_holiday:
                     # Day is disabled or Skipped Holiday
                     if is_skipped_holiday:
                         self.next_event_name = f"RESMİ TATİL (ATLANDI): {holiday_name}"
@@ -713,133 +955,99 @@ class SchedulerService:
                     
                     self.next_event_time = "-"
                     self._handle_idle_state()
-                    time.sleep(1)
+                    # Nothing fires today: discard triggers as they come due but keep the rest,
+                    # so re-enabling the day (or un-skipping the holiday) still rings later bells
+                    self._pop_due_events()
+                    self._sleep_until_next_event()
                     continue
             except Exception as e:
                 print(f"Scheduler Loop Error: {e}")
-                time.sleep(5)
+                self._wakeup.wait(5)
                 continue
 
             # Calculate Next Event
-            self._update_next_event(today_sched, current_time_str)
+            self._update_next_event(today, now.hour * 60 + now.minute)
 
             # Heartbeat (Every minute)
             if current_time_str != getattr(self, "last_heartbeat", ""):
                 print(f"♥ Scheduler Alive: {current_time_str} | Day: {current_day_idx} | State: {self.current_state}", flush=True)
                 self.last_heartbeat = current_time_str
 
-            # Check Activities & Determine State
-            active_activity = None
-            
             # --- Bell Logic (Always Active) ---
-            if current_time_str != self.last_minute_checked:
-                self.last_minute_checked = current_time_str
-                
+            for kind, payload in self._pop_due_events():
                 # Special Days Announcement Check
-                if special_days_service and special_days_service.config.get("enabled", False):
-                    if current_time_str in special_days_service.config.get("announcement_times", []):
-                        names = special_days_service.get_todays_people()
-                        if names:
-                            print(f"🎂 Special Day Announcement for: {', '.join(names)}")
-                            playlist = []
-                            
-                            for i, name in enumerate(names):
-                                # Generate individual text
-                                # We need to use the template but for ONE person.
-                                # The service's generate_announcement_text joins names. We'll do it manually here for better control or reuse a helper.
-                                # Actually let's use the template directly from config
-                                template = special_days_service.config.get("template", "İyi ki doğdun {name}")
-                                text = template.replace("{name}", name)
-                                
-                                try:
-                                    filename = self.generate_tts_audio(text)
-                                    if filename:
-                                        path = os.path.join(self.announcement_dir, filename)
-                                        playlist.append(path)
-                                        # Add delay if not the last one
-                                        if i < len(names) - 1:
-                                            playlist.append("DELAY:5")
-                                except Exception as e:
-                                    print(f"TTS Error for {name}: {e}")
-
-                            if playlist:
-                                # Run in thread to prevent blocking scheduler loop
-                                threading.Thread(target=audio_engine.play_sequence, args=(playlist, 'bell'), daemon=True).start()
-                
-                for act in today_sched.get("activities", []):
-                    # START Bell
-                    if act["startTime"] == current_time_str:
-                         print(f"Activity Start: {act['name']}")
-                         playlist = []
-                         # Bell
-                         bell = act.get("startSoundId", "default")
-                         if bell and bell != "None": playlist.append(self._resolve_sound_path(bell, "bells"))
-                         # Announcement
-                         ann = act.get("startAnnouncementId", None)
-                         if ann and ann != "None": playlist.append(self._resolve_sound_path(ann, "announcements"))
-                         
+                if kind == "birthday":
+                    prerendered = self._get_prerendered_birthdays()
+                    if prerendered is not None:
+                        # Files were rendered ahead of time; this is just an enqueue
+                        playlist = self._birthday_playlist(prerendered)
+                        if playlist:
+                            print(f"🎂 Special Day Announcement: {len(prerendered)} pre-rendered")
+                            audio_engine.play_sequence_async(playlist, 'bell', priority=PRIORITY_ANNOUNCEMENT)
+                    else:
+                        # Pre-render missing or stale: synthesize off the scheduler thread
+                        threading.Thread(target=self._render_and_play_birthdays, daemon=True).start()
+
+                # START Bell
+                elif kind == "start":
+                     act = payload
+                     print(f"Activity Start: {act['name']}")
+                     playlist = []
+                     # Bell
+                     bell = act.get("startSoundId", "default")
+                     if bell and bell != "None": playlist.append(self._resolve_sound_path(bell, "bells"))
+                     # Announcement
+                     ann = act.get("startAnnouncementId", None)
+                     if ann and ann != "None": playlist.append(self._resolve_sound_path(ann, "announcements"))
+                     
+                     if playlist:
+                         # Remove None entries from legacy data issues
+                         playlist = [p for p in playlist if p]
                          if playlist:
-                             # Remove None entries from legacy data issues
-                             playlist = [p for p in playlist if p]
-                             if playlist:
-                                 audio_engine.play_sequence(playlist, volume_type='bell')
-                                 
-                         active_activity = act
-
-                    # END Bell
-                    elif act["endTime"] == current_time_str:
-                         print(f"Activity End: {act['name']}")
-                         playlist = []
-                         # Bell
-                         bell = act.get("endSoundId", "default")
-                         if bell and bell != "None": playlist.append(self._resolve_sound_path(bell, "bells"))
-                         # Announcement
-                         ann = act.get("endAnnouncementId", None)
-                         if ann and ann != "None": playlist.append(self._resolve_sound_path(ann, "announcements"))
+                             audio_engine.play_sequence_async(playlist, volume_type='bell', priority=PRIORITY_BELL)
+
+                # END Bell
+                elif kind == "end":
+                     act = payload
+                     print(f"Activity End: {act['name']}")
+                     playlist = []
+                     # Bell
+                     bell = act.get("endSoundId", "default")
+                     if bell and bell != "None": playlist.append(self._resolve_sound_path(bell, "bells"))
+                     # Announcement
+                     ann = act.get("endAnnouncementId", None)
+                     if ann and ann != "None": playlist.append(self._resolve_sound_path(ann, "announcements"))
 
+                     if playlist:
+                         playlist = [p for p in playlist if p]
                          if playlist:
-                             playlist = [p for p in playlist if p]
-                             if playlist:
-                                 audio_engine.play_sequence(playlist, volume_type='bell')
+                             audio_engine.play_sequence_async(playlist, volume_type='bell', priority=PRIORITY_BELL)
 
-                    # Interim
-                    for ann in act.get("interimAnnouncements", []):
-                        if ann["enabled"] and ann["time"] == current_time_str:
-                            path = self._resolve_sound_path(ann.get("soundId", "default"), "announcements")
-                            if path:
-                                audio_engine.play_sequence([path], volume_type='bell')
+                # Interim
+                elif kind == "interim":
+                    path = self._resolve_sound_path(payload.get("soundId", "default"), "announcements")
+                    if path:
+                        audio_engine.play_sequence_async([path], volume_type='bell', priority=PRIORITY_ANNOUNCEMENT)
+
+            # Bells may have taken a while; evaluate state against the real time
+            now = datetime.now()
+            current_minute = now.hour * 60 + now.minute
 
             # --- State Determination ---
-            # Find if we are currently INSIDE an activity
-            temp_state = "IDLE"
-            active_activity_now = None
-            for act in today_sched.get("activities", []):
-                if act["startTime"] <= current_time_str < act["endTime"]:
-                     active_activity_now = act
-                     break
-            
-            if active_activity_now:
-                temp_state = "WORK"
-            else:
-                # Check if within day bounds (Break)
-                acts = today_sched.get("activities", [])
-                if acts:
-                    sorted_acts = sorted(acts, key=lambda x: x["startTime"])
-                    day_start = sorted_acts[0]["startTime"]
-                    day_end = sorted_acts[-1]["endTime"]
-                    if day_start <= current_time_str < day_end:
-                         temp_state = "BREAK"
-                    else:
-                         temp_state = "IDLE"
-                else:
-                    temp_state = "IDLE"
+            # WORK inside an activity, BREAK between the first start and the last end, else IDLE
+            temp_state = today.state_at(current_minute)
 
             # Detect State Change -> Reset Manual Override
             if temp_state != self.current_state:
                 print(f"State Change: {self.current_state} -> {temp_state}. Resetting Auto.")
                 self.manual_override_active = False 
                 self.current_state = temp_state
+                if temp_state == "BREAK" and self.music_source == "radio":
+                    radio_prober.probe_now()  # Fresh ranking for this break's failover
             
+            # Only a break with music needs periodic attention (dropped stream / next track)
+            watch_music = False
+
             # --- Music Enforcement (Respect Manual Override) ---
             if not self.manual_override_active:
                 if self.current_state == "WORK":
@@ -849,32 +1057,14 @@ class SchedulerService:
 
                 elif self.current_state == "BREAK":
                     # BREAK: Check previous activity's music setting
-                    should_play = False
-                    acts = today_sched.get("activities", [])
-                    if acts:
-                        sorted_acts = sorted(acts, key=lambda x: x["startTime"])
-                        # Find the activity that just ended (or is currently passed)
-                        # Iterate backwards to find the first act with endTime <= current_time
-                        current_time_str_check = datetime.now().strftime("%H:%M")
-                        for act in reversed(sorted_acts):
-                            if act["endTime"] <= current_time_str_check:
-                                should_play = act.get("playMusic", False)
-                                # print(f"Current Break follows act: {act['name']}, playMusic: {should_play}")
-                                break
+                    should_play = today.music_after(current_minute)
                     
                     if should_play:
-                        if not audio_engine.check_music_status():
+                        watch_music = True
+                        # A queued start (e.g. behind a bell) counts as playing
+                        if not audio_engine.check_music_status() and not audio_engine.music_pending():
                              print("Auto-playing Break Music - State: BREAK, Music Source:", self.music_source)
-                             # Reload config logic if needed...
-                             if os.path.exists(self.config_file):
-                                try:
-                                    with open(self.config_file, "r") as f:
-                                        data = json.load(f)
-                                        self.radio_url = data.get("radio_url", "")
-                                        self.radio_stations = data.get("radio_stations", [])
-                                        self.music_source = data.get("music_source", "local")
-                                        self.company_name = data.get("company_name", "İşletme Zil Programı")
-                                except: pass
+                             # Radio settings are current: API writes and file edits arrive via config_store
                              self._play_music()
                     else:
                         # If break but music disabling requested (by previous activity)
@@ -891,7 +1081,8 @@ class SchedulerService:
                 # For now, let VLC handle playlist/stream. 
                 pass
 
-            time.sleep(1)
+            # Sleep until the next bell / state boundary instead of polling every second
+            self._sleep_until_next_event(watch_music)
 
     def _handle_idle_state(self):
         if audio_engine.is_playing_music and not self.manual_override_active:
@@ -903,24 +1094,16 @@ class SchedulerService:
              elif default_dir == "announcements": filename = "isg1.mp3" # Or return None?
              else: return None
         
-        # Try finding it
-        dirs_to_check = [
-            os.path.join(self.bell_dir, filename),
-            os.path.join(self.announcement_dir, filename),
-            os.path.join(self.music_dir, filename)
-        ]
-        
-        # Priority to the requested default_dir
-        if default_dir == "bells":
-             dirs_to_check.insert(0, os.path.join(self.bell_dir, filename))
-        elif default_dir == "announcements":
-             dirs_to_check.insert(0, os.path.join(self.announcement_dir, filename))
-
-        for p in dirs_to_check:
-             if os.path.exists(p): return p
+        # Library lookup (in memory), requested folder first
+        order = ["bells", "announcements", "music"]
+        if default_dir in order:
+            order.remove(default_dir)
+            order.insert(0, default_dir)
+        path = media_library.find(filename, order)
+        if path: return path
         
         # Fallbacks for specific defaults if not found
-        if filename == "Melodi1.mp3": return os.path.join(self.bell_dir, "work_start.mp3") if os.path.exists(os.path.join(self.bell_dir, "work_start.mp3")) else None
+        if filename == "Melodi1.mp3": return media_library.find("work_start.mp3", ["bells"])
         
         print(f"File not found: {filename}")
         return None
@@ -930,62 +1113,105 @@ class SchedulerService:
         # This function is not being replaced, skipping.calls to this in loop.
         # But let's act as wrapper.
         path = self._resolve_sound_path(sound_id)
-        if path: audio_engine.play_alert(path, volume=self.volume_bell)
+        if path: audio_engine.play_alert_async(path, priority=PRIORITY_BELL)
 
     def _play_music(self, channel='music'):
         # Check source
         if self.music_source == "radio" and self.radio_url:
-            print(f"DEBUG: Attempting to play radio: {self.radio_url} (Ch: {channel})")
-            audio_engine.play_media(self.radio_url, 'url', volume_type=channel)
-            
-            # --- CONNECTION SAFEGUARD ---
-            def check_radio_health():
-                import time
-                time.sleep(5) # Give 5 seconds for VLC to buffer/connect
-                # Check status. Note: check_music_status() updates internal flag based on VLC state.
-                if not audio_engine.check_music_status() or audio_engine.player.get_state() in [vlc.State.Error, vlc.State.Ended, vlc.State.Stopped]:
-                    print("⚠️ RADIO CONNECTION FAILED (No Internet?). Falling back to Local MP3s.")
-                    # Fallback: Play local music immediately
-                    self._play_local_music(channel)
-
-            # Run check in background so we don't block the scheduler
-            import threading
-            threading.Thread(target=check_radio_health, daemon=True).start()
+            # A stream that died mid-break counts against its station
+            if audio_engine.music_failed():
+                self._radio_failed(audio_engine.current_media_source)
+
+            url = self._pick_station()
+            if not url:
+                print("⚠️ RADIO CONNECTION FAILED (No Internet?). Falling back to Local MP3s.")
+                self._play_local_music(channel)
+                return
+            print(f"DEBUG: Attempting to play radio: {url} (Ch: {channel})")
+
+            def on_started(future):
+                # Superseded or stopped before it ran: nothing to check
+                if future.cancelled() or future.exception(): return
+                if future.result() is False:
+                    # Errored while connecting: next best station (or local music) right away
+                    self._radio_failed(url)
+                    self._play_music(channel)
+
+            audio_engine.play_media_async(url, 'url', volume_type=channel, callback=on_started)
             return
 
         # If not radio, play local
         self._play_local_music(channel)
 
+    def _pick_station(self):
+        """The configured station unless it is failing, else the fastest healthy one (None: none left)."""
+        now = time.time()
+        held = {url for url, t in self._radio_failures.items() if now - t < RADIO_RETRY_HOLD}
+        if self.radio_url not in held and radio_prober.is_healthy(self.radio_url) is not False:
+            return self.radio_url
+        best = radio_prober.best(exclude=held | {self.radio_url})
+        if best:
+            print(f"Radio failover: {best['name']} ({best['first_byte_ms']} ms to first audio)")
+            return best["url"]
+        return None
+
+    def _on_stream_incident(self, kind, source):
+        """Monitor thread: hands the incident to the loop, which owns playback decisions."""
+        self._stream_events.append((kind, source))
+        if self.running:
+            self.wake()
+        else:
+            # No loop thread (manual radio with the scheduler off): nothing to race with
+            self._handle_stream_incidents()
+
+    def _handle_stream_incidents(self):
+        while self._stream_events:
+            kind, source = self._stream_events.popleft()
+            try:
+                self._stream_incident(kind, source)
+            except Exception as e:
+                print(f"Stream incident error: {e}")
+
+    def _stream_incident(self, kind, source):
+        """A live stream stalled or went silent: reconnect once, fail over if it happens again."""
+        if audio_engine.current_media_source != source: return
+        channel = audio_engine.current_volume_type
+        now = time.time()
+        previous = self._stream_incidents.get(source, 0)
+        self._stream_incidents[source] = now
+        is_station = self.music_source == "radio" and (
+            source == self.radio_url or any(s.get("url") == source for s in self.radio_stations))
+        if is_station and now - previous < STREAM_INCIDENT_WINDOW:
+            print(f"Stream {kind} again within {STREAM_INCIDENT_WINDOW / 60:.0f} min, failing over")
+            self._radio_failed(source)
+            self._play_music(channel)
+        else:
+            print(f"Stream {kind}: reconnecting {source}")
+            audio_engine.reconnect(source, channel)
+
+    def radio_probe_wanted(self) -> bool:
+        """Station health only matters while radio is the source and a break or manual radio is on."""
+        if self.music_source != "radio": return False
+        if audio_engine.is_playing_music and audio_engine.current_media_type == 'url':
+            return True
+        return self.running and self.current_state == "BREAK"
+
+    def _radio_failed(self, url):
+        if not url: return
+        print(f"⚠️ Radio station failed: {url}")
+        self._radio_failures[url] = time.time()
+        radio_prober.report_failure(url)
+
     def _play_local_music(self, channel='music'):
-        if not os.path.exists(self.music_dir): return
-        
-        # Smart Shuffle Logic
-        if not hasattr(self, 'shuffled_playlist') or not self.shuffled_playlist:
-            files = sorted([f for f in os.listdir(self.music_dir) if f.endswith(".mp3")])
-            if not files: 
-                print("❌ Local music folder is empty!")
-                return
-            # Create a new shuffled playlist
-            import random
-            random.shuffle(files)
-            self.shuffled_playlist = files
-            self.playlist_index = 0
-            
-        if self.playlist_index >= len(self.shuffled_playlist):
-            self.playlist_index = 0 
-            files = sorted([f for f in os.listdir(self.music_dir) if f.endswith(".mp3")])
-            if not files: return
-            import random
-            random.shuffle(files)
-            self.shuffled_playlist = files
-            
-        current_file = self.shuffled_playlist[self.playlist_index]
-        full_path = os.path.join(self.music_dir, current_file)
-        
-        print(f"DEBUG: Playing local music: {full_path} (Ch: {channel})")
-        audio_engine.play_media(full_path, 'file', volume_type=channel)
+        # Smart Shuffle Logic: a fresh shuffle per pass, played gapless by the audio engine
+        playlist = media_library.paths("music")
+        if not playlist: 
+            print("❌ Local music folder is empty!")
+            return
+        random.shuffle(playlist)
         
-        self.playlist_index = (self.playlist_index + 1) % len(self.shuffled_playlist)
+        print(f"DEBUG: Playing local music playlist: {len(playlist)} tracks (Ch: {channel})")
+        audio_engine.play_playlist_async(playlist, volume_type=channel)
 
     def manual_stop(self):
         print("Manual Stop Requested")
@@ -1010,93 +1236,89 @@ class SchedulerService:
             self.manual_override_active = True
             audio_engine.stop_media()
 
-    def _update_next_event(self, today_sched, current_time_str):
-        # Collect all triggers: Start Bell, End Bell, Announcements
-        triggers = []
-        for act in today_sched.get("activities", []):
-            if act["startTime"] > current_time_str:
-                triggers.append({"time": act["startTime"], "name": f"Başlangıç: {act['name']}"})
-            if act["endTime"] > current_time_str:
-                 triggers.append({"time": act["endTime"], "name": f"Bitiş: {act['name']}"})
-            
-            for ann in act.get("interimAnnouncements", []):
-                if ann["enabled"] and ann["time"] > current_time_str:
-                    triggers.append({"time": ann["time"], "name": "Ara Duyuru"})
-
-        if not triggers:
+    def _update_next_event(self, today, current_minute):
+        # First Start Bell, End Bell or Announcement after the current minute
+        next_evt = today.next_trigger(current_minute)
+        if not next_evt:
              self.next_event_name = "Plan Tamamlandı"
              self.next_event_time = "-"
              return
-             
-        # Sort by time
-        triggers.sort(key=lambda x: x["time"])
-        next_evt = triggers[0]
-        self.next_event_name = next_evt["name"]
-        self.next_event_time = next_evt["time"]
+
+        self.next_event_time, self.next_event_name = next_evt
 
     def get_daily_timeline(self):
         """Returns a sorted list of all events for today for UI visualization."""
         now = datetime.now()
         current_day_idx = now.weekday()
-        current_time_str = now.strftime("%H:%M")
         
-        # Be robust: Convert both to int just in case
-        today_sched = next((d for d in self.schedule if int(d["dayOfWeek"]) == current_day_idx), None)
+        today = self._index.day(current_day_idx)
         
-        # If disabled, we might still want to show what WAS planned but greyed out?
+        # If disabled, we still show what WAS planned but greyed out
         # User feedback: "var aslında ama geçmiş olarak görünmeli" implies they want to see it.
-        # So we loosen the check: If it exists, return it.
-        # But if it is disabled, maybe we mark all as 'disabled' or 'passed'?
-        # If today_sched is None, truly nothing.
-        if not today_sched:
+        # If there is no compiled day, truly nothing.
+        if not today:
             print(f"Daily Timeline: No schedule for Day {current_day_idx}")
             return []
 
-        events = []
-        # If !enabled, we can still show them but maybe frontend handles passed/disabled?
-        # Effectively, if disabled, they are 'cancelled'.
-        # But for visibility, let's return them.
-        is_enabled = today_sched.get("enabled", False)
-
-        for act in today_sched.get("activities", []):
-            # Start
-            events.append({
-                "time": act["startTime"],
-                "name": f"Başlangıç: {act['name']}",
-                "type": "start",
-                "passed": act["startTime"] < current_time_str or not is_enabled # Mark passed if disabled too?
-            })
-            # End
-            events.append({
-                "time": act["endTime"],
-                "name": f"Bitiş: {act['name']}",
-                "type": "end",
-                "passed": act["endTime"] < current_time_str or not is_enabled
-            })
-            # Announcements
-            for ann in act.get("interimAnnouncements", []):
-                if ann["enabled"]:
-                    events.append({
-                        "time": ann["time"],
-                        "name": "Ara Duyuru",
-                        "type": "announcement",
-                        "passed": ann["time"] < current_time_str or not is_enabled
-                    })
-        
-        # Sort by time
-        events.sort(key=lambda x: x["time"])
-        return events
+        # Disabled days come back with every event marked passed
+        return today.timeline(now.hour * 60 + now.minute)
+
+    def render_tts(self, text):
+        """Returns the path of a cached MP3 of text in the selected voice, rendering it on a miss."""
+        # Determine Engine and Voice
+        # Default to High Quality Edge TTS if not specified
+        engine_voice = getattr(self, 'tts_engine', 'edge-tr-emel')
+
+        # Edge TTS (Neural / High Quality) first, Google TTS (Standard / Robotic) as fallback
+        candidates = []
+        if engine_voice.startswith("edge-"):
+            candidates.append(("edge-tts", EDGE_VOICE_MAP.get(engine_voice, "tr-TR-EmelNeural")))
+        candidates.append(("gTTS", "tr"))
+
+        for package, voice in candidates:
+            key = tts_cache.make_key(text, f"{package}:{voice}", engine_version(package))
+            cached = tts_cache.get(key)
+            if cached:
+                print(f"TTS Cache Hit: Voice='{voice}'")
+                return cached
+
+            tmp_path = tts_cache.temp_path(key)
+            try:
+                if package == "edge-tts":
+                    print(f"TTS Generaton: Engine='{engine_voice}' -> Mapped Voice='{voice}'")
+                    self._render_edge_tts(text, voice, tmp_path)
+                else:
+                    from gtts import gTTS
+                    tts = gTTS(text=text, lang=voice)
+                    tts.save(tmp_path)
+                return tts_cache.put(key, tmp_path, text, f"{package}:{voice}")
+            except Exception as e:
+                if os.path.exists(tmp_path): os.remove(tmp_path)
+                print(f"{package} Error: {e}. Trying next engine...")
+
+        # Every engine failed (no internet?) - replay an earlier render of the same text in any voice
+        cached = tts_cache.find_any_voice(text)
+        if cached:
+            print("TTS engines unavailable. Replaying cached render.")
+        return cached
+
+    def _render_edge_tts(self, text, voice, path):
+        import asyncio
+        import edge_tts
+
+        async def _run_edge():
+            communicate = edge_tts.Communicate(text, voice)
+            await communicate.save(path)
+
+        # Scheduler and API worker threads have no event loop of their own, so asyncio.run is safe here
+        asyncio.run(_run_edge())
 
     def generate_tts_audio(self, text, filename=None):
-        """Generates a TTS MP3 file from text using selected engine."""
+        """Generates a TTS MP3 file in the announcements folder (served from the render cache)."""
         try:
             import re
             import time
             
-            # Determine Engine and Voice
-            # Default to High Quality Edge TTS if not specified
-            engine_voice = getattr(self, 'tts_engine', 'edge-tr-emel') 
-            
             if not filename:
                 # Use first 50 characters of text as filename
                 safe_text = re.sub(r'[^\w\s-]', '', text[:50])
@@ -1108,60 +1330,19 @@ class SchedulerService:
 
             path = os.path.join(self.announcement_dir, filename)
 
-            # --- Edge TTS (Neural / High Quality) ---
-            if engine_voice.startswith("edge-"):
-                try:
-                    import asyncio
-                    import edge_tts
-                    
-                    # Map simplified names to Edge TTS Voice IDs
-                    voice_map = {
-                        "edge-tr-ahmet": "tr-TR-AhmetNeural",
-                        "edge-tr-emel": "tr-TR-EmelNeural",
-                        "edge-en-guy": "en-US-GuyNeural",
-                        "edge-en-aria": "en-US-AriaNeural",
-                        "edge-de-conrad": "de-DE-ConradNeural",
-                        "edge-de-katja": "de-DE-KatjaNeural",
-                        "edge-ru-dmitry": "ru-RU-DmitryNeural",
-                        "edge-ru-svetlana": "ru-RU-SvetlanaNeural",
-                        "edge-bg-borislav": "bg-BG-BorislavNeural",
-                        "edge-bg-kalina": "bg-BG-KalinaNeural"
-                    }
-                    voice = voice_map.get(engine_voice, "tr-TR-EmelNeural")
-                    print(f"TTS Generaton: Engine='{engine_voice}' -> Mapped Voice='{voice}'")
-                    
-                    async def _run_edge():
-                        communicate = edge_tts.Communicate(text, voice)
-                        await communicate.save(path)
+            rendered = self.render_tts(text)
+            if not rendered:
+                print("TTS Error: No engine could render the text and nothing is cached.")
+                return None
 
-                    # Determine if we are in an existing loop
-                    try:
-                        loop = asyncio.get_running_loop()
-                        # If we are already in an async event loop (unlikely for this specific sync method call chain but possible)
-                        # We cannot use asyncio.run. We have to use a thread or future.
-                        # For simplicity in this sync method, we just run in a thread safely
-                        # OR since this is usually called from valid sync context (Scheduler Loop), asyncio.run is fine.
-                        # But wait, main.py is async. Scheduler runs in a Thread.
-                        # Thread has no loop by default.
-                    except RuntimeError:
-                        loop = None
-
-                    if loop:
-                         # We are in a loop? Create a task? No, we need to block and wait for file.
-                         # This shouldn't happen deep in scheduler thread.
-                        pass
-                        
-                    asyncio.run(_run_edge())
-                    return filename
-                    
-                except Exception as e:
-                    print(f"EdgeTTS Error: {e}. Falling back to Google TTS...")
-                    # Fallthrough to gTTS
-
-            # --- Google TTS (Standard / Robotic) ---
-            from gtts import gTTS
-            tts = gTTS(text=text, lang='tr')
-            tts.save(path)
+            # Copied next to the target and renamed, so a player never sees a half-written file
+            tmp_path = os.path.join(self.announcement_dir, f".{filename}.part")
+            shutil.copyfile(rendered, tmp_path)
+            os.replace(tmp_path, path)
+            media_library.refresh("announcements")
+            # Same ingest stage as uploads (trims the engines' leading/trailing silence);
+            # the result is swapped in only once nothing is playing or queued to play it
+            transcode_service.submit("announcements", filename)
             return filename
 
         except Exception as e:
@@ -1170,14 +1351,13 @@ class SchedulerService:
 
     def _cleanup_old_tts(self):
         """Cleans up temporary TTS files older than 7 days."""
+        tts_cache.evict() # Drop expired/oversized cache entries too
         try:
             now = time.time()
             retention_period = 7 * 24 * 3600  # 7 Days
             
-            if not os.path.exists(self.announcement_dir):
-                return
-
-            for f in os.listdir(self.announcement_dir):
+            removed = False
+            for f in media_library.list("announcements"):
                 if f.startswith("temp_tts_") and f.endswith(".mp3"):
                     try:
                         # Format: temp_tts_{timestamp}__{slug}.mp3 or temp_tts_{timestamp}.mp3
@@ -1187,69 +1367,69 @@ class SchedulerService:
                         if now - timestamp > retention_period:
                             path = os.path.join(self.announcement_dir, f)
                             os.remove(path)
+                            removed = True
                             print(f"Cleaned up old TTS file: {f}")
-                    except ValueError:
+                    except (ValueError, OSError):
                         continue # Skip if parsing fails
+            
+            if removed: media_library.refresh("announcements")
                         
         except Exception as e:
             print(f"Error during TTS cleanup: {e}")
 
     def _load_config(self):
-        if os.path.exists(self.config_file):
-            try:
-                import json
-                with open(self.config_file, "r") as f:
-                    data = json.load(f)
-                    self.radio_url = data.get("radio_url", self.radio_url) # Keep default if missing
-                    # Only overwrite stations if the file has a non-empty list
-                    loaded_stations = data.get("radio_stations", [])
-                    if loaded_stations:
-                        self.radio_stations = sorted(loaded_stations, key=lambda x: x['name'])
-                    
-                    self.start_on_boot = data.get("start_on_boot", True)
-
-                    self.music_source = data.get("music_source", "local")
-                    self.company_name = data.get("company_name", "İşletme Zil Programı")
-                    
-                    self.volume_bell = data.get("volume_bell", 100)
-                    self.volume_music = data.get("volume_music", 25)
-                    self.volume_manual = data.get("volume_manual", 50)
-                    self.volume_system = data.get("volume_system", 100)
-                    
-                    # If key exists, use it. If not, fallback to whatever we set in __init__ (all holidays)
-                    if "skipped_holidays" in data:
-                        self.skipped_holidays = data["skipped_holidays"]
-                    
-                    self.holiday_country = data.get("holiday_country", "TR")
-                    self.restore_manual_playback = data.get("restore_manual_playback", False)
-                
-                    # Load Streaming config
-                    if "streaming" in data:
-                        self.streaming_enabled = data["streaming"].get("enabled", False)
-                        self.streaming_port = data["streaming"].get("port", 8080)
-                    
-                    # Load App Autostart config
-                    self.app_autostart_enabled = data.get("app_autostart_enabled", False)
-                    
-                    # TTS Engine
-                    self.tts_engine = data.get("tts_engine", "edge-tr-emel")
-                    
-                    # Frontend Auto Open
-                    self.frontend_auto_open = data.get("frontend_auto_open", True)
-                    
-                    # KEY FIX: Apply loaded volume to engine immediately
-                    # Otherwise engine defaults to hardcoded values
-                    audio_engine.set_channel_volume('bell', self.volume_bell)
-                    audio_engine.set_channel_volume('music', self.volume_music)
-                    audio_engine.set_channel_volume('manual', self.volume_manual)
-
-            except Exception as e:
-                print(f"Error loading config: {e}")
+        if config_store.load():
+            # Keys missing from the file get their defaults, as with the old loader
+            self._apply_config({key: None for key in CONFIG_DEFAULTS} | config_store.snapshot())
+            # KEY FIX: Apply loaded volume to engine immediately
+            # Otherwise engine defaults to hardcoded values
+            audio_engine.set_channel_volume('bell', self.volume_bell)
+            audio_engine.set_channel_volume('music', self.volume_music)
+            audio_engine.set_channel_volume('manual', self.volume_manual)
         else:
             self._save_config()
+        # Hand edits of config.json reach us through the store (the engine listens for volumes)
+        config_store.subscribe(self._apply_config)
+        config_store.watch()
+
+    def _apply_config(self, data):
+        """
+        Copies config keys present in data onto the service (load and on-disk edits).
+        None means the key was deleted from the file: it falls back to its default,
+        or keeps the current value where the old loader did that (stations, holidays).
+        """
+        def value(key):
+            v = data[key]
+            return CONFIG_DEFAULTS[key] if v is None else v
+
+        try:
+            if data.get("radio_url"):
+                self.radio_url = data["radio_url"]
+                # A YouTube station is resolved before the first break needs it
+                url_resolver.prefetch(self.radio_url)
+            # Only overwrite stations with a non-empty list
+            if data.get("radio_stations"):
+                self.radio_stations = sorted(data["radio_stations"], key=lambda x: x['name'])
+            for key in CONFIG_DEFAULTS:
+                if key in data: setattr(self, key, value(key))
+            # Deleted volume keys come back as defaults; the engine only sees the raw change
+            for channel in ('bell', 'music', 'manual'):
+                if f"volume_{channel}" in data and audio_engine.get_channel_volume(channel) != getattr(self, f"volume_{channel}"):
+                    audio_engine.set_channel_volume(channel, getattr(self, f"volume_{channel}"))
+
+            # If key is missing, the property falls back to all holidays
+            if data.get("skipped_holidays") is not None:
+                self.skipped_holidays = data["skipped_holidays"]
+            if "holiday_country" in data:
+                holiday_service.set_country(self.holiday_country)
+
+            if data.get("streaming") is not None:
+                self.streaming_enabled = data["streaming"].get("enabled", False)
+                self.streaming_port = data["streaming"].get("port", 8080)
+        except Exception as e:
+            print(f"Error loading config: {e}")
 
     def _save_config(self):
-        import json
         data = {
             "radio_url": self.radio_url,
             "start_on_boot": self.start_on_boot,
@@ -1272,11 +1452,8 @@ class SchedulerService:
             "audio_device_id": getattr(self, "audio_device_id", None),
             "frontend_auto_open": getattr(self, "frontend_auto_open", True)
         }
-        try:
-            with open(self.config_file, "w") as f:
-                json.dump(data, f, indent=4)
-        except Exception as e:
-            print(f"Config save error: {e}")
+        # Write-through: the store persists (behind) and tells listeners what changed
+        config_store.update(data)
 
     def _load_schedule(self):
         if os.path.exists(self.schedule_file):
@@ -1290,13 +1467,9 @@ class SchedulerService:
                 self.schedule = self._get_default_schedule()
         else:
             self.schedule = self._get_default_schedule()
+        self._compile_schedule()
 
     def _save_schedule(self):
-        import json
-        try:
-            with open(self.schedule_file, "w") as f:
-                json.dump(self.schedule, f, indent=4)
-        except Exception as e:
-            print(f"Schedule save error: {e}")
+        persistence.save(self.schedule_file, self.schedule)
 
 scheduler = SchedulerService()
@@ -1,10 +1,84 @@
 import json
 import os
 import threading
-from datetime import datetime
-import pandas as pd
+import calendar
+from datetime import datetime, date, timedelta
 from typing import List, Dict, Optional
 
+from persistence import persistence
+
+# Where Feb 29 birthdays are celebrated in non-leap years
+FEB29_POLICIES = ("feb28", "mar1")
+
+# Import: CSV rows per chunk, and how many problem rows the report lists individually
+IMPORT_CHUNK_ROWS = 10000
+IMPORT_REPORT_ROWS = 500
+# Columns that identify an employee across HR exports (lower-cased header)
+ID_COLUMNS = ("id", "sicil", "sicil no", "personel no", "employee id")
+# Unambiguous text formats, tried in order (ambiguous d/m vs m/d is handled separately)
+DATE_FORMATS = ("%Y-%m-%d", "%d.%m.%Y", "%Y/%m/%d", "%d-%m-%Y", "%Y.%m.%d")
+# Excel serial day numbers accepted as birth dates (1927-05-18 .. 2064-04-08). Anything
+# else numeric, like a bare year "1990", is not a date and gets rejected.
+SERIAL_MIN, SERIAL_MAX = 10000, 60000
+
+
+def person_key(person: dict) -> str:
+    """Stable upsert key: employee id when the export has one, else name + full date."""
+    if person.get("id"):
+        return f"id:{person['id']}"
+    name = " ".join(str(person.get("name", "")).split()).casefold()
+    return f"{name}|{person.get('date', '')}"
+
+
+def parse_dates(series):
+    """
+    Vectorized date parsing for a whole column: real dates (Excel), Excel serial numbers,
+    the formats above, and d/m/Y vs m/d/Y decided once per column. Unparseable -> NaT.
+    """
+    import pandas as pd
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series
+
+    result = pd.Series(pd.NaT, index=series.index, dtype="datetime64[ns]")
+    # Already-parsed cells (Excel can mix datetime objects with text)
+    is_dt = series.map(lambda v: isinstance(v, (datetime, date)))
+    if is_dt.any():
+        result[is_dt] = pd.to_datetime(series[is_dt], errors="coerce")
+
+    text = series.where(~is_dt).astype(str).str.strip().str.split(" ").str[0]
+
+    # Excel serial day numbers (e.g. 32903 = 1990-01-30) that arrived as text/number
+    numeric = pd.to_numeric(text, errors="coerce")
+    serial = numeric.between(SERIAL_MIN, SERIAL_MAX) & result.isna()
+    if serial.any():
+        result[serial] = pd.to_datetime(numeric[serial], unit="D", origin="1899-12-30")
+
+    # Other bare numbers (year only, small serials) must not fall through to the formats below
+    unparseable = numeric.notna() & ~serial & result.isna()
+
+    for fmt in DATE_FORMATS:
+        todo = result.isna() & ~unparseable
+        if not todo.any(): break
+        result[todo] = pd.to_datetime(text[todo], format=fmt, errors="coerce")
+
+    # Slashed dates: day-first unless the column proves otherwise (Turkish exports are day-first)
+    todo = result.isna() & ~unparseable & text.str.match(r"^\d{1,2}/\d{1,2}/\d{4}$")
+    if todo.any():
+        parts = text[todo].str.split("/", expand=True).astype(int)
+        month_first = (parts[1] > 12).any() and not (parts[0] > 12).any()
+        result[todo] = pd.to_datetime(text[todo], format="%m/%d/%Y" if month_first else "%d/%m/%Y", errors="coerce")
+    return result
+
+
+def month_day(date_str: str) -> Optional[str]:
+    """MM-DD from a stored date (legacy MM-DD or YYYY-MM-DD), or None if unusable."""
+    if not date_str: return None
+    if len(date_str) == 5: # MM-DD
+        return date_str
+    if len(date_str) == 10: # YYYY-MM-DD
+        return date_str[5:]
+    return None
+
 class SpecialDaysService:
     def __init__(self, data_file="special_days.json"):
         self.data_file = data_file
@@ -14,9 +88,36 @@ class SpecialDaysService:
             "announcement_times": ["09:00", "14:00"],
             "template": "Bugün {name} arkadaşımızın doğum günü. Doğum gününü kutlar, sevdikleriyle mutlu, sağlıklı bir yıl dileriz."
         }
-        self.people = [] # List of { name: str, date: "MM-DD" }
+        self._people = [] # List of { name: str, date: "MM-DD" }
+        self.by_month_day: Dict[str, List[dict]] = {} # "MM-DD" -> people, so lookups don't scan the list
         self.load_data()
 
+    @property
+    def people(self) -> List[dict]:
+        return self._people
+
+    @people.setter
+    def people(self, value: List[dict]):
+        self._people = list(value)
+        self._rebuild_index()
+
+    def _rebuild_index(self):
+        index = {}
+        for p in self._people:
+            self._index_person(index, p)
+        self.by_month_day = index
+
+    @staticmethod
+    def _index_person(index: Dict[str, List[dict]], person: dict):
+        md = month_day(person.get('date', ''))
+        if md: index.setdefault(md, []).append(person)
+
+    def add_people(self, new_people: List[dict]):
+        """Appends people and indexes only the new entries."""
+        self._people.extend(new_people)
+        for p in new_people:
+            self._index_person(self.by_month_day, p)
+
     def load_data(self):
         if os.path.exists(self.data_file):
             try:
@@ -29,85 +130,125 @@ class SpecialDaysService:
 
     def save_data(self):
         with self.lock:
-            try:
-                with open(self.data_file, 'w') as f:
-                    json.dump({
-                        "config": self.config,
-                        "people": self.people
-                    }, f, indent=4)
-            except Exception as e:
-                print(f"Error saving special days: {e}")
+            persistence.save(self.data_file, {
+                "config": self.config,
+                "people": self.people
+            })
 
-    def import_from_excel(self, file_path: str) -> int:
-        """Imports people from Excel/CSV. Expected columns: Name, Date (YYYY-MM-DD or DD.MM.YYYY)"""
+    def import_from_excel(self, file_path: str) -> dict:
+        """
+        Imports people from Excel/CSV. Expected columns: Name, Date (YYYY-MM-DD, DD.MM.YYYY, ...),
+        optionally an employee id. Rows are upserted (re-importing the same export adds nobody)
+        and a report of accepted/updated/duplicate/rejected rows is returned.
+        """
+        import pandas as pd # Only needed here; keeps startup fast
         try:
-            if file_path.endswith('.csv'):
-                df = pd.read_csv(file_path)
+            if file_path.lower().endswith('.csv'):
+                # Streamed so a large HR dump never sits in memory as a whole
+                chunks = pd.read_csv(file_path, dtype=str, chunksize=IMPORT_CHUNK_ROWS, sep=None, engine='python')
             else:
-                df = pd.read_excel(file_path)
-            
-            # Normalize columns
-            df.columns = [c.strip().lower() for c in df.columns]
-            
-            # Look for suitable columns
-            name_col = next((c for c in df.columns if 'name' in c or 'ad' in c or 'isim' in c), None)
-            date_col = next((c for c in df.columns if 'date' in c or 'tarih' in c or 'gün' in c), None)
-            
-            if not name_col or not date_col:
-                print("Columns not found. headers:", df.columns)
-                return 0
-
-            count = 0
+                chunks = [pd.read_excel(file_path)]
+
+            report = {"accepted": 0, "updated": 0, "duplicate": 0, "rejected": 0, "rows": []}
+            by_key = {person_key(p): p for p in self.people}
             new_people = []
-            
-            for _, row in df.iterrows():
-                try:
-                    name = str(row[name_col]).strip()
-                    raw_date = row[date_col]
-                    
-                    # Parse date
-                    parsed_date = pd.to_datetime(raw_date, errors='coerce')
-                    if pd.isna(parsed_date): continue
-                    
-                    # Format as YYYY-MM-DD for storage (Full Date)
-                    date_str = parsed_date.strftime("%Y-%m-%d")
-                    
-                    new_people.append({"name": name, "date": date_str})
-                    count += 1
-                except Exception as ex:
-                    print(f"Skipping row: {ex}")
-            
-            self.people.extend(new_people)
+            changed = False
+            first_row = 2 # Row 1 is the header in the user's spreadsheet
+
+            for df in chunks:
+                cols = self._import_columns(df)
+                if not cols:
+                    print("Columns not found. headers:", list(df.columns))
+                    raise ValueError("İsim/Tarih sütunları bulunamadı")
+                name_col, date_col, id_col = cols
+
+                # One vectorized pass per column
+                names = df[name_col].astype(str).str.strip()
+                names = names.where(df[name_col].notna() & names.ne("") & names.str.lower().ne("nan"))
+                dates = parse_dates(df[date_col]).dt.strftime("%Y-%m-%d")
+                ids = df[id_col].astype(str).str.strip().where(df[id_col].notna()) if id_col else None
+
+                for offset, (name, date_str, raw) in enumerate(zip(names, dates, df[date_col])):
+                    row = first_row + offset
+                    if not isinstance(name, str):
+                        self._report_row(report, "rejected", row, None, raw, "İsim boş")
+                        continue
+                    if not isinstance(date_str, str):
+                        self._report_row(report, "rejected", row, name, raw, "Tarih okunamadı")
+                        continue
+
+                    person = {"name": name, "date": date_str}
+                    if ids is not None and isinstance(ids.iloc[offset], str) and ids.iloc[offset]:
+                        person["id"] = ids.iloc[offset]
+                    key = person_key(person)
+
+                    existing = by_key.get(key)
+                    if existing is None:
+                        by_key[key] = person
+                        new_people.append(person)
+                        report["accepted"] += 1
+                    elif existing.get("date") == date_str and existing.get("name") == name:
+                        self._report_row(report, "duplicate", row, name, raw, "Zaten kayıtlı")
+                    else:
+                        # Same employee id, corrected name/date
+                        existing.update(name=name, date=date_str)
+                        changed = True
+                        report["updated"] += 1
+                first_row += len(df)
+
+            if changed:
+                self.people = self.people + new_people # Full reindex (dates moved)
+            else:
+                self.add_people(new_people)
             self.save_data()
-            return count
+            print(f"Import: {report['accepted']} new, {report['updated']} updated, "
+                  f"{report['duplicate']} duplicate, {report['rejected']} rejected")
+            return report
         except Exception as e:
             print(f"Import failed: {e}")
             raise e
 
+    @staticmethod
+    def _import_columns(df):
+        cols = {str(c).strip().lower(): c for c in df.columns}
+        id_col = next((orig for c, orig in cols.items() if c in ID_COLUMNS), None)
+        name_col = next((orig for c, orig in cols.items() if orig is not id_col and ('name' in c or 'ad' in c or 'isim' in c)), None)
+        date_col = next((orig for c, orig in cols.items() if 'date' in c or 'tarih' in c or 'gün' in c), None)
+        if name_col is None or date_col is None:
+            return None
+        return name_col, date_col, id_col
+
+    @staticmethod
+    def _report_row(report, status, row, name, raw, reason):
+        report[status] += 1
+        if len(report["rows"]) < IMPORT_REPORT_ROWS:
+            report["rows"].append({"row": row, "status": status, "name": name,
+                                   "value": None if raw is None else str(raw), "reason": reason})
+
     def get_todays_people(self) -> List[str]:
         """Returns list of names for today."""
-        today = datetime.now()
-        today_md = today.strftime("%m-%d")
-        
-        matches = []
-        for p in self.people:
-            # Handle both MM-DD (legacy) and YYYY-MM-DD formats
-            p_date = p.get('date', '')
-            if not p_date: continue
-            
-            # Extract MM-DD
-            if len(p_date) == 5: # MM-DD
-                p_md = p_date
-            elif len(p_date) == 10: # YYYY-MM-DD
-                p_md = p_date[5:]
-            else:
-                continue
-                
-            if p_md == today_md:
-                matches.append(p['name'])
-                
+        return [p['name'] for p in self.people_on(datetime.now().date())]
+
+    def people_on(self, day: date) -> List[dict]:
+        """People celebrated on a given date, including Feb 29 birthdays in non-leap years."""
+        matches = list(self.by_month_day.get(day.strftime("%m-%d"), []))
+        if not calendar.isleap(day.year):
+            policy = self.config.get("feb29_policy", "feb28")
+            if (policy == "feb28" and (day.month, day.day) == (2, 28)) or \
+               (policy == "mar1" and (day.month, day.day) == (3, 1)):
+                matches.extend(self.by_month_day.get("02-29", []))
         return matches
 
+    def upcoming(self, days: int = 30) -> List[dict]:
+        """Celebrations in the next `days` days (today included), soonest first."""
+        today = datetime.now().date()
+        result = []
+        for offset in range(max(0, days)):
+            day = today + timedelta(days=offset)
+            for p in self.people_on(day):
+                result.append({"name": p['name'], "date": p.get('date'), "on": day.isoformat(), "in_days": offset})
+        return result
+
     def generate_announcement_text(self, names: List[str]) -> str:
         if not names: return ""
         # If multiple people?
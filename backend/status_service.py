@@ -0,0 +1,206 @@
+import asyncio
+import json
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from audio_engine import audio_engine
+from scheduler_service import scheduler
+
+# The LAN address only changes on DHCP renewals / cable swaps
+IP_REFRESH_INTERVAL = 300.0
+# libvlc media stats are only for the radio health readout; no need for every poll
+STATS_REFRESH_INTERVAL = 2.0
+# Polls and push streams arriving closer together than this share one fingerprint check
+MIN_CHECK_INTERVAL = 0.2
+# How often push streams look for changes, and the default media position tick
+# (the position is not part of the snapshot version, so polls stay 304 while music plays)
+STREAM_CHECK_INTERVAL = 0.25
+DEFAULT_POSITION_INTERVAL = 1.0
+STREAM_HEARTBEAT = 15.0
+
+
+def get_local_ip():
+    try:
+        # Connect to a public DNS to find own IP (doesn't send data)
+        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        s.connect(("8.8.8.8", 80))
+        ip = s.getsockname()[0]
+        s.close()
+        return ip
+    except Exception:
+        return "127.0.0.1"
+
+
+class StatusBoard:
+    """
+    Versioned /status snapshot. Each poll compares a cheap fingerprint of the live
+    scheduler/audio fields; the JSON is only rebuilt (and the version bumped) when
+    it changed. Slow parts (IP, timeline, media stats) are cached separately.
+    media_time is as of the last rebuild: push streams tick it, pollers derive it
+    from media_started_at.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.boot_id = uuid.uuid4().hex[:8]  # So ETags from a previous run never match
+        self.version = 0
+        self.etag = None
+        self.body = b""
+        self.data = {}
+        self.fingerprint = None
+        self._checked_at = 0.0
+
+        self._ip = None
+        self._ip_at = 0.0
+        self._timeline = None
+        self._timeline_key = None
+        self._stats = None
+        self._stats_at = 0.0
+
+    def invalidate(self):
+        """Forces a rebuild on the next poll (e.g. after a settings change)."""
+        with self.lock:
+            self.fingerprint = None
+            self._timeline_key = None
+            self._checked_at = 0.0
+
+    def on_audio_change(self, *args):
+        # Music started/stopped: show it on the next check rather than after the throttle
+        with self.lock:
+            self._checked_at = 0.0
+
+    def current(self):
+        """Returns (etag, json_bytes) for the latest snapshot."""
+        with self.lock:
+            self._refresh()
+            return self.etag, self.body
+
+    def snapshot(self):
+        """Returns (version, dict) for the latest snapshot. Treat the dict as read-only."""
+        with self.lock:
+            self._refresh()
+            return self.version, self.data
+
+    def _refresh(self):
+        # Caller holds self.lock
+        now = time.monotonic()
+        if self.fingerprint is not None and now - self._checked_at < MIN_CHECK_INTERVAL:
+            return
+        self._checked_at = now
+        if self._ip is None or now - self._ip_at > IP_REFRESH_INTERVAL:
+            self._ip = get_local_ip()
+            self._ip_at = now
+        if now - self._stats_at > STATS_REFRESH_INTERVAL:
+            self._stats = audio_engine.get_playback_stats().get("stats")
+            self._stats_at = now
+
+        clock = datetime.now()
+        # The timeline only changes when the schedule is recompiled or a minute passes
+        timeline_key = (id(scheduler._index), clock.weekday(), clock.hour * 60 + clock.minute)
+        if timeline_key != self._timeline_key:
+            self._timeline = scheduler.get_daily_timeline()
+            self._timeline_key = timeline_key
+
+        fingerprint = self._fingerprint(timeline_key)
+        if fingerprint != self.fingerprint:
+            self.fingerprint = fingerprint
+            self.version += 1
+            self.etag = f'"{self.boot_id}-{self.version}"'
+            self.data = self._build()
+            self.body = json.dumps(self.data).encode("utf-8")
+
+    def _fingerprint(self, timeline_key):
+        return (
+            # Plain reads only: a status check must never stop playback
+            scheduler.current_state, audio_engine.music_playing(), audio_engine.get_player_state('music'),
+            audio_engine.current_volume_type, audio_engine.get_channel_volume(audio_engine.current_volume_type),
+            audio_engine.current_media_source, scheduler.next_event_name, scheduler.next_event_time,
+            scheduler.company_name, scheduler.radio_url, id(scheduler.radio_stations), scheduler.music_source,
+            audio_engine.media_length, timeline_key, scheduler.running,
+            scheduler.volume_bell, scheduler.volume_music, scheduler.volume_manual, scheduler.start_on_boot,
+            scheduler.streaming_enabled, scheduler.streaming_port, scheduler.app_autostart_enabled,
+            getattr(scheduler, "audio_device_id", None), json.dumps(self._stats, sort_keys=True), self._ip
+        )
+
+    def _build(self):
+        return {
+            "version": self.version,
+            "state": scheduler.current_state,
+            "is_playing": audio_engine.music_playing(),
+            "volume": audio_engine.get_channel_volume(audio_engine.current_volume_type),
+            "current_volume_type": audio_engine.current_volume_type,  # 'music' or 'manual'
+            "current_media": audio_engine.current_media_source,
+            "next_event": scheduler.next_event_name,
+            "next_event_time": scheduler.next_event_time,
+            "company_name": scheduler.company_name,
+            "radio_url": scheduler.radio_url,
+            "radio_stations": scheduler.radio_stations,
+            "music_source": scheduler.music_source,
+            "media_time": audio_engine.media_time,
+            # Wall-clock ms at which the position was 0, so clients can tick it themselves
+            "media_started_at": round(time.time() * 1000 - audio_engine.media_time) if audio_engine.music_playing() and audio_engine.media_time else None,
+            "media_duration": audio_engine.media_length,
+            "daily_timeline": self._timeline,
+            "scheduler_running": scheduler.running,
+            "volume_bell": scheduler.volume_bell,
+            "volume_music": scheduler.volume_music,
+            "volume_manual": scheduler.volume_manual,
+            "start_on_boot": scheduler.start_on_boot,
+            "media_stats": self._stats,
+            "streaming": {
+                "enabled": scheduler.streaming_enabled,
+                "port": scheduler.streaming_port
+            },
+            "app_autostart_enabled": scheduler.app_autostart_enabled,
+            "system_ip": self._ip,
+            "audio_device_id": getattr(scheduler, "audio_device_id", None)
+        }
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def status_events(position_interval: float = DEFAULT_POSITION_INTERVAL):
+    """
+    Server-sent events for one client: a full `snapshot`, then `delta` events with
+    only the changed fields. Media position ticks (outside the version) are sent
+    every position_interval seconds while music plays.
+    """
+    version, data = await asyncio.to_thread(status_board.snapshot)
+    yield _sse("snapshot", data)
+    sent = dict(data)
+    loop = asyncio.get_running_loop()
+    last_position = last_sent = loop.time()
+
+    while True:
+        await asyncio.sleep(STREAM_CHECK_INTERVAL)
+        now = loop.time()
+        new_version, data = await asyncio.to_thread(status_board.snapshot)
+        delta = {}
+        if new_version != version:
+            version = new_version
+            # The snapshot's media_time is as old as the snapshot; the live one goes with it below
+            delta = {k: v for k, v in data.items() if k not in ("version", "media_time") and sent.get(k) != v}
+        tick = data.get("is_playing") and now - last_position >= position_interval
+        if delta or tick:
+            if tick: last_position = now
+            if audio_engine.media_time != sent.get("media_time"):
+                delta["media_time"] = audio_engine.media_time
+        if not delta:
+            if now - last_sent >= STREAM_HEARTBEAT:
+                last_sent = now
+                yield ": ping\n\n"  # Keeps proxies from closing an idle stream
+            continue
+
+        delta["version"] = version
+        sent.update(delta)
+        last_sent = now
+        yield _sse("delta", delta)
+
+
+status_board = StatusBoard()
+audio_engine.add_listener(status_board.on_audio_change)
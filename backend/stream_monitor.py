@@ -0,0 +1,222 @@
+import math
+import shutil
+import subprocess
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+import vlc
+
+from audio_engine import audio_engine, ACTIVE_STATES
+from stream_server import stream_server, TAP_SINK
+
+# Fixed sampling period of byte counters and audio level
+SAMPLE_INTERVAL = 0.5
+# No new input bytes for this long while playing = stalled stream
+STALL_SECONDS = 6.0
+# Output quieter than this (at 100% volume) for this long = dead air
+SILENCE_DBFS = -55.0
+DEAD_AIR_SECONDS = 12.0
+# Seconds of samples used for the reported byte rate
+RATE_WINDOW = 5.0
+# After an incident the same stream is left alone this long (the reconnect needs time)
+INCIDENT_COOLDOWN = 20.0
+
+# Level capture: monitor of the streaming tap, which only carries SmartZill's audio
+# (the default sink's monitor would mix in every other app); small mono PCM
+CAPTURE_SOURCE = f"{TAP_SINK}.monitor"
+CAPTURE_RATE = 8000
+BLOCK_BYTES = int(CAPTURE_RATE * SAMPLE_INTERVAL) * 2  # s16le mono
+
+
+class _LevelMeter:
+    """parec capture of the tap monitor; keeps the RMS of the latest block (numpy, one pass per block)."""
+
+    def __init__(self):
+        self.process = None
+        self.dbfs = None
+        self.updated = 0.0
+        self.started = 0.0
+
+    @staticmethod
+    def available() -> bool:
+        return shutil.which("parec") is not None
+
+    def start(self):
+        if self.process and self.process.poll() is None: return
+        cmd = ["parec", f"--device={CAPTURE_SOURCE}", "--format=s16le", f"--rate={CAPTURE_RATE}",
+               "--channels=1", "--latency-msec=100", "--raw"]
+        try:
+            self.process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        except OSError as e:
+            print(f"Stream monitor: level capture unavailable: {e}")
+            self.process = None
+            return
+        self.dbfs = None
+        self.started = time.time()
+        threading.Thread(target=self._reader, args=(self.process,), daemon=True).start()
+
+    def stop(self):
+        if self.process:
+            try:
+                self.process.terminate()
+            except Exception:
+                pass
+            self.process = None
+        self.dbfs = None
+
+    def running(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def _reader(self, process):
+        import numpy as np  # Only needed while a stream is monitored
+        while process.poll() is None:
+            block = process.stdout.read(BLOCK_BYTES)
+            if not block: break
+            samples = np.frombuffer(block[:len(block) // 2 * 2], dtype=np.int16).astype(np.float32)
+            rms = float(np.sqrt(np.mean(samples * samples))) if samples.size else 0.0
+            self.dbfs = 20 * math.log10(max(rms, 1.0) / 32768.0)
+            self.updated = time.time()
+
+
+class StreamMonitor:
+    """
+    Watches live (URL) music at a fixed rate: input byte growth from libvlc's
+    counters and, while the streaming tap is up (players routed through it), the
+    level of what SmartZill actually plays. A stream that stops delivering bytes or goes silent is
+    reported to listeners (the scheduler reconnects or fails over).
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.listeners = []
+        self.meter = _LevelMeter()
+        self.samples = deque()        # (time, read_bytes, demux_bytes) for the current stream
+        self.source = None
+        self.last_growth = 0.0
+        self.last_sound = 0.0
+        self.cooldown_until = 0.0
+        self.incidents = deque(maxlen=20)
+        self._thread = None
+
+    def add_listener(self, callback):
+        """callback(kind: 'stall' | 'dead_air', source) runs on the monitor thread."""
+        self.listeners.append(callback)
+
+    def start(self):
+        if self._thread is None:
+            if not _LevelMeter.available():
+                print("Stream monitor: parec not found, dead-air detection off (stalls still detected)")
+            else:
+                print("Stream monitor: dead-air detection runs while the streaming tap is active")
+            self._thread = threading.Thread(target=self._loop, daemon=True)
+            self._thread.start()
+
+    def stats(self) -> dict:
+        with self.lock:
+            rate = self._byte_rate()
+            return {
+                "source": self.source,
+                "byte_rate": rate,
+                "level_dbfs": round(self.meter.dbfs, 1) if self.meter.dbfs is not None else None,
+                "incidents": list(self.incidents)
+            }
+
+    def _loop(self):
+        while True:
+            try:
+                self._sample()
+            except Exception as e:
+                print(f"Stream monitor error: {e}")
+            time.sleep(SAMPLE_INTERVAL)
+
+    def _watching(self) -> Optional[str]:
+        """The URL being played if it should be judged right now (not during a bell or a start)."""
+        if not audio_engine.is_playing_music or audio_engine.current_media_type != 'url':
+            return None
+        if audio_engine.get_player_state('music') not in (vlc.State.Playing, vlc.State.Buffering):
+            return None
+        if audio_engine.get_player_state('alert') in ACTIVE_STATES:
+            return None
+        return audio_engine.current_media_source
+
+    def _sample(self):
+        now = time.time()
+        source = self._watching()
+        with self.lock:
+            if source != self.source:
+                # New stream (or none): start judging from scratch
+                self.source = source
+                self.samples.clear()
+                self.last_growth = self.last_sound = now
+            if source is None:
+                self.meter.stop()
+                return
+
+        stats = audio_engine.get_playback_stats()["stats"]
+        if stats is not None:
+            read, demux = stats.get("read_bytes") or 0, stats.get("demux_read_bytes") or 0
+            with self.lock:
+                if not self.samples or read != self.samples[-1][1]:
+                    # Counters reset on a new media, so any change counts as progress
+                    self.last_growth = now
+                self.samples.append((now, read, demux))
+                while self.samples and now - self.samples[0][0] > RATE_WINDOW:
+                    self.samples.popleft()
+        else:
+            with self.lock:
+                self.last_growth = now  # No counters in this libvlc build: can't judge stalls
+
+        if not (_LevelMeter.available() and stream_server.output_device()):
+            # No private sink to listen to: other apps' sound would mask (or fake) dead air
+            self.meter.stop()
+            with self.lock:
+                self.last_sound = now
+        else:
+            self.meter.start()
+            volume = audio_engine.get_channel_volume(audio_engine.current_volume_type)
+            level = self.meter.dbfs
+            warming_up = now - self.meter.started < SAMPLE_INTERVAL * 2
+            if not warming_up and now - self.meter.updated > SAMPLE_INTERVAL * 2:
+                # Capture hung: its last level is stale, so it proves neither sound nor silence
+                print("Stream monitor: level capture stalled, restarting it")
+                self.meter.stop()
+                self.meter.start()
+                level = None
+            if volume <= 0 or level is None or warming_up:
+                heard = True  # Muted on purpose or no reading yet
+            else:
+                # VLC scales amplitude by volume %, so the silence floor moves with it
+                heard = level > SILENCE_DBFS + 20 * math.log10(volume / 100)
+            if heard:
+                with self.lock:
+                    self.last_sound = now
+
+        if now < self.cooldown_until: return
+        if now - self.last_growth > STALL_SECONDS:
+            self._incident("stall", source, f"no input for {now - self.last_growth:.0f}s")
+        elif now - self.last_sound > DEAD_AIR_SECONDS:
+            self._incident("dead_air", source, f"silent for {now - self.last_sound:.0f}s")
+
+    def _byte_rate(self):
+        # Caller holds self.lock
+        if len(self.samples) < 2: return None
+        (t0, r0, _), (t1, r1, _) = self.samples[0], self.samples[-1]
+        return round((r1 - r0) / (t1 - t0)) if t1 > t0 else None
+
+    def _incident(self, kind, source, detail):
+        now = time.time()
+        print(f"⚠️ Stream {kind.replace('_', ' ')}: {source} ({detail})")
+        with self.lock:
+            self.incidents.append({"kind": kind, "source": source, "detail": detail, "time": now})
+            self.cooldown_until = now + INCIDENT_COOLDOWN
+            self.last_growth = self.last_sound = now
+        for callback in list(self.listeners):
+            try:
+                callback(kind, source)
+            except Exception as e:
+                print(f"Stream monitor listener error: {e}")
+
+
+stream_monitor = StreamMonitor()
@@ -0,0 +1,223 @@
+import os
+import queue
+import shutil
+import subprocess
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+# PulseAudio tap: VLC's players are routed to a combine sink that feeds both the
+# speakers and a private null sink, whose monitor is encoded. Only SmartZill's own
+# audio (music, bells, announcements) reaches the stream, never other system sounds.
+TAP_SINK = "smartzill_tap"
+OUTPUT_SINK = "smartzill_out"
+BITRATE = "128k"
+CHUNK_SIZE = 4096
+# ~1s of 128 kbps MP3 handed to new listeners so players start without waiting
+BURST_CHUNKS = 4
+# Per-listener backlog before a slow client gets dropped (~30s)
+CLIENT_QUEUE_CHUNKS = 120
+# Encoder restarts back off exponentially; a run this long counts as healthy again
+RESTART_DELAY = 2.0
+MAX_RESTART_DELAY = 300.0
+HEALTHY_RUN = 60.0
+
+
+def _pactl(*args) -> Optional[str]:
+    try:
+        result = subprocess.run(["pactl", *args], capture_output=True, text=True, timeout=5)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    return result.stdout.strip() if result.returncode == 0 else None
+
+
+class StreamServer:
+    """
+    One long-lived ffmpeg encode fanned out to any number of HTTP listeners on
+    /stream. Track changes and bells never touch the encoder or the socket.
+    Needs ffmpeg and PulseAudio; elsewhere (Windows, ALSA-only hosts) start()
+    returns False and the audio engine streams through VLC's own sout chain.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.port = None
+        self.httpd = None
+        self.process = None
+        self.running = False
+        self.clients = set()
+        self.burst = []
+        self.default_sink = None   # Sink VLC played to before the tap (restored on stop)
+        self._modules = []         # PulseAudio module ids loaded for the tap
+        self._supported = None     # ffmpeg + PulseAudio present; checked once
+        self._generation = 0
+
+    def supported(self) -> bool:
+        if self._supported is None:
+            missing = [tool for tool in ("ffmpeg", "pactl") if not shutil.which(tool)]
+            if os.name == 'nt' or missing or _pactl("info") is None:
+                reason = f"{', '.join(missing)} not found" if missing else "no PulseAudio server"
+                print(f"Streaming: Persistent encoder unavailable ({reason}), using VLC's stream output")
+                self._supported = False
+            else:
+                self._supported = True
+        return self._supported
+
+    def output_device(self) -> Optional[str]:
+        """Pulse sink the players must output to while the tap is active, else None."""
+        return OUTPUT_SINK if self.running and self._modules else None
+
+    def start(self, port: int) -> bool:
+        """Serves /stream on port. False if this host can't (the caller falls back to VLC sout)."""
+        if self.running and self.port == port: return True
+        self.stop()
+        if not self.supported() or not self._load_tap():
+            return False
+        try:
+            self.httpd = ThreadingHTTPServer(("0.0.0.0", port), self._make_handler())
+            self.httpd.daemon_threads = True
+        except OSError as e:
+            print(f"Streaming: Could not bind port {port}: {e}")
+            self.httpd = None
+            self._unload_tap()
+            return False
+        self.port = port
+        self.running = True
+        self._generation += 1
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        threading.Thread(target=self._encoder_loop, args=(self._generation,), daemon=True).start()
+        print(f"Streaming: Serving http://0.0.0.0:{port}/stream")
+        return True
+
+    def stop(self):
+        if not self.running: return
+        self.running = False
+        if self.process:
+            try:
+                self.process.terminate()
+            except Exception:
+                pass
+        if self.httpd:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.httpd = None
+        self._unload_tap()
+        with self.lock:
+            for q in self.clients:
+                try:
+                    q.put_nowait(None)
+                except queue.Full:
+                    q.get_nowait()
+                    q.put_nowait(None)
+            self.clients.clear()
+            self.burst = []
+        print("Streaming: Stopped")
+
+    def listener_count(self) -> int:
+        with self.lock:
+            return len(self.clients)
+
+    def _load_tap(self) -> bool:
+        info = _pactl("info") or ""
+        self.default_sink = next((line.split(":", 1)[1].strip() for line in info.splitlines()
+                                  if line.startswith("Default Sink:")), None)
+        if not self.default_sink:
+            print("Streaming: No default PulseAudio sink, using VLC's stream output")
+            return False
+        for args in (["module-null-sink", f"sink_name={TAP_SINK}", f"sink_properties=device.description={TAP_SINK}"],
+                     ["module-combine-sink", f"sink_name={OUTPUT_SINK}", f"slaves={self.default_sink},{TAP_SINK}"]):
+            module_id = _pactl("load-module", *args)
+            if module_id is None:
+                print(f"Streaming: Could not load {args[0]}, using VLC's stream output")
+                self._unload_tap()
+                return False
+            self._modules.append(module_id)
+        return True
+
+    def _unload_tap(self):
+        # Pulse moves anything still playing on these sinks back to the default sink
+        for module_id in reversed(self._modules):
+            _pactl("unload-module", module_id)
+        self._modules = []
+
+    def _encoder_loop(self, generation):
+        cmd = ["ffmpeg", "-hide_banner", "-loglevel", "error",
+               "-f", "pulse", "-i", f"{TAP_SINK}.monitor",
+               "-ac", "2", "-ar", "44100", "-c:a", "libmp3lame", "-b:a", BITRATE,
+               "-f", "mp3", "-"]
+        delay = RESTART_DELAY
+        # A restart on another port starts a new generation; the old loop just exits
+        while self.running and generation == self._generation:
+            started = time.time()
+            try:
+                self.process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stdin=subprocess.DEVNULL)
+                while self.running:
+                    chunk = self.process.stdout.read(CHUNK_SIZE)
+                    if not chunk: break
+                    self._broadcast(chunk)
+                self.process.wait(timeout=5)
+            except Exception as e:
+                print(f"Streaming: Encoder error: {e}")
+            if self.running and generation == self._generation:
+                delay = RESTART_DELAY if time.time() - started > HEALTHY_RUN else delay
+                print(f"Streaming: Encoder exited, restarting in {delay:.0f}s")
+                time.sleep(delay)
+                delay = min(MAX_RESTART_DELAY, delay * 2)
+
+    def _broadcast(self, chunk: bytes):
+        with self.lock:
+            self.burst.append(chunk)
+            if len(self.burst) > BURST_CHUNKS: self.burst.pop(0)
+            for q in list(self.clients):
+                try:
+                    q.put_nowait(chunk)
+                except queue.Full:
+                    print("Streaming: Dropping slow listener")
+                    self.clients.discard(q)
+                    # Make room for the end marker so its handler exits
+                    q.get_nowait()
+                    q.put_nowait(None)
+
+    def _add_client(self):
+        q = queue.Queue(maxsize=CLIENT_QUEUE_CHUNKS)
+        with self.lock:
+            for chunk in self.burst: q.put_nowait(chunk)
+            self.clients.add(q)
+        return q
+
+    def _remove_client(self, q):
+        with self.lock:
+            self.clients.discard(q)
+
+    def _make_handler(self):
+        server = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/stream":
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "audio/mpeg")
+                self.send_header("Cache-Control", "no-cache")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                q = server._add_client()
+                try:
+                    while True:
+                        chunk = q.get()
+                        if chunk is None: break
+                        self.wfile.write(chunk)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+                finally:
+                    server._remove_client(q)
+
+            def log_message(self, format, *args):
+                pass  # One line per listener request is too noisy
+
+        return _Handler
+
+
+stream_server = StreamServer()
@@ -0,0 +1,107 @@
+import json
+import os
+import threading
+import time
+
+from persistence import persistence
+
+# VLC network-caching (ms): stations never played get the old fixed value; known ones
+# get floor + jitter allowance + stall allowance. Relayed radio is read from memory.
+DEFAULT_CACHING_MS = 3000
+MIN_CACHING_MS = 1000
+MIN_RELAYED_CACHING_MS = 300
+MAX_CACHING_MS = 10000
+# A stall grows the stall allowance to at least STALL_MIN_MS, then by this factor (plus a step per extra stall)
+STALL_MIN_MS = 1000
+STALL_GROWTH = 1.5
+STALL_STEP_MS = 500
+# After a clean session at least this long the stall allowance shrinks back a little
+CLEAN_SESSION_SECONDS = 600
+CLEAN_SHRINK = 0.85
+# Smoothing for start time and its jitter (exponentially weighted)
+EWMA_ALPHA = 0.3
+# Jitter allowance: this many (smoothed) start-time deviations (erratic HLS servers)
+JITTER_FACTOR = 4
+
+
+class StreamTuning:
+    """
+    Per-station playback history: how long each start took until audio actually
+    flowed, how erratic that was, and how often playback stalled. The network
+    caching VLC gets for a station follows from it and survives restarts.
+    """
+
+    def __init__(self, cache_file="station_tuning.json"):
+        self.cache_file = cache_file
+        self.lock = threading.Lock()
+        self.stations = {}  # url -> { stall_ms, start_ms, start_jitter_ms, starts, stalls, sessions, updated }
+        self._load()
+
+    def caching_for(self, url: str, relayed=False) -> int:
+        with self.lock:
+            entry = self.stations.get(url)
+            if not entry or not entry["starts"]:
+                return DEFAULT_CACHING_MS
+            allowance = JITTER_FACTOR * entry["start_jitter_ms"] + entry["stall_ms"]
+        floor = MIN_RELAYED_CACHING_MS if relayed else MIN_CACHING_MS
+        return int(min(MAX_CACHING_MS, floor + allowance))
+
+    def record_start(self, url: str, flow_ms: int):
+        """Time from play() until demuxed audio was flowing."""
+        with self.lock:
+            entry = self._entry(url)
+            if entry["starts"]:
+                deviation = abs(flow_ms - entry["start_ms"])
+                entry["start_jitter_ms"] = round((1 - EWMA_ALPHA) * entry["start_jitter_ms"] + EWMA_ALPHA * deviation)
+                entry["start_ms"] = round((1 - EWMA_ALPHA) * entry["start_ms"] + EWMA_ALPHA * flow_ms)
+            else:
+                entry["start_ms"] = flow_ms
+            entry["starts"] += 1
+        self._save()
+
+    def record_session(self, url: str, seconds: float, stalls: int):
+        """End of a playback session: stalls grow the buffer, long clean runs shrink it."""
+        if seconds <= 0: return
+        with self.lock:
+            entry = self._entry(url)
+            entry["sessions"] += 1
+            entry["stalls"] += stalls
+            if stalls:
+                grown = max(STALL_MIN_MS, entry["stall_ms"] * STALL_GROWTH) + STALL_STEP_MS * (stalls - 1)
+                entry["stall_ms"] = int(min(MAX_CACHING_MS, grown))
+                print(f"Tuning: {stalls} stall(s) on {url}, stall allowance now {entry['stall_ms']} ms")
+            elif seconds >= CLEAN_SESSION_SECONDS and entry["stall_ms"]:
+                entry["stall_ms"] = int(entry["stall_ms"] * CLEAN_SHRINK) if entry["stall_ms"] > 100 else 0
+            else:
+                return
+        self._save()
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {url: dict(e) for url, e in self.stations.items()}
+
+    def _entry(self, url):
+        # Caller holds self.lock
+        entry = self.stations.get(url)
+        if entry is None:
+            entry = self.stations[url] = {"stall_ms": 0, "start_ms": 0, "start_jitter_ms": 0,
+                                          "starts": 0, "stalls": 0, "sessions": 0}
+        entry["updated"] = time.time()
+        return entry
+
+    def _load(self):
+        if not os.path.exists(self.cache_file):
+            return
+        try:
+            with open(self.cache_file, "r") as f:
+                self.stations = json.load(f)
+        except Exception as e:
+            print(f"Station tuning unreadable, starting fresh: {e}")
+
+    def _save(self):
+        with self.lock:
+            data = {url: dict(e) for url, e in self.stations.items()}
+        persistence.save(self.cache_file, data, indent=None)
+
+
+stream_tuning = StreamTuning()
@@ -0,0 +1,68 @@
+import json
+import os
+import time
+
+from persistence import Persistence, atomic_write
+
+
+def _read(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_atomic_write_replaces_file_and_leaves_no_temp(tmp_path):
+    path = tmp_path / "state.json"
+    path.write_text("old")
+    atomic_write(str(path), '{"a": 1}')
+    assert _read(path) == {"a": 1}
+    assert os.listdir(tmp_path) == ["state.json"]
+
+
+def test_burst_is_coalesced_into_one_write(tmp_path):
+    store = Persistence(delay=0.05, max_delay=1.0)
+    path = str(tmp_path / "config.json")
+    data = {"volume": 0}
+    for v in range(10):
+        data["volume"] = v
+        store.save(path, data)
+    data["volume"] = 99  # save() snapshots: later mutations don't leak into the pending write
+    assert store.is_pending(path)
+    deadline = time.time() + 2
+    while store.is_pending(path) and time.time() < deadline:
+        time.sleep(0.01)
+    assert _read(path) == {"volume": 9}
+    assert store.stats()["writes"] == 1
+    assert store.stats()["coalesced"] == 9
+
+
+def test_max_delay_bounds_a_steady_stream(tmp_path):
+    store = Persistence(delay=0.2, max_delay=0.3)
+    path = str(tmp_path / "config.json")
+    started = time.time()
+    while not os.path.exists(path) and time.time() - started < 2:
+        store.save(path, {"t": time.time()})
+        time.sleep(0.05)
+    assert os.path.exists(path)
+    assert time.time() - started < 1.0
+
+
+def test_flush_and_save_now(tmp_path):
+    store = Persistence(delay=60, max_delay=60)
+    a, b = str(tmp_path / "a.json"), str(tmp_path / "b.json")
+    store.save(a, {"x": 1})
+    store.flush()
+    assert _read(a) == {"x": 1}
+    assert not store.is_pending(a)
+
+    store.save(b, {"y": 1})
+    store.save_now(b, {"y": 2})  # Replaces the pending write
+    assert _read(b) == {"y": 2}
+    assert not store.is_pending(b)
+
+
+def test_older_snapshot_never_overwrites_newer(tmp_path):
+    store = Persistence(delay=60, max_delay=60)
+    path = str(tmp_path / "c.json")
+    store.save_now(path, {"v": "new"})
+    store._write(path, json.dumps({"v": "old"}), seq=0)
+    assert _read(path) == {"v": "new"}
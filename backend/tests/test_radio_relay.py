@@ -0,0 +1,99 @@
+import time
+
+import pytest
+
+import radio_relay
+from radio_relay import RadioRelay, _Station, MAX_RESUME_BEHIND
+
+
+def _station(size=16):
+    station = _Station("http://radio.example/stream")
+    station.buffer = bytearray(size)
+    station.state = "streaming"
+    return station
+
+
+def test_write_and_read_in_order():
+    station = _station()
+    station.write(b"abcdef")
+    assert station.read(0) == (6, b"abcdef")
+    assert station.read(2, limit=3) == (5, b"cde")
+
+
+def test_ring_wraps_and_keeps_the_newest_bytes():
+    station = _station(size=8)
+    station.write(b"0123456789")  # Two bytes more than fit
+    assert station.head == 10
+    assert station.oldest() == 2
+    assert station.read(2) == (10, b"23456789")
+
+
+def test_reader_that_fell_out_of_the_ring_skips_ahead():
+    station = _station(size=8)
+    station.write(b"0123456789ABCDEF")
+    assert station.read(0) == (16, b"89ABCDEF")
+
+
+def test_read_across_the_wrap_point():
+    station = _station(size=8)
+    station.write(b"012345")
+    station.write(b"6789")  # Wraps: buffer holds 89234567
+    assert station.read(4) == (10, b"456789")
+
+
+def test_read_times_out_without_data():
+    station = _station()
+    station.write(b"ab")
+    assert station.read(2, timeout=0.05) == (2, b"")
+
+
+def test_write_larger_than_the_ring():
+    station = _station(size=4)
+    station.write(b"xy")
+    station.write(b"0123456789")
+    assert station.read(station.oldest()) == (12, b"6789")
+
+
+@pytest.fixture
+def relay():
+    relay = RadioRelay()
+    station = _station(size=1000)
+    station.byte_rate = 10
+    station.write(b"x" * 600)
+    relay.stations[station.url] = station
+    return relay, station
+
+
+def test_resume_offset_rewinds_what_the_player_had_buffered(relay):
+    relay, station = relay
+    assert relay.resume_offset(station.url, time.time(), client_pos=500, played_ahead=3.0) == 470
+
+
+def test_resume_offset_goes_live_when_it_cannot_resume(relay):
+    relay, station = relay
+    now = time.time()
+    assert relay.resume_offset(station.url, now - MAX_RESUME_BEHIND - 1, 500, 3.0) is None
+    assert relay.resume_offset(station.url, now, None, 3.0) is None
+    assert relay.resume_offset("http://other.example/", now, 500, 3.0) is None
+    station.write(b"y" * 1000)  # The paused spot has been overwritten
+    assert relay.resume_offset(station.url, now, 500, 3.0) is None
+
+
+@pytest.mark.skipif(not (radio_relay.termios and hasattr(radio_relay.termios, "TIOCOUTQ")),
+                    reason="needs the send-queue ioctl (the fallback only gives an upper bound)")
+def test_client_position_discounts_bytes_still_in_the_socket():
+    import socket
+    relay = RadioRelay()
+    relay.port = 1
+    sender, player = socket.socketpair()
+    try:
+        sender.sendall(b"z" * 1000)
+        relay._positions["/relay/abc"] = (5000, sender)
+        assert relay.client_position("http://127.0.0.1:1/relay/abc?at=10") <= 4000
+        player.recv(4096)
+        time.sleep(0.05)
+        assert relay.client_position("http://127.0.0.1:1/relay/abc") == 5000
+    finally:
+        sender.close()
+        player.close()
+    assert relay.client_position(None) is None
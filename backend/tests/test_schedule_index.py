@@ -0,0 +1,76 @@
+from schedule_index import ScheduleIndex, to_minutes
+
+
+def _day(activities, enabled=True, weekday=0):
+    return {"dayOfWeek": weekday, "enabled": enabled, "activities": activities}
+
+
+def _act(name, start, end, play_music=False, announcements=()):
+    return {"name": name, "startTime": start, "endTime": end, "playMusic": play_music,
+            "interimAnnouncements": list(announcements)}
+
+
+SCHEDULE = [_day([
+    _act("Ders 2", "10:00", "10:40"),
+    _act("Ders 1", "09:00", "09:40", play_music=True,
+         announcements=[{"time": "09:20", "enabled": True}, {"time": "09:30", "enabled": False}]),
+    _act("Öğle", "12:00", "13:00"),
+])]
+
+
+def test_to_minutes():
+    assert to_minutes("00:00") == 0
+    assert to_minutes("09:05") == 545
+    assert to_minutes("23:59") == 1439
+    for bad in ("24:00", "12:60", "9", "ab:cd", None, ""):
+        assert to_minutes(bad) is None
+
+
+def test_state_at():
+    day = ScheduleIndex(SCHEDULE).day(0)
+    assert day.state_at(to_minutes("08:59")) == "IDLE"
+    assert day.state_at(to_minutes("09:00")) == "WORK"
+    assert day.state_at(to_minutes("09:39")) == "WORK"
+    assert day.state_at(to_minutes("09:40")) == "BREAK"
+    assert day.state_at(to_minutes("11:00")) == "BREAK"
+    assert day.state_at(to_minutes("13:00")) == "IDLE"
+
+
+def test_overlapping_activities_stay_work():
+    day = ScheduleIndex([_day([_act("Uzun", "09:00", "12:00"), _act("Kısa", "10:00", "10:30")])]).day(0)
+    assert day.state_at(to_minutes("11:00")) == "WORK"
+
+
+def test_music_after_follows_last_ended_activity():
+    day = ScheduleIndex(SCHEDULE).day(0)
+    assert day.music_after(to_minutes("08:00")) is False
+    assert day.music_after(to_minutes("09:45")) is True
+    assert day.music_after(to_minutes("10:45")) is False
+
+
+def test_triggers_and_next_trigger():
+    day = ScheduleIndex(SCHEDULE).day(0)
+    # Disabled announcements never trigger
+    assert [t[1] for t in day.triggers] == ["09:00", "09:20", "09:40", "10:00", "10:40", "12:00", "13:00"]
+    assert day.next_trigger(to_minutes("09:00")) == ("09:20", "Ara Duyuru")
+    assert day.next_trigger(to_minutes("12:30")) == ("13:00", "Bitiş: Öğle")
+    assert day.next_trigger(to_minutes("13:00")) is None
+
+
+def test_timeline_marks_passed_events():
+    day = ScheduleIndex(SCHEDULE).day(0)
+    passed = [e["passed"] for e in day.timeline(to_minutes("10:00"))]
+    assert passed == [True, True, True, False, False, False, False]
+    disabled = ScheduleIndex([_day(SCHEDULE[0]["activities"], enabled=False)]).day(0)
+    assert all(e["passed"] for e in disabled.timeline(0))
+
+
+def test_invalid_times_and_duplicate_days():
+    index = ScheduleIndex([
+        _day([_act("Bozuk", "25:00", "26:00"), _act("İyi", "08:00", "09:00")]),
+        _day([_act("İkinci", "10:00", "11:00")]),
+    ])
+    day = index.day(0)
+    assert [a["name"] for a in day.activities] == ["İyi"]  # First entry per weekday wins
+    assert index.day(3) is None
+    assert ScheduleIndex(None).days == {}
@@ -0,0 +1,66 @@
+from datetime import date, timedelta
+
+import pytest
+
+from special_days_service import SpecialDaysService, month_day, person_key
+
+
+@pytest.fixture
+def service(tmp_path):
+    svc = SpecialDaysService(data_file=str(tmp_path / "special_days.json"))
+    svc.people = [
+        {"name": "Ayşe", "date": "1990-03-15"},
+        {"name": "Mehmet", "date": "03-15"},          # Legacy MM-DD
+        {"name": "Leyla", "date": "1992-02-29"},
+        {"name": "Bozuk", "date": "15 Mart"},
+    ]
+    return svc
+
+
+def test_month_day():
+    assert month_day("1990-03-15") == "03-15"
+    assert month_day("03-15") == "03-15"
+    assert month_day("") is None
+    assert month_day("15 Mart") is None
+
+
+def test_person_key():
+    assert person_key({"id": "42", "name": "Ayşe"}) == "id:42"
+    # Re-imports match despite spacing/case differences in the name
+    assert person_key({"name": "  Ayşe   YILMAZ ", "date": "1990-03-15"}) == "ayşe yilmaz|1990-03-15"
+
+
+def test_people_on(service):
+    assert [p["name"] for p in service.people_on(date(2025, 3, 15))] == ["Ayşe", "Mehmet"]
+    assert service.people_on(date(2025, 3, 16)) == []
+
+
+def test_feb29_leap_year(service):
+    assert [p["name"] for p in service.people_on(date(2024, 2, 29))] == ["Leyla"]
+    assert service.people_on(date(2024, 2, 28)) == []
+    assert service.people_on(date(2024, 3, 1)) == []
+
+
+def test_feb29_policy_feb28(service):
+    assert [p["name"] for p in service.people_on(date(2025, 2, 28))] == ["Leyla"]
+    assert service.people_on(date(2025, 3, 1)) == []
+
+
+def test_feb29_policy_mar1(service):
+    service.config["feb29_policy"] = "mar1"
+    assert service.people_on(date(2025, 2, 28)) == []
+    assert [p["name"] for p in service.people_on(date(2025, 3, 1))] == ["Leyla"]
+
+
+def test_add_people_updates_index(service):
+    service.add_people([{"name": "Can", "date": "2000-07-01"}])
+    assert [p["name"] for p in service.people_on(date(2025, 7, 1))] == ["Can"]
+
+
+def test_upcoming(service):
+    today = date.today()
+    service.people = [{"name": "Bugün", "date": today.strftime("%m-%d")},
+                      {"name": "Yarın", "date": (today + timedelta(days=1)).strftime("%m-%d")}]
+    result = service.upcoming(2)
+    assert [(r["name"], r["in_days"]) for r in result] == [("Bugün", 0), ("Yarın", 1)]
+    assert service.upcoming(0) == []
@@ -0,0 +1,38 @@
+from datetime import datetime
+
+import pandas as pd
+
+from special_days_service import parse_dates
+
+
+def _parsed(values):
+    return [None if pd.isna(v) else v.strftime("%Y-%m-%d") for v in parse_dates(pd.Series(values, dtype=object))]
+
+
+def test_text_formats():
+    assert _parsed(["1990-01-30", "30.01.1990", "1990/01/30", "30-01-1990", "1990.01.30"]) == ["1990-01-30"] * 5
+
+
+def test_excel_datetimes_and_time_suffix():
+    assert _parsed([datetime(1985, 7, 4), "1990-01-30 00:00:00"]) == ["1985-07-04", "1990-01-30"]
+
+
+def test_excel_serials_within_bounds():
+    assert _parsed([32903, "32903", 32903.0]) == ["1990-01-30"] * 3
+
+
+def test_bare_numbers_outside_serial_range_are_rejected():
+    # A year, a tiny serial and an absurd one are not birth dates
+    assert _parsed([1990, "1990", 5, 99999]) == [None] * 4
+
+
+def test_slashed_dates_are_day_first_by_default():
+    assert _parsed(["03/04/1990", "12/11/1985"]) == ["1990-04-03", "1985-11-12"]
+
+
+def test_slashed_dates_month_first_when_the_column_proves_it():
+    assert _parsed(["03/04/1990", "12/25/1985"]) == ["1990-03-04", "1985-12-25"]
+
+
+def test_garbage_is_nat():
+    assert _parsed(["", "yarın", None, "31.02.1990"]) == [None] * 4
@@ -0,0 +1,62 @@
+import pytest
+
+from stream_tuning import (StreamTuning, CLEAN_SESSION_SECONDS, DEFAULT_CACHING_MS, MAX_CACHING_MS,
+                           MIN_CACHING_MS, MIN_RELAYED_CACHING_MS, STALL_MIN_MS, STALL_STEP_MS)
+
+URL = "http://radio.example/stream"
+
+
+@pytest.fixture
+def tuning(tmp_path):
+    return StreamTuning(cache_file=str(tmp_path / "station_tuning.json"))
+
+
+def test_unknown_station_gets_default(tuning):
+    assert tuning.caching_for(URL) == DEFAULT_CACHING_MS
+
+
+def test_steady_starts_shrink_to_the_floor(tuning):
+    for _ in range(5):
+        tuning.record_start(URL, 800)
+    assert tuning.caching_for(URL) == MIN_CACHING_MS
+    assert tuning.caching_for(URL, relayed=True) == MIN_RELAYED_CACHING_MS
+
+
+def test_erratic_starts_add_jitter_allowance(tuning):
+    for flow_ms in (500, 3000, 600, 2800):
+        tuning.record_start(URL, flow_ms)
+    assert tuning.caching_for(URL) > MIN_CACHING_MS
+
+
+def test_stalls_grow_and_clean_sessions_shrink(tuning):
+    tuning.record_start(URL, 800)
+    tuning.record_session(URL, 60, stalls=1)
+    assert tuning.stats()[URL]["stall_ms"] == STALL_MIN_MS
+    tuning.record_session(URL, 60, stalls=2)
+    grown = tuning.stats()[URL]["stall_ms"]
+    assert grown == int(STALL_MIN_MS * 1.5) + STALL_STEP_MS
+    assert tuning.caching_for(URL) == MIN_CACHING_MS + grown
+
+    tuning.record_session(URL, CLEAN_SESSION_SECONDS, stalls=0)
+    assert tuning.stats()[URL]["stall_ms"] < grown
+    # Short clean sessions prove nothing
+    before = tuning.stats()[URL]["stall_ms"]
+    tuning.record_session(URL, 30, stalls=0)
+    assert tuning.stats()[URL]["stall_ms"] == before
+
+
+def test_caching_is_capped(tuning):
+    tuning.record_start(URL, 800)
+    for _ in range(20):
+        tuning.record_session(URL, 60, stalls=5)
+    assert tuning.caching_for(URL) == MAX_CACHING_MS
+
+
+def test_history_survives_restart(tmp_path):
+    from persistence import persistence
+    path = str(tmp_path / "station_tuning.json")
+    first = StreamTuning(cache_file=path)
+    first.record_start(URL, 800)
+    first.record_session(URL, 60, stalls=1)
+    persistence.flush()
+    assert StreamTuning(cache_file=path).caching_for(URL) == first.caching_for(URL)
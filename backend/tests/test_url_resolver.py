@@ -0,0 +1,74 @@
+import time
+
+import pytest
+
+import url_resolver
+from url_resolver import UrlResolver, is_indirect, url_expiry
+
+VIDEO = "https://www.youtube.com/watch?v=abc"
+
+
+def test_is_indirect():
+    assert is_indirect(VIDEO)
+    assert is_indirect("https://youtu.be/abc")
+    assert not is_indirect("http://radio.example/stream.mp3")
+    assert not is_indirect("")
+
+
+def test_url_expiry():
+    assert url_expiry("https://r1.googlevideo.com/videoplayback?expire=1700000000&id=x") == 1700000000
+    assert url_expiry("https://manifest.googlevideo.com/api/manifest/hls_playlist/expire/1700000123/ei/x/index.m3u8") == 1700000123
+    assert url_expiry("https://r1.googlevideo.com/videoplayback?id=x") is None
+    assert url_expiry("https://r1.googlevideo.com/videoplayback?expire=soon") is None
+
+
+@pytest.fixture
+def extractions(monkeypatch):
+    """Fake extractor: each call returns a URL valid for the lifetime in result['ttl']."""
+    result = {"calls": 0, "ttl": 6 * 3600, "fail": False}
+
+    def extract(url):
+        result["calls"] += 1
+        if result["fail"]:
+            raise RuntimeError("extractor broke")
+        return f"https://cdn.example/{result['calls']}?expire={int(time.time() + result['ttl'])}"
+
+    monkeypatch.setattr(url_resolver, "_extract", extract)
+    return result
+
+
+def test_direct_urls_pass_through(extractions):
+    assert UrlResolver().resolve("http://radio.example/stream") == "http://radio.example/stream"
+    assert extractions["calls"] == 0
+
+
+def test_fresh_entry_is_reused(extractions):
+    resolver = UrlResolver()
+    first = resolver.resolve(VIDEO)
+    assert resolver.resolve(VIDEO) == first
+    assert extractions["calls"] == 1
+
+
+def test_failure_keeps_last_good_url(extractions):
+    resolver = UrlResolver()
+    good = resolver.resolve(VIDEO)
+    with resolver.lock:
+        resolver.entries[VIDEO]["expires"] = time.time() - 1  # Expired
+    extractions["fail"] = True
+    assert resolver.resolve(VIDEO) == good
+    # Within RETRY_DELAY a failed URL isn't extracted again
+    assert resolver.resolve(VIDEO) == good
+    assert extractions["calls"] == 2
+
+
+def test_nothing_ever_worked_returns_source(extractions):
+    extractions["fail"] = True
+    assert UrlResolver().resolve(VIDEO) == VIDEO
+
+
+def test_short_lived_url_is_not_re_extracted_back_to_back(extractions):
+    extractions["ttl"] = 120  # Less than REFRESH_MARGIN: due for refresh right away
+    resolver = UrlResolver()
+    resolver.resolve(VIDEO)
+    time.sleep(0.5)
+    assert extractions["calls"] == 1
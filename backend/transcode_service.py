@@ -0,0 +1,298 @@
+import json
+import multiprocessing
+import os
+import re
+import shutil
+import subprocess
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from media_library import media_library
+from persistence import persistence
+
+# Canonical library format: what VLC opens fastest and every device plays
+TARGET_SAMPLE_RATE = 44100
+TARGET_CHANNELS = 2
+TARGET_BITRATE = "192k"
+# Anything quieter than this at the very start/end is cut
+SILENCE_THRESHOLD = "-50dB"
+SILENCE_MIN_DURATION = 0.05
+# ffmpeg is multi-threaded already; two files at a time keeps bells responsive on small boxes
+MAX_WORKERS = max(1, min(2, (os.cpu_count() or 2) // 2))
+# Finished jobs shown in /ingest/jobs
+JOB_HISTORY = 200
+# A result for a file that is playing (or queued to play) is swapped in once it's free
+IN_USE_RETRY = 5.0
+IN_USE_GIVE_UP = 30 * 60
+
+_SILENCE_LINE = re.compile(r"silence_(start|end): (-?[\d.]+)")
+
+
+def _probe(path: str) -> dict:
+    cmd = ["ffprobe", "-v", "error", "-select_streams", "a:0",
+           "-show_entries", "stream=codec_name,sample_rate,channels,bit_rate:format=duration",
+           "-of", "json", path]
+    out = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
+    data = json.loads(out.stdout or "{}")
+    stream = (data.get("streams") or [{}])[0]
+    return {
+        "codec": stream.get("codec_name"),
+        "sample_rate": int(stream.get("sample_rate") or 0),
+        "channels": int(stream.get("channels") or 0),
+        "bitrate": int(stream.get("bit_rate") or 0) // 1000,
+        "duration": round(float(data.get("format", {}).get("duration") or 0), 2)
+    }
+
+
+def _audible_span(path: str, duration: float):
+    """(start, end) seconds between leading and trailing silence. One streaming decode, constant memory."""
+    cmd = ["ffmpeg", "-hide_banner", "-nostats", "-i", path, "-vn",
+           "-af", f"silencedetect=noise={SILENCE_THRESHOLD}:d={SILENCE_MIN_DURATION}", "-f", "null", "-"]
+    result = subprocess.run(cmd, capture_output=True, text=True, timeout=1800)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip()[-300:] or f"ffmpeg exited with {result.returncode}")
+    start, end = 0.0, duration
+    periods, open_start = [], None
+    for kind, value in _SILENCE_LINE.findall(result.stderr):
+        if kind == "start":
+            open_start = float(value)
+        elif open_start is not None:
+            periods.append((open_start, float(value)))
+            open_start = None
+    if open_start is not None:
+        periods.append((open_start, duration))  # Silent up to the end of the file
+    if periods and periods[0][0] <= SILENCE_MIN_DURATION:
+        start = periods[0][1]
+    if periods and periods[-1][1] >= duration - SILENCE_MIN_DURATION and periods[-1][0] > start:
+        end = periods[-1][0]
+    return start, end
+
+
+def _is_canonical(info: dict) -> bool:
+    return (info["codec"] == "mp3" and info["sample_rate"] == TARGET_SAMPLE_RATE
+            and info["channels"] == TARGET_CHANNELS)
+
+
+def transcode_file(src: str, dst: str) -> dict:
+    """
+    Runs in a pool process: writes src to dst in the canonical MP3 format with leading
+    and trailing silence cut. Files already in that format are only cut (stream copy,
+    no re-encode) or, with nothing to cut, left alone (no "output" in the result).
+    """
+    before = _probe(src)
+    start, end = _audible_span(src, before["duration"])
+    if end - start <= 0:
+        raise RuntimeError("file is silent")
+    trim = start >= SILENCE_MIN_DURATION or before["duration"] - end >= SILENCE_MIN_DURATION
+    canonical = _is_canonical(before)
+    if canonical and not trim:
+        return {"source": before, "output": None}
+
+    cmd = ["ffmpeg", "-hide_banner", "-loglevel", "error", "-y"]
+    if trim: cmd += ["-ss", f"{start:.3f}"]
+    cmd += ["-i", src, "-vn", "-map_metadata", "0"]
+    if trim: cmd += ["-t", f"{end - start:.3f}"]
+    if canonical:
+        cmd += ["-c:a", "copy"]  # Same format: cut on frame boundaries, no generation loss
+    else:
+        cmd += ["-ar", str(TARGET_SAMPLE_RATE), "-ac", str(TARGET_CHANNELS),
+                "-c:a", "libmp3lame", "-b:a", TARGET_BITRATE]
+    cmd += ["-f", "mp3", dst]
+    result = subprocess.run(cmd, capture_output=True, text=True, timeout=1800)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip()[-300:] or f"ffmpeg exited with {result.returncode}")
+    after = _probe(dst)
+    if after["duration"] <= 0:
+        raise RuntimeError("transcode produced no audio (file was silent?)")
+    return {"source": before, "output": after}
+
+
+class TranscodeService:
+    """
+    Post-upload stage: normalizes library files to one format in a bounded process
+    pool and records the result in a manifest. The original is only replaced if it
+    wasn't changed again while the job ran and no player is using it.
+    """
+
+    def __init__(self, manifest_file="media_manifest.json"):
+        self.manifest_file = manifest_file
+        self.lock = threading.Lock()
+        self.manifest = {}  # "folder/filename" -> { duration, codec, ..., source_sha256, trimmed_seconds }
+        self.jobs = {}      # job id -> job dict (see submit)
+        self.executor = None
+        self.in_use = lambda path: False  # Set by the app: is the audio engine using this file?
+        self._available = None
+        self._load_manifest()
+
+    def available(self) -> bool:
+        if self._available is None:
+            self._available = bool(shutil.which("ffmpeg") and shutil.which("ffprobe"))
+            if not self._available:
+                print("Transcode: ffmpeg/ffprobe not found, uploads are kept as-is")
+        return self._available
+
+    def submit(self, folder: str, filename: str, source_sha256: Optional[str] = None) -> Optional[dict]:
+        """Queues one library file for transcoding. Returns the job (a copy)."""
+        job = {
+            "id": uuid.uuid4().hex[:12],
+            "folder": folder,
+            "filename": filename,
+            "status": "queued",
+            "error": None,
+            "submitted": time.time(),
+            "finished": None
+        }
+        if not self.available():
+            job.update(status="skipped", finished=time.time())
+            self._remember(job)
+            return dict(job)
+
+        src = os.path.join(media_library.folders[folder], filename)
+        try:
+            st = os.stat(src)
+        except OSError as e:
+            job.update(status="failed", error=str(e), finished=time.time())
+            self._remember(job)
+            return dict(job)
+
+        dst = os.path.join(os.path.dirname(src), f".{filename}.{job['id']}.transcode")
+        with self.lock:
+            if self.executor is None:
+                # spawn, not fork: the parent has libvlc and server threads running
+                self.executor = ProcessPoolExecutor(max_workers=MAX_WORKERS,
+                                                    mp_context=multiprocessing.get_context("spawn"))
+            future = self.executor.submit(transcode_file, src, dst)
+            job["_future"] = future
+            self.jobs[job["id"]] = job
+        future.add_done_callback(lambda f: self._finish(job, f, src, dst, (st.st_size, st.st_mtime), source_sha256))
+        return self._public(job)
+
+    def _finish(self, job, future, src, dst, stamp, source_sha256):
+        try:
+            info = future.result()
+        except Exception as e:
+            self._fail(job, dst, e)
+            return
+        self._apply(job, info, src, dst, stamp, source_sha256, time.time() + IN_USE_GIVE_UP)
+
+    def _apply(self, job, info, src, dst, stamp, source_sha256, give_up_at):
+        try:
+            out = info["output"]
+            st = os.stat(src)
+            if (st.st_size, st.st_mtime) != stamp:
+                # Re-uploaded while we worked; that upload has its own job
+                if out: os.remove(dst)
+                job["status"] = "superseded"
+            elif out and self.in_use(src):
+                # Never swap a file under a player (or a bell queued to play it)
+                if time.time() < give_up_at:
+                    job["status"] = "waiting"
+                    timer = threading.Timer(IN_USE_RETRY, self._apply,
+                                            args=(job, info, src, dst, stamp, source_sha256, give_up_at))
+                    timer.daemon = True
+                    timer.start()
+                    return
+                os.remove(dst)
+                job["status"] = "skipped"
+                job["error"] = "file stayed in use"
+            else:
+                if out: os.replace(dst, src)
+                result = out or info["source"]
+                with self.lock:
+                    self.manifest[f"{job['folder']}/{job['filename']}"] = {
+                        **result,
+                        "format": "mp3",
+                        "source_codec": info["source"]["codec"],
+                        "source_sha256": source_sha256,
+                        "trimmed_seconds": round(max(0.0, info["source"]["duration"] - result["duration"]), 2),
+                        "transcoded_at": time.time()
+                    }
+                self._save_manifest()
+                if out: media_library.refresh(job["folder"])
+                # Already canonical with nothing to cut: the file was not rewritten
+                job["status"] = "done" if out else "unchanged"
+        except Exception as e:
+            self._fail(job, dst, e)
+            return
+        job["finished"] = time.time()
+        self._remember(job)
+
+    def _fail(self, job, dst, e):
+        job.update(status="failed", error=str(e), finished=time.time())
+        try:
+            os.remove(dst)
+        except OSError:
+            pass
+        print(f"Transcode failed for {job['filename']}: {e}")
+        self._remember(job)
+
+    def source_match(self, folder: str, sha256: str) -> Optional[str]:
+        """Library file that was transcoded from an upload with this hash (for ingest dedup)."""
+        prefix = f"{folder}/"
+        with self.lock:
+            for key, entry in self.manifest.items():
+                if key.startswith(prefix) and entry.get("source_sha256") == sha256:
+                    name = key[len(prefix):]
+                    if os.path.exists(os.path.join(media_library.folders[folder], name)):
+                        return name
+        return None
+
+    def forget(self, folder: str, filename: str):
+        with self.lock:
+            removed = self.manifest.pop(f"{folder}/{filename}", None)
+        if removed: self._save_manifest()
+
+    def get_jobs(self) -> dict:
+        with self.lock:
+            jobs = [self._public(j) for j in self.jobs.values()]
+        jobs.sort(key=lambda j: j["submitted"], reverse=True)
+        counts = {}
+        for j in jobs:
+            counts[j["status"]] = counts.get(j["status"], 0) + 1
+        total = len(jobs)
+        finished = total - sum(counts.get(s, 0) for s in ("queued", "running", "waiting"))
+        return {
+            "available": bool(self._available),
+            "counts": counts,
+            "progress": round(finished / total * 100) if total else 100,
+            "jobs": jobs
+        }
+
+    def shutdown(self):
+        if self.executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _public(self, job) -> dict:
+        out = {k: v for k, v in job.items() if not k.startswith("_")}
+        future = job.get("_future")
+        if out["status"] == "queued" and future is not None and future.running():
+            out["status"] = "running"
+        return out
+
+    def _remember(self, job):
+        with self.lock:
+            self.jobs[job["id"]] = job
+            job.pop("_future", None)
+            # Keep the most recent finished jobs only
+            finished = sorted((j for j in self.jobs.values() if j.get("finished")), key=lambda j: j["finished"])
+            for old in finished[:-JOB_HISTORY]:
+                self.jobs.pop(old["id"], None)
+
+    def _load_manifest(self):
+        if not os.path.exists(self.manifest_file):
+            return
+        try:
+            with open(self.manifest_file, "r") as f:
+                self.manifest = json.load(f)
+        except Exception as e:
+            print(f"Media manifest unreadable, starting empty: {e}")
+
+    def _save_manifest(self):
+        with self.lock:
+            persistence.save(self.manifest_file, self.manifest, indent=2)
+
+
+transcode_service = TranscodeService()
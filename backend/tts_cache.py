@@ -0,0 +1,180 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import unicodedata
+from functools import lru_cache
+from typing import Optional
+
+from persistence import persistence
+
+# Rendered announcements are small (~20-60 KB each); this keeps thousands of them
+TTS_CACHE_MAX_BYTES = 200 * 1024 * 1024
+TTS_CACHE_MAX_AGE = 180 * 24 * 3600  # 180 Days
+# Anything smaller is a failed/partial render (same threshold as /control/tts_announce)
+MIN_VALID_SIZE = 1024
+
+
+@lru_cache(maxsize=None)
+def engine_version(package: str) -> str:
+    """Installed version of a TTS package, part of the cache key so upgrades re-render."""
+    try:
+        from importlib.metadata import version
+        return version(package)
+    except Exception:
+        return "unknown"
+
+
+def normalize_text(text: str) -> str:
+    """Collapses whitespace and unicode forms so trivially different inputs share a render."""
+    text = unicodedata.normalize("NFC", text or "")
+    return " ".join(text.split())
+
+
+class TTSCache:
+    """Content-addressed store of rendered TTS MP3s with LRU eviction."""
+
+    def __init__(self, cache_dir="tts_cache", max_bytes=TTS_CACHE_MAX_BYTES, max_age=TTS_CACHE_MAX_AGE):
+        self.cache_dir = cache_dir
+        self.index_file = os.path.join(cache_dir, "index.json")
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.entries = {}  # key -> { file, size, created, last_used, voice, text_hash }
+        self.hits = 0
+        self.misses = 0
+        self._load_index()
+
+    @staticmethod
+    def make_key(text: str, voice: str, version: str) -> str:
+        raw = f"{version}|{voice}|{normalize_text(text)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def text_hash(text: str) -> str:
+        return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+    def temp_path(self, key: str) -> str:
+        """Scratch path for a render in progress (same filesystem, so put() is a rename)."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        return os.path.join(self.cache_dir, f".{key}.{threading.get_ident()}.tmp.mp3")
+
+    def get(self, key: str) -> Optional[str]:
+        """Path of a cached render, or None. Counts a hit on success."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if not entry:
+                return None
+            path = os.path.join(self.cache_dir, entry["file"])
+            if not os.path.exists(path):
+                # Deleted behind our back
+                del self.entries[key]
+                return None
+            entry["last_used"] = time.time()
+            self.hits += 1
+            self._save_index()  # Debounced; a burst of hits is one write later on
+            return path
+
+    def put(self, key: str, src_path: str, text: str, voice: str) -> str:
+        """Moves a fresh render into the cache and returns its final path. Counts a miss."""
+        size = os.path.getsize(src_path) if os.path.exists(src_path) else 0
+        if size < MIN_VALID_SIZE:
+            if os.path.exists(src_path): os.remove(src_path)
+            raise ValueError(f"TTS render too small ({size} bytes)")
+
+        filename = f"{key}.mp3"
+        path = os.path.join(self.cache_dir, filename)
+        with self.lock:
+            os.replace(src_path, path)
+            now = time.time()
+            self.entries[key] = {
+                "file": filename,
+                "size": size,
+                "created": now,
+                "last_used": now,
+                "voice": voice,
+                "text_hash": self.text_hash(text)
+            }
+            self.misses += 1
+            # The render just stored is in use right now, so it is never its own victim
+            self._evict(keep=key)
+            self._save_index()
+        return path
+
+    def find_any_voice(self, text: str) -> Optional[str]:
+        """Most recent render of this text in any voice; last resort when every engine is down."""
+        wanted = self.text_hash(text)
+        with self.lock:
+            matches = [e for e in self.entries.values() if e.get("text_hash") == wanted]
+            for entry in sorted(matches, key=lambda e: e["last_used"], reverse=True):
+                path = os.path.join(self.cache_dir, entry["file"])
+                if os.path.exists(path):
+                    entry["last_used"] = time.time()
+                    self.hits += 1
+                    return path
+        return None
+
+    def stats(self) -> dict:
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "size_bytes": sum(e["size"] for e in self.entries.values()),
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0
+            }
+
+    def clear(self):
+        with self.lock:
+            for entry in self.entries.values():
+                try:
+                    os.remove(os.path.join(self.cache_dir, entry["file"]))
+                except OSError:
+                    pass
+            self.entries = {}
+            self._save_index()
+
+    def evict(self):
+        with self.lock:
+            self._evict()
+            self._save_index()
+
+    def _evict(self, keep=None):
+        # Caller holds self.lock. Oldest first, so expired entries go before the size check
+        now = time.time()
+        total = sum(e["size"] for e in self.entries.values())
+        for key, entry in sorted(self.entries.items(), key=lambda kv: kv[1]["last_used"]):
+            if now - entry["last_used"] <= self.max_age and total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            try:
+                os.remove(os.path.join(self.cache_dir, entry["file"]))
+            except OSError:
+                pass
+            total -= entry["size"]
+            del self.entries[key]
+
+    def _load_index(self):
+        if not os.path.exists(self.index_file):
+            return
+        try:
+            with open(self.index_file, "r") as f:
+                self.entries = json.load(f).get("entries", {})
+        except Exception as e:
+            print(f"TTS cache index unreadable, starting empty: {e}")
+            self.entries = {}
+
+    def _save_index(self):
+        # Caller holds self.lock. Write-behind: last_used updates on the bell path never touch the disk
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            persistence.save(self.index_file, {"entries": self.entries}, indent=None)
+        except Exception as e:
+            print(f"TTS cache index save error: {e}")
+
+
+tts_cache = TTSCache()
@@ -0,0 +1,161 @@
+import re
+import threading
+import time
+from typing import Optional
+from urllib.parse import urlparse, parse_qs
+
+# Lifetime assumed when a resolved URL carries no expiry of its own
+DEFAULT_TTL = 3600
+# Entries are re-resolved this long before they expire (YouTube URLs last ~6 h)
+REFRESH_MARGIN = 600
+# Entries nobody played for this long are not refreshed any more, just dropped
+IDLE_TTL = 6 * 3600
+# After a failed extraction, don't retry the same URL sooner than this
+RETRY_DELAY = 60
+
+_EXPIRE_PATH = re.compile(r"/expire/(\d+)")
+
+
+def is_indirect(url: str) -> bool:
+    """URLs VLC can't open directly and that need an extractor."""
+    return bool(url) and ("youtube.com" in url or "youtu.be" in url)
+
+
+def url_expiry(url: str) -> Optional[float]:
+    """Unix time the resolved URL stops working, from its expire= param or /expire/<ts>/ path (HLS)."""
+    try:
+        parsed = urlparse(url)
+        value = parse_qs(parsed.query).get("expire", [None])[0]
+        if value is None:
+            m = _EXPIRE_PATH.search(parsed.path)
+            value = m.group(1) if m else None
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+def _extract(url: str) -> str:
+    import yt_dlp  # Heavy; only loaded when a YouTube source is actually played
+    ydl_opts = {'format': 'bestaudio/best', 'noplaylist': True, 'quiet': True, 'nocheckcertificate': True, 'live_from_start': True}
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        info = ydl.extract_info(url, download=False)
+        resolved = info.get('url')
+        if not resolved:
+            raise RuntimeError("no playable URL in extractor result")
+        return resolved
+
+
+class UrlResolver:
+    """
+    Cache of source URL -> direct stream URL. Lookups are instant while the entry is
+    fresh; a background thread re-resolves entries shortly before their embedded
+    expiry, and the last good URL is kept when the extractor fails.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = {}      # source -> { url, expires, resolved_at, used, failed_at }
+        self._inflight = {}    # source -> Event, so concurrent plays extract once
+        self._wake = threading.Event()
+        self._thread = None
+
+    def resolve(self, url: str) -> str:
+        """Direct URL for url (itself if it needs no resolving or nothing ever worked)."""
+        if not is_indirect(url):
+            return url
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(url)
+            if entry:
+                entry["used"] = now
+        if entry and entry["expires"] > now:
+            if entry["expires"] - now < REFRESH_MARGIN:
+                self._wake.set()
+            return entry["url"]
+        # Missing or expired: resolve now (the caller has to wait this once)
+        resolved = self._refresh(url)
+        return resolved or (entry["url"] if entry else url)
+
+    def prefetch(self, url: str):
+        """Resolves in the background so the first play doesn't wait (e.g. a newly saved station)."""
+        if is_indirect(url):
+            threading.Thread(target=self._refresh, args=(url,), daemon=True).start()
+
+    def stats(self) -> dict:
+        now = time.time()
+        with self.lock:
+            return {src: {"expires_in": round(e["expires"] - now), "failed": bool(e.get("failed_at"))}
+                    for src, e in self.entries.items()}
+
+    def _refresh(self, url: str) -> Optional[str]:
+        with self.lock:
+            waiter = self._inflight.get(url)
+            if waiter is None:
+                entry = self.entries.get(url)
+                if entry and entry.get("failed_at") and time.time() - entry["failed_at"] < RETRY_DELAY:
+                    return None
+                self._inflight[url] = threading.Event()
+        if waiter is not None:
+            # Someone else is extracting this URL right now
+            waiter.wait(60)
+            with self.lock:
+                entry = self.entries.get(url)
+            return entry["url"] if entry and not entry.get("failed_at") else None
+
+        print(f"Resolving YouTube URL: {url}...")
+        started = time.time()
+        try:
+            resolved = _extract(url)
+            expires = url_expiry(resolved) or (started + DEFAULT_TTL)
+            with self.lock:
+                previous = self.entries.get(url, {})
+                self.entries[url] = {"url": resolved, "expires": expires, "resolved_at": started,
+                                     "used": previous.get("used", started), "failed_at": None}
+            print(f"Resolved in {time.time() - started:.1f}s, valid for {(expires - time.time()) / 60:.0f} min")
+            self._ensure_thread()
+            return resolved
+        except Exception as e:
+            print(f"YouTube resolution failed: {e}")
+            with self.lock:
+                entry = self.entries.get(url)
+                if entry:
+                    entry["failed_at"] = time.time()  # Last good URL stays usable
+                else:
+                    self.entries[url] = {"url": url, "expires": 0, "resolved_at": None,
+                                         "used": started, "failed_at": time.time()}
+            return None
+        finally:
+            with self.lock:
+                self._inflight.pop(url).set()
+
+    def _ensure_thread(self):
+        with self.lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._refresh_loop, daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def _refresh_loop(self):
+        while True:
+            now = time.time()
+            due, next_check = [], now + REFRESH_MARGIN
+            with self.lock:
+                for src, e in list(self.entries.items()):
+                    if now - e["used"] > IDLE_TTL:
+                        del self.entries[src]
+                        continue
+                    # Short-lived URLs (live manifests, skewed clocks) are never re-resolved back to back
+                    refresh_at = max(e["expires"] - REFRESH_MARGIN, (e["resolved_at"] or 0) + RETRY_DELAY)
+                    if e.get("failed_at"):
+                        refresh_at = max(refresh_at, e["failed_at"] + RETRY_DELAY)
+                    if refresh_at <= now:
+                        due.append(src)
+                        refresh_at = now + RETRY_DELAY
+                    next_check = min(next_check, refresh_at)
+            for src in due:
+                self._refresh(src)
+            self._wake.wait(max(1.0, next_check - time.time()))
+            self._wake.clear()
+
+
+url_resolver = UrlResolver()
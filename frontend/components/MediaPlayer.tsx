@@ -33,6 +33,17 @@ export default function MediaPlayer({ status, toggleMusic, toggleSource, changeV
         ((status.music_source === 'radio' || status.music_source === 'local') && status.current_volume_type === 'music')
     );
 
+    // The snapshot's media_time only changes with the state; tick the position locally
+    const [now, setNow] = React.useState(Date.now());
+    React.useEffect(() => {
+        if (!status.is_playing) return;
+        const tick = setInterval(() => setNow(Date.now()), 1000);
+        return () => clearInterval(tick);
+    }, [status.is_playing]);
+    const mediaTime = status.is_playing && status.media_started_at
+        ? Math.max(0, Math.min(now - status.media_started_at, status.media_duration || Infinity))
+        : status.media_time;
+
     // ALWAYS show and control manual volume
     const [localVolume, setLocalVolume] = React.useState(status.volume_manual || 50);
     const [isLoading, setIsLoading] = React.useState(false);
@@ -188,13 +199,13 @@ export default function MediaPlayer({ status, toggleMusic, toggleSource, changeV
                         {isManualPlaying && status.music_source !== 'radio' && (
                             <div className="mt-3">
                                 <div className="flex justify-between text-[10px] font-medium text-slate-400 mb-1">
-                                    <span>{formatTime(status.media_time)}</span>
+                                    <span>{formatTime(mediaTime)}</span>
                                     <span>{formatTime(status.media_duration)}</span>
                                 </div>
                                 <div className="h-1 bg-slate-800 rounded-full overflow-hidden">
                                     <div
                                         className="h-full bg-indigo-500 rounded-full transition-all duration-1000"
-                                        style={{ width: `${status.media_duration ? ((status.media_time || 0) / status.media_duration) * 100 : 0}%` }}
+                                        style={{ width: `${status.media_duration ? ((mediaTime || 0) / status.media_duration) * 100 : 0}%` }}
                                     ></div>
                                 </div>
                             </div>
@@ -44,20 +44,51 @@ export default function Dashboard() {
         // Initial fetch
         refreshData();
 
-        // Interval
-        const interval = setInterval(async () => {
-            setCurrentTime(new Date());
-            try {
-                const res = await api.get('/status');
-                setStatus(res.data);
-                setErrorCount(0); // Reset on success
-            } catch (e) {
-                console.error("Connection failed", e);
-                setErrorCount(prev => prev + 1);
-            }
-        }, 1000);
+        // Clock
+        const clock = setInterval(() => setCurrentTime(new Date()), 1000);
+
+        // Polling fallback (used when the server push stream is unavailable)
+        let poll: ReturnType<typeof setInterval> | null = null;
+        const startPolling = () => {
+            if (poll) return;
+            poll = setInterval(async () => {
+                try {
+                    const res = await api.get('/status');
+                    setStatus(res.data);
+                    setErrorCount(0); // Reset on success
+                } catch (e) {
+                    console.error("Connection failed", e);
+                    setErrorCount(prev => prev + 1);
+                }
+            }, 1000);
+        };
+
+        // Server push: full snapshot first, then only the fields that changed
+        let source: EventSource | null = null;
+        if (typeof EventSource !== 'undefined') {
+            source = new EventSource(`${api.defaults.baseURL}/status/stream`);
+            source.addEventListener('snapshot', (e) => {
+                setStatus(JSON.parse((e as MessageEvent).data));
+                setErrorCount(0);
+            });
+            source.addEventListener('delta', (e) => {
+                const delta = JSON.parse((e as MessageEvent).data);
+                setStatus(prev => ({ ...prev, ...delta }));
+            });
+            source.onopen = () => {
+                if (poll) { clearInterval(poll); poll = null; }
+            };
+            // EventSource reconnects by itself; poll meanwhile so the error counter still works
+            source.onerror = () => startPolling();
+        } else {
+            startPolling();
+        }
 
-        return () => clearInterval(interval);
+        return () => {
+            clearInterval(clock);
+            if (poll) clearInterval(poll);
+            if (source) source.close();
+        };
     }, []);
 
     // Auto-reload check
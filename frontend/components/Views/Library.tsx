@@ -41,9 +41,11 @@ function FileSection({ type, title, icon: Icon }: FileSectionProps) {
         });
 
         try {
-            await api.post(`/files/${type}`, formData, {
+            const res = await api.post(`/files/${type}`, formData, {
                 headers: { 'Content-Type': 'multipart/form-data' }
             });
+            const rejected = (res.data?.results || []).filter((r: any) => r.status === "rejected");
+            if (rejected.length) alert(rejected.map((r: any) => r.error).join("\n"));
             fetchFiles();
         } catch (e) {
             alert("Upload failed");
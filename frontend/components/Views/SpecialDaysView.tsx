@@ -266,7 +266,16 @@ export default function SpecialDaysView() {
             const res = await api.post('/special-days/import', formData, {
                 headers: { 'Content-Type': 'multipart/form-data' }
             });
-            setModalMessage(`${res.data.count} kişi başarıyla yüklendi!`);
+            const report = res.data.report;
+            let message = `${res.data.count} kişi başarıyla yüklendi!`;
+            if (report) {
+                const details = [];
+                if (report.updated) details.push(`${report.updated} güncellendi`);
+                if (report.duplicate) details.push(`${report.duplicate} zaten kayıtlı`);
+                if (report.rejected) details.push(`${report.rejected} satır okunamadı`);
+                if (details.length) message += ` (${details.join(', ')})`;
+            }
+            setModalMessage(message);
             setShowSuccessModal(true);
             loadData();
         } catch (e) {
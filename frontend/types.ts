@@ -41,6 +41,7 @@ export interface Status {
     next_event_name?: string;
     // Playback Stats
     media_time?: number;
+    media_started_at?: number | null;
     media_duration?: number;
     daily_timeline?: { time: string, name: string, type: string, passed: boolean }[];
     scheduler_running?: boolean;